@@ -0,0 +1,258 @@
+"""
+Lane and revenue rollups for ops.
+
+lane_daily_stats holds one row per (day, source_city, dest_city, item_type)
+with the order count, their summed price, how many were accepted and how
+many complaints were filed against them. Everything is attributed to the
+day the order was created (UTC), so a complaint rate is complaints over
+orders of the same cohort.
+
+Every write path adds its deltas with an upsert in the same transaction as
+the write itself: create_order and bulk_import (orders, revenue),
+accept_order and dispatch (accepted), create_complaint (complaints). The
+rollups are therefore never ahead of or behind the rows they summarise,
+and /analytics/lanes reads nothing else. Deltas are applied in key order,
+so concurrent writers on Postgres lock rollup rows in the same order.
+
+Writes that bypass those paths (seed scripts, manual SQL) are repaired with
+a rebuild, and a check compares the rollups with a full recomputation:
+
+    python analytics.py --check [--since 2026-01-01]
+    python analytics.py --rebuild [--since 2026-01-01]
+"""
+import hmac
+import math
+import os
+from datetime import date, datetime, time
+from typing import Optional
+from fastapi import Header, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import Date, case, cast, delete, func, select, type_coerce, union_all, update
+import models
+from database import engine
+
+ANALYTICS_API_KEY = os.environ.get("ANALYTICS_API_KEY")  # the endpoint is disabled while unset
+ANALYTICS_MAX_ROWS = int(os.environ.get("ANALYTICS_MAX_ROWS", "5000"))
+
+ROLLUPS = models.LaneDailyStats.__table__
+ORDERS = models.Order.__table__
+ARCHIVED_ORDERS = models.ArchivedOrder.__table__
+COMPLAINTS = models.Complaint.__table__
+VERSIONS = models.ResourceVersion.__table__
+
+KEY_COLUMNS = ("day", "source_city", "dest_city", "item_type")
+MEASURES = ("orders", "revenue", "accepted", "complaints")
+
+if engine.dialect.name == "postgresql":
+    from sqlalchemy.dialects.postgresql import insert as _dialect_insert
+else:
+    from sqlalchemy.dialects.sqlite import insert as _dialect_insert
+
+# -------------------------------
+# Schemas
+# -------------------------------
+class LaneStats(BaseModel):
+    day: Optional[date] = None  # None when totalled over the whole range
+    source_city: str
+    dest_city: str
+    item_type: str
+    orders: int
+    revenue: float
+    avg_price: float
+    accepted: int
+    complaints: int
+    complaint_rate: float
+
+# -------------------------------
+# Incremental updates
+# -------------------------------
+_upsert = _dialect_insert(ROLLUPS)
+_upsert = _upsert.on_conflict_do_update(
+    index_elements=list(KEY_COLUMNS),
+    set_={name: ROLLUPS.c[name] + _upsert.excluded[name] for name in MEASURES},
+)
+
+class Rollup:
+    """Deltas collected for one transaction, keyed by (day, source_city, dest_city, item_type)."""
+
+    def __init__(self):
+        self.deltas = {}
+
+    def add(self, created_at: datetime, source_city: str, dest_city: str, item_type: str,
+            orders: int = 0, revenue: float = 0.0, accepted: int = 0, complaints: int = 0):
+        key = (created_at.date(), source_city, dest_city, item_type)
+        delta = self.deltas.get(key)
+        if delta is None:
+            delta = self.deltas[key] = [0, 0.0, 0, 0]
+        delta[0] += orders
+        delta[1] += revenue
+        delta[2] += accepted
+        delta[3] += complaints
+
+    def apply(self, db):
+        """
+        Upsert the deltas on db (a Session or Connection) inside the caller's
+        transaction. The deltas are kept, so a retried transaction applies them again.
+        """
+        if self.deltas:
+            db.execute(_upsert, [
+                dict(zip(KEY_COLUMNS, key), **dict(zip(MEASURES, delta)))
+                for key, delta in sorted(self.deltas.items())
+            ])
+
+def record(db, created_at: datetime, source_city: str, dest_city: str, item_type: str, **measures):
+    """Rollup.add + apply for a single order."""
+    rollup = Rollup()
+    rollup.add(created_at, source_city, dest_city, item_type, **measures)
+    rollup.apply(db)
+
+# -------------------------------
+# Reads
+# -------------------------------
+def lane_stats(db, source_city: str = None, dest_city: str = None, item_type: str = None,
+               start: date = None, end: date = None, per_day: bool = True, limit: int = ANALYTICS_MAX_ROWS):
+    """Rollup rows (per day, or totalled over [start, end]) with their derived ratios, busiest first."""
+    keys = [ROLLUPS.c.source_city, ROLLUPS.c.dest_city, ROLLUPS.c.item_type]
+    if per_day:
+        keys.insert(0, ROLLUPS.c.day)
+    revenue = func.sum(ROLLUPS.c.revenue)
+    query = select(
+        *keys, func.sum(ROLLUPS.c.orders), revenue, func.sum(ROLLUPS.c.accepted), func.sum(ROLLUPS.c.complaints),
+    ).group_by(*keys)
+    for column, value in ((ROLLUPS.c.source_city, source_city), (ROLLUPS.c.dest_city, dest_city),
+                          (ROLLUPS.c.item_type, item_type)):
+        if value is not None:
+            query = query.where(column == value)
+    if start is not None:
+        query = query.where(ROLLUPS.c.day >= start)
+    if end is not None:
+        query = query.where(ROLLUPS.c.day <= end)
+    query = query.order_by(*((ROLLUPS.c.day.desc(),) if per_day else ()), revenue.desc()).limit(limit)
+
+    stats = []
+    for row in db.execute(query):
+        *key, orders, revenue_sum, accepted, complaints = row
+        day = key.pop(0) if per_day else None
+        stats.append({
+            "day": day, "source_city": key[0], "dest_city": key[1], "item_type": key[2],
+            "orders": orders, "revenue": round(revenue_sum, 2),
+            "avg_price": round(revenue_sum / orders, 2) if orders else 0.0,
+            "accepted": accepted, "complaints": complaints,
+            "complaint_rate": round(complaints / orders, 4) if orders else 0.0,
+        })
+    return stats
+
+def require_analytics_key(x_analytics_key: str = Header(None)):
+    if not ANALYTICS_API_KEY:
+        raise HTTPException(status_code=403, detail="Analytics is disabled")
+    if not x_analytics_key or not hmac.compare_digest(x_analytics_key, ANALYTICS_API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid analytics key")
+
+# -------------------------------
+# Rebuild and consistency check
+# -------------------------------
+def _day(created_at):
+    # SQLite keeps datetimes as text, and CAST(... AS DATE) there would keep only the year
+    if engine.dialect.name == "sqlite":
+        return type_coerce(func.date(created_at), Date)
+    return cast(created_at, Date)
+
+def recompute(db, since: date = None) -> dict:
+    """
+    The rollups from a full scan of orders (hot and archived, see archive.py) and
+    complaints: key -> [orders, revenue, accepted, complaints].
+    """
+    start = datetime.combine(since, time.min) if since is not None else None
+    parts = []
+    for table in (ORDERS, ARCHIVED_ORDERS):
+        part = select(_day(table.c.created_at).label("day"), table.c.source_city, table.c.dest_city,
+                      table.c.item_type, table.c.price, table.c.status)
+        parts.append(part.where(table.c.created_at >= start) if start else part)
+    every = union_all(*parts).subquery()
+    keys = (every.c.day, every.c.source_city, every.c.dest_city, every.c.item_type)
+    orders = select(
+        *keys, func.count(), func.sum(every.c.price),
+        func.sum(case((every.c.status == "accepted", 1), else_=0)),
+    ).group_by(*keys)
+
+    # Orders with complaints are never archived
+    day = _day(ORDERS.c.created_at).label("day")
+    keys = (day, ORDERS.c.source_city, ORDERS.c.dest_city, ORDERS.c.item_type)
+    complaints = select(*keys, func.count()).select_from(
+        COMPLAINTS.join(ORDERS, COMPLAINTS.c.order_id == ORDERS.c.id)
+    ).group_by(*keys)
+    if start:
+        complaints = complaints.where(ORDERS.c.created_at >= start)
+
+    expected = {}
+    for *key, count, revenue, accepted in db.execute(orders):
+        expected[tuple(key)] = [count, revenue or 0.0, accepted or 0, 0]
+    for *key, count in db.execute(complaints):
+        expected.setdefault(tuple(key), [0, 0.0, 0, 0])[3] = count
+    return expected
+
+def stored(db, since: date = None) -> dict:
+    query = select(*(ROLLUPS.c[name] for name in KEY_COLUMNS + MEASURES))
+    if since is not None:
+        query = query.where(ROLLUPS.c.day >= since)
+    return {tuple(row[:4]): list(row[4:]) for row in db.execute(query)}
+
+def _same(a, b) -> bool:
+    # Revenue is summed one order at a time on one side and in SQL on the other
+    return a[0] == b[0] and a[2:] == b[2:] and math.isclose(a[1], b[1], rel_tol=1e-9, abs_tol=0.01)
+
+def check(db, since: date = None) -> list:
+    """(key, stored, expected) for every rollup that disagrees with a full recomputation."""
+    expected = recompute(db, since)
+    actual = stored(db, since)
+    zero = [0, 0.0, 0, 0]
+    return [
+        (key, actual.get(key), expected.get(key))
+        for key in sorted(expected.keys() | actual.keys())
+        if not _same(actual.get(key, zero), expected.get(key, zero))
+    ]
+
+def rebuild(db, since: date = None) -> int:
+    """
+    Replace the rollups (from `since` on, or all of them) with a recomputation; returns rows
+    written. Bumps the analytics version in the same transaction, so /analytics/lanes ETags change.
+    """
+    expected = recompute(db, since)
+    wipe = delete(ROLLUPS)
+    if since is not None:
+        wipe = wipe.where(ROLLUPS.c.day >= since)
+    db.execute(wipe)
+    if expected:
+        db.execute(ROLLUPS.insert(), [
+            dict(zip(KEY_COLUMNS, key), **dict(zip(MEASURES, values)))
+            for key, values in sorted(expected.items())
+        ])
+    db.execute(update(VERSIONS).where(VERSIONS.c.name == "analytics").values(version=VERSIONS.c.version + 1))
+    return len(expected)
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from migrate import upgrade
+
+    cli = argparse.ArgumentParser(description="Rebuild or verify the lane analytics rollups")
+    action = cli.add_mutually_exclusive_group(required=True)
+    action.add_argument("--rebuild", action="store_true", help="recompute the rollups from orders and complaints")
+    action.add_argument("--check", action="store_true", help="compare the rollups with a full recomputation")
+    cli.add_argument("--since", type=date.fromisoformat, help="only days on or after this date (YYYY-MM-DD)")
+    args = cli.parse_args()
+
+    upgrade(engine)
+    if args.rebuild:
+        with engine.begin() as conn:
+            written = rebuild(conn, args.since)
+        print(f"✓ Rebuilt {written} rollup rows")
+    else:
+        with engine.connect() as conn:
+            drift = check(conn, args.since)
+        for key, actual, expected in drift[:20]:
+            print(f"✗ {key}: stored {actual}, expected {expected}")
+        if drift:
+            print(f"✗ {len(drift)} rollup rows differ from a full recomputation; run --rebuild")
+            sys.exit(1)
+        print("✓ Rollups match a full recomputation")
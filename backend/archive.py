@@ -0,0 +1,110 @@
+"""
+Hot/cold split of the orders table.
+
+Orders in a finished status (ARCHIVE_STATUSES) older than ARCHIVE_AFTER_DAYS
+are moved to orders_archive, which has the same columns and ids and is
+indexed by id, sender, traveller and created_at. The hot `orders` table
+keeps what the live paths touch: the pending board, matching, dispatch and
+recent history. Each batch is an INSERT ... SELECT into the archive and a
+DELETE of the copied ids in one transaction, so a row is always in exactly
+one of the two tables.
+
+Reads stay transparent: list_orders merges archived rows into a user's
+history when they sort into the requested page, analytics recomputes over
+both tables, and a complaint about an archived order moves it back to the
+hot table first (complaints reference hot orders only, so orders that have
+complaints are never archived).
+
+The newest order is never archived: SQLite hands out max(id) + 1 for new
+rows, and an archived maximum would have its id given out again.
+
+    python archive.py --dry-run
+    python archive.py --older-than-days 365
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, exists, func, select
+from sqlalchemy.orm import Session
+import models
+import utils
+
+# "accepted" means in transit, so it is not finished. This tree has no delivered/cancelled
+# statuses yet; until it does nothing is archived unless ARCHIVE_STATUSES says otherwise.
+ARCHIVE_STATUSES = tuple(s.strip() for s in os.environ.get("ARCHIVE_STATUSES", "delivered,cancelled").split(",") if s.strip())
+ARCHIVE_AFTER_DAYS = float(os.environ.get("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "5000"))
+
+HOT = models.Order.__table__
+COLD = models.ArchivedOrder.__table__
+COMPLAINTS = models.Complaint.__table__
+
+def archivable(cutoff: datetime):
+    """Condition on hot orders the archive may take."""
+    newest_id = select(func.max(HOT.c.id)).scalar_subquery()
+    return and_(
+        HOT.c.status.in_(ARCHIVE_STATUSES),
+        HOT.c.created_at < cutoff,
+        HOT.c.id < newest_id,
+        ~exists().where(COMPLAINTS.c.order_id == HOT.c.id),
+    )
+
+def archive_orders(db: Session, older_than_days: float = ARCHIVE_AFTER_DAYS,
+                   batch_size: int = ARCHIVE_BATCH_SIZE, dry_run: bool = False) -> int:
+    """Move finished orders older than the threshold to orders_archive; returns how many moved (or would)."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    if dry_run:
+        return db.scalar(select(func.count()).select_from(HOT).where(archivable(cutoff)))
+
+    # Batches are id windows: a primary-key range scan each, where "status IN ... ORDER BY id LIMIT n"
+    # would walk the board index and sort every finished order again for every batch
+    first, last = db.execute(select(func.min(HOT.c.id), func.max(HOT.c.id))).one()
+    if first is None:
+        return 0
+    columns = [column.name for column in HOT.columns]
+    moved = 0
+    for low in range(first - 1, last, batch_size):
+        high = low + batch_size
+
+        def move():
+            db.execute(COLD.insert().from_select(columns, select(*HOT.c).where(
+                HOT.c.id > low, HOT.c.id <= high, archivable(cutoff),
+            )))
+            copied = select(COLD.c.id).where(COLD.c.id > low, COLD.c.id <= high)
+            count = db.execute(delete(HOT).where(HOT.c.id > low, HOT.c.id <= high, HOT.c.id.in_(copied))).rowcount
+            # Only the archive's own version: list responses read both tables, so their content is unchanged
+            if count:
+                utils.bump_versions(db, "archive")
+            return count
+
+        moved += utils.commit_with_retry(db, move)
+    return moved
+
+def table_sizes(db: Session) -> dict:
+    return {
+        "hot": db.scalar(select(func.count()).select_from(HOT)),
+        "archive": db.scalar(select(func.count()).select_from(COLD)),
+    }
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal, engine
+    from migrate import upgrade
+
+    cli = argparse.ArgumentParser(description="Move finished orders older than a threshold to orders_archive")
+    cli.add_argument("--older-than-days", type=float, default=ARCHIVE_AFTER_DAYS)
+    cli.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    cli.add_argument("--dry-run", action="store_true", help="only count the orders that would move")
+    args = cli.parse_args()
+
+    upgrade(engine)
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        moved = archive_orders(db, args.older_than_days, args.batch_size, args.dry_run)
+        elapsed = time.perf_counter() - started
+        sizes = table_sizes(db)
+    finally:
+        db.close()
+    verb = "Would archive" if args.dry_run else "Archived"
+    print(f"✓ {verb} {moved} orders in {elapsed:.1f}s; hot {sizes['hot']}, archive {sizes['archive']}")
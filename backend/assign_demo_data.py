@@ -1,7 +1,8 @@
 import sys
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine
+from sqlalchemy import update
+from database import SessionLocal
 from models import Order, Traveller, Sender
+from utils import bump_versions
 
 def assign_data(email: str):
     db = SessionLocal()
@@ -10,11 +11,12 @@ def assign_data(email: str):
         traveller = db.query(Traveller).filter(Traveller.email == email).first()
         if traveller:
             print(f"✓ Found Traveller profile for {email} (ID: {traveller.id})")
-            # Update 'accepted' orders to this traveller
-            accepted_orders = db.query(Order).filter(Order.status == "accepted").all()
-            for order in accepted_orders:
-                order.traveller_id = traveller.id
-            print(f"  -> Assigned {len(accepted_orders)} accepted orders to you.")
+            # Update 'accepted' orders to this traveller (one UPDATE, no rows loaded)
+            assigned = db.execute(
+                update(Order).where(Order.status == "accepted")
+                .values(traveller_id=traveller.id).execution_options(synchronize_session=False)
+            ).rowcount
+            print(f"  -> Assigned {assigned} accepted orders to you.")
         else:
             print(f"⚠ No Traveller profile found for {email}. Create one in the app (Transporter tab) first.")
 
@@ -23,13 +25,15 @@ def assign_data(email: str):
         if sender:
             print(f"✓ Found Sender profile for {email} (ID: {sender.id})")
             # Update 'pending' orders to this sender
-            pending_orders = db.query(Order).filter(Order.status == "pending").all()
-            for order in pending_orders:
-                order.sender_id = sender.id
-            print(f"  -> Assigned {len(pending_orders)} pending orders to you.")
+            assigned = db.execute(
+                update(Order).where(Order.status == "pending")
+                .values(sender_id=sender.id).execution_options(synchronize_session=False)
+            ).rowcount
+            print(f"  -> Assigned {assigned} pending orders to you.")
         else:
             print(f"⚠ No Sender profile found for {email}. Create one in the app (Add Shipment) first.")
 
+        bump_versions(db, "orders", "board")
         db.commit()
         print("\nDone! Refresh your app to see the changes.")
 
@@ -1,41 +1,219 @@
 import os
-from supabase import create_client, Client
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from observability import get_logger, record_auth
 
 load_dotenv()
+log = get_logger("auth")
 
 # Placeholder - User needs to replace these or use env vars
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 
-try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-except Exception as e:
-    print(f"Warning: Supabase client failed to initialize. Check your environment variables. {e}")
-    supabase = None
+# Local verification: "remote" asks Supabase on every request, "local" checks
+# the JWT signature/expiry in-process with the project secret (HS256) or JWKS.
+AUTH_VERIFY_MODE = os.environ.get("AUTH_VERIFY_MODE", "remote").lower()
+SUPABASE_JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")
+SUPABASE_JWKS_URL = os.environ.get(
+    "SUPABASE_JWKS_URL",
+    f"{SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else None,
+)
+SUPABASE_JWT_AUDIENCE = os.environ.get("SUPABASE_JWT_AUDIENCE", "authenticated")
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "10000"))
+# Seconds a verified token is trusted without checking it again, never past its exp.
+# Local verification cannot see a revoked session before exp anyway, so caching it
+# costs nothing. Remote mode exists to honour revocation: by default every request
+# asks Supabase, and a non-zero AUTH_REMOTE_CACHE_TTL lets a signed-out or banned
+# user keep working for up to that many seconds.
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", "300"))
+AUTH_REMOTE_CACHE_TTL = float(os.environ.get("AUTH_REMOTE_CACHE_TTL", "0"))
+
+# Built on first use: importing the supabase package alone costs ~160 ms, and
+# AUTH_VERIFY_MODE=local never needs it
+_supabase = None
+_supabase_ready = False
+_supabase_lock = threading.Lock()
+
+def get_supabase():
+    """The Supabase client, or None if it cannot be configured (logged once)."""
+    global _supabase, _supabase_ready
+    if _supabase_ready:
+        return _supabase
+    with _supabase_lock:
+        if not _supabase_ready:
+            try:
+                from supabase import create_client
+
+                _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+            except Exception as e:
+                log.warning("Supabase client failed to initialize. Check your environment variables. %s", e)
+            _supabase_ready = True
+    return _supabase
 
 security = HTTPBearer()
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+# -------------------------------
+# Verified token cache
+# -------------------------------
+class TokenCache:
+    """LRU of token hash -> user, each entry dropped at the token's own expiry."""
+
+    def __init__(self, maxsize: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str):
+        key = self.key(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return user
+
+    def put(self, token: str, user, exp: float = None, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+token_cache = TokenCache()
+
+_jwks_client = None
+_jwks_lock = threading.Lock()
+
+# Algorithms each kind of key may verify; the token's header only picks between them
+SECRET_ALGORITHMS = ["HS256"]
+JWKS_ALGORITHMS = ["RS256", "ES256"]
+
+def _signing_key(token: str):
+    """Shared secret for HS256 tokens, otherwise the (cached) JWKS key for the token's kid."""
+    global _jwks_client
+    alg = jwt.get_unverified_header(token).get("alg", "")
+    if alg in SECRET_ALGORITHMS:
+        if not SUPABASE_JWT_SECRET:
+            raise Exception("SUPABASE_JWT_SECRET is not configured")
+        return SUPABASE_JWT_SECRET, SECRET_ALGORITHMS
+    if alg not in JWKS_ALGORITHMS:
+        raise Exception(f"Unsupported token algorithm {alg!r}")
+    if not SUPABASE_JWKS_URL:
+        raise Exception("SUPABASE_JWKS_URL is not configured")
+    if _jwks_client is None:
+        with _jwks_lock:
+            if _jwks_client is None:
+                _jwks_client = jwt.PyJWKClient(SUPABASE_JWKS_URL, cache_keys=True)
+    return _jwks_client.get_signing_key_from_jwt(token).key, JWKS_ALGORITHMS
+
+def verify_token_locally(token: str):
+    """Validate signature, expiry and audience without calling Supabase. Returns (user, exp)."""
+    key, algorithms = _signing_key(token)
+    claims = jwt.decode(
+        token,
+        key,
+        algorithms=algorithms,
+        audience=SUPABASE_JWT_AUDIENCE,
+        options={"require": ["exp", "sub"]},
+    )
+    user = SimpleNamespace(
+        id=claims["sub"],
+        email=claims.get("email"),
+        role=claims.get("role"),
+        app_metadata=claims.get("app_metadata", {}),
+        user_metadata=claims.get("user_metadata", {}),
+    )
+    return user, claims["exp"]
+
+def _verify_token_remotely(token: str):
+    supabase = get_supabase()
     if not supabase:
-         raise HTTPException(
+        raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Authentication service not configured",
         )
-        
-    token = credentials.credentials
+    response = supabase.auth.get_user(token)
+    if not response.user:
+        raise Exception("User not found")
+    # Supabase already checked the signature; only read exp to bound the cache entry
+    exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    return response.user, exp
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    started = time.perf_counter()
+    try:
+        return _authenticate(credentials.credentials)
+    finally:
+        record_auth(time.perf_counter() - started)
+
+def _authenticate(token: str):
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+
     try:
         # verify the token and get the user
-        response = supabase.auth.get_user(token)
-        if not response.user:
-            raise Exception("User not found")
-        return response.user
+        if AUTH_VERIFY_MODE == "local":
+            user, exp = verify_token_locally(token)
+            ttl = AUTH_CACHE_TTL
+        else:
+            user, exp = _verify_token_remotely(token)
+            ttl = AUTH_REMOTE_CACHE_TTL
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Auth Error: {e}")
+        log.info("token rejected: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    token_cache.put(token, user, exp, ttl)
+    return user
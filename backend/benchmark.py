@@ -0,0 +1,390 @@
+"""
+End-to-end benchmark and load test for the API.
+
+Runs the FastAPI app in-process (httpx over ASGI, no network) against a
+freshly seeded database, with auth.get_current_user replaced by a fake
+that trusts an X-Bench-User header. Every endpoint scenario is driven by
+N concurrent clients for a fixed duration and reports throughput and
+p50/p95/p99 latency; microbenchmarks time the pricing primitives. Cold
+start (import main + lifespan startup + first request, each in a fresh
+process) is checked against COLD_START_BUDGET_MS. The whole run is written
+as JSON so results can be compared over time.
+
+    python benchmark.py --orders 50000 --concurrency 1,8,32 --out bench.json
+    python benchmark.py --cold-start-only
+    python benchmark.py --database-url postgresql://... --scenarios orders_available
+    python benchmark.py --write-queue --scenarios create_order,create_complaint --concurrency 50,500
+
+The database settings are read at import time, so everything that touches
+the app is imported inside run() after DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from collections import deque
+from datetime import datetime
+from types import SimpleNamespace
+
+SCENARIOS = ("calculate_price", "orders", "orders_available", "create_order", "create_complaint", "accept_order")
+BENCH_SENDER = "bench-sender"
+BENCH_TRAVELLER = "bench-traveller"
+# import main + lifespan startup + first request; 0 disables the check
+COLD_START_BUDGET_MS = float(os.environ.get("COLD_START_BUDGET_MS", "1200"))
+
+# -------------------------------
+# Measurement
+# -------------------------------
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(name: str, concurrency: int, latencies, errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+    }
+
+def micro(name: str, fn, number: int) -> dict:
+    """Best of five timeit runs."""
+    best = min(timeit.repeat(fn, number=number, repeat=5))
+    return {"name": name, "ns_per_op": round(best / number * 1e9, 1), "ops_per_s": round(number / best)}
+
+async def drive(client, make_request, concurrency: int, duration: float):
+    """
+    Keep `concurrency` requests in flight for `duration` seconds.
+    make_request() returns (method, url, kwargs), or None when its work pool is empty.
+    """
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            request = make_request()
+            if request is None:
+                return
+            method, url, kwargs = request
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+# -------------------------------
+# Microbenchmarks
+# -------------------------------
+def run_micro(number: int):
+    import numpy as np
+    import utils
+    from courier_pricing import haversine_distance, price_calculator, price_calculator_batch
+
+    rows = 10_000
+    rng = np.random.default_rng(1)
+    lat1, lat2 = rng.uniform(8, 35, rows), rng.uniform(8, 35, rows)
+    lon1, lon2 = rng.uniform(68, 97, rows), rng.uniform(68, 97, rows)
+    weights = rng.uniform(0.1, 20, rows)
+    items = rng.choice(list(utils.RISK_FEES), rows)
+
+    results = [
+        micro("haversine_distance", lambda: haversine_distance(19.076, 72.8777, 28.7041, 77.1025), number),
+        micro("utils.haversine_distance", lambda: utils.haversine_distance(19.076, 72.8777, 28.7041, 77.1025), number),
+        micro("price_calculator", lambda: price_calculator(19.076, 72.8777, 28.7041, 77.1025, 5, "documents"), number),
+        micro("lane_price", lambda: utils.lane_price("Mumbai", "Delhi", 5, "documents"), number),
+    ]
+    batch = micro("price_calculator_batch (10k rows)",
+                  lambda: price_calculator_batch(lat1, lon1, lat2, lon2, weights, items), max(1, number // 10_000))
+    batch["ns_per_row"] = round(batch["ns_per_op"] / rows, 1)
+    results.append(batch)
+    return results
+
+# -------------------------------
+# Cold start
+# -------------------------------
+# Runs in a fresh interpreter: import main, run the lifespan startup, serve one
+# request. The test client is imported first so its own cost is not counted.
+COLD_START_SCRIPT = """
+import json, time
+from starlette.testclient import TestClient
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+with TestClient(main.app) as client:
+    ready = time.perf_counter()
+    status = client.get("/orders/available").status_code
+    served = time.perf_counter()
+print(json.dumps({"import": imported - started, "startup": ready - imported,
+                  "first_request": served - ready, "status": status}))
+"""
+
+def cold_start(runs: int) -> dict:
+    """Median cold-start phases of main:app, each run against a new, empty SQLite database."""
+    samples = []
+    for _ in range(runs):
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='blackbox-cold-'), 'cold.db')}")
+        started = time.perf_counter()
+        child = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], env=env, capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+        wall = time.perf_counter() - started
+        if child.returncode != 0:
+            raise SystemExit(f"✗ Cold start failed:\n{child.stderr}")
+        sample = json.loads(child.stdout.strip().splitlines()[-1])
+        if sample["status"] >= 400:
+            raise SystemExit(f"✗ Cold start request returned {sample['status']}")
+        sample["process"] = wall
+        samples.append(sample)
+
+    def median_ms(key):
+        values = sorted(s[key] for s in samples)
+        return round(values[len(values) // 2] * 1000, 1)
+
+    result = {"runs": runs}
+    for key in ("import", "startup", "first_request", "process"):
+        result[f"{key}_ms"] = median_ms(key)
+    result["total_ms"] = round(result["import_ms"] + result["startup_ms"] + result["first_request_ms"], 1)
+    return result
+
+# -------------------------------
+# Database seeding
+# -------------------------------
+def seed(args):
+    """Background volume from the synthetic generator, plus bench profiles that own some of it."""
+    from sqlalchemy import update
+    import models
+    import utils
+    from database import SessionLocal, engine
+    from migrate import upgrade
+    from synthetic_data import generate
+
+    upgrade(engine)
+    generate(args.senders, args.travellers, args.orders, seed=args.seed)
+
+    db = SessionLocal()
+    try:
+        sender = models.Sender(name="Bench Sender", email="sender@bench.example", supabase_id=BENCH_SENDER)
+        traveller = models.Traveller(name="Bench Traveller", email="traveller@bench.example",
+                                     supabase_id=BENCH_TRAVELLER, source_city="Mumbai", dest_city="Delhi")
+        db.add_all([sender, traveller])
+        db.flush()
+        # The bench sender owns every 50th order, so /orders has real pages to walk
+        db.execute(update(models.Order).where(models.Order.id % 50 == 0).values(sender_id=sender.id))
+        utils.bump_versions(db, *models.VERSIONED_RESOURCES)
+        db.commit()
+        sender_id = sender.id
+        pending = [
+            order_id for (order_id,) in db.query(models.Order.id)
+            .filter(models.Order.status == "pending", models.Order.sender_id != sender_id)
+        ]
+        owned = [order_id for (order_id,) in db.query(models.Order.id).filter(models.Order.sender_id == sender_id)]
+    finally:
+        db.close()
+    random.Random(args.seed).shuffle(pending)
+    return pending, owned
+
+# -------------------------------
+# Endpoint scenarios
+# -------------------------------
+def scenario_requests(name: str, cities, lanes, pending: deque, owned):
+    as_sender = {"headers": {"X-Bench-User": BENCH_SENDER}}
+    as_traveller = {"headers": {"X-Bench-User": BENCH_TRAVELLER}}
+
+    def calculate_price():
+        (src, a), (dst, b) = random.sample(cities, 2)
+        return "GET", "/calculate-price", {"params": {
+            "lat1": a["lat"], "lon1": a["lon"], "lat2": b["lat"], "lon2": b["lon"],
+            "weight_kg": round(random.uniform(0.5, 20), 1), "item_type": random.choice(["normal", "fragile"]),
+        }}
+
+    def orders():
+        return "GET", "/orders", {"params": {"limit": 50}, **as_sender}
+
+    def orders_available():
+        src, dst = random.choice(lanes)
+        params = random.choice([{}, {"source_city": src}, {"dest_city": dst}, {"source_city": src, "dest_city": dst}])
+        return "GET", "/orders/available", {"params": params}
+
+    def create_order():
+        (src, a), (dst, b) = random.sample(cities, 2)
+        return "POST", "/orders", {"json": {
+            "source_city": src, "dest_city": dst, "weight_kg": round(random.uniform(0.5, 20), 1),
+            "item_type": "documents", "source_lat": a["lat"], "source_lon": a["lon"],
+            "dest_lat": b["lat"], "dest_lon": b["lon"],
+        }, **as_sender}
+
+    def create_complaint():
+        return "POST", "/complaints", {"json": {
+            "order_id": random.choice(owned), "issue": "Parcel arrived damaged",
+        }, **as_sender}
+
+    def accept_order():
+        if not pending:
+            return None
+        return "POST", f"/orders/{pending.popleft()}/accept", as_traveller
+
+    return locals()[name]
+
+async def run_endpoints(args, pending, owned):
+    import httpx
+    from fastapi import Header
+    import utils
+    from auth import get_current_user
+    from main import app
+
+    def bench_user(x_bench_user: str = Header(None)):
+        user_id = x_bench_user or BENCH_SENDER
+        return SimpleNamespace(id=user_id, email=f"{user_id}@bench.example")
+
+    app.dependency_overrides[get_current_user] = bench_user
+    if args.no_response_cache:
+        utils.board_cache.ttl = 0
+
+    cities = list(utils.CITY_DATA.items())
+    lanes = [lane for lane in utils.CITY_DISTANCES if lane[0] != lane[1]]
+    pending = deque(pending)
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in args.scenarios:
+            for concurrency in args.concurrency:
+                make_request = scenario_requests(name, cities, lanes, pending, owned)
+                await drive(client, make_request, concurrency, min(args.warmup, args.duration))
+                latencies, errors, elapsed = await drive(client, make_request, concurrency, args.duration)
+                results.append(summarize(name, concurrency, latencies, errors, elapsed))
+                print(_row(results[-1]), file=sys.stderr)
+    app.dependency_overrides.clear()
+    return results
+
+def _row(r) -> str:
+    return (f"  {r['scenario']:<18} c={r['concurrency']:<4} {r['throughput_rps']:>9.1f} req/s  "
+            f"p50 {r['p50_ms']:>8.2f}  p95 {r['p95_ms']:>8.2f}  p99 {r['p99_ms']:>8.2f} ms  errors {r['errors']}")
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run(args) -> dict:
+    meta = {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    report = {"meta": meta, "cold_start": None, "micro": [], "endpoints": []}
+    if args.cold_start_runs:
+        print("Cold start", file=sys.stderr)
+        report["cold_start"] = c = cold_start(args.cold_start_runs)
+        print(f"  import {c['import_ms']} ms  startup {c['startup_ms']} ms  first request {c['first_request_ms']} ms  "
+              f"= {c['total_ms']} ms  (process {c['process_ms']} ms, median of {c['runs']})", file=sys.stderr)
+    if args.cold_start_only:
+        return report
+
+    if args.write_queue:
+        os.environ["WRITE_QUEUE"] = "1"
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(prefix="blackbox-bench-"), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    print(f"Seeding {os.environ['DATABASE_URL']} ...", file=sys.stderr)
+    seeded_at = time.perf_counter()
+    pending, owned = seed(args)
+    seed_seconds = time.perf_counter() - seeded_at
+
+    import database
+    meta.update(
+        database=database.engine.dialect.name,
+        async_db=database.USE_ASYNC_DB,
+        seed={"senders": args.senders, "travellers": args.travellers, "orders": args.orders,
+              "seconds": round(seed_seconds, 1)},
+        duration_s=args.duration,
+        response_cache=not args.no_response_cache,
+        write_queue=args.write_queue,
+    )
+    if not args.skip_micro:
+        print("Microbenchmarks", file=sys.stderr)
+        report["micro"] = run_micro(args.micro_number)
+        for m in report["micro"]:
+            print(f"  {m['name']:<34} {m['ns_per_op']:>12.1f} ns/op", file=sys.stderr)
+    print("Endpoints", file=sys.stderr)
+    report["endpoints"] = asyncio.run(run_endpoints(args, pending, owned))
+    if args.write_queue:
+        import write_queue
+        meta["write_queue_stats"] = write_queue.writer.stats()
+    return report
+
+def parse_args(argv=None):
+    cli = argparse.ArgumentParser(description="Benchmark the API in-process and write the results as JSON")
+    cli.add_argument("--database-url", help="defaults to a fresh SQLite file in a temp directory")
+    cli.add_argument("--senders", type=int, default=2000)
+    cli.add_argument("--travellers", type=int, default=1000)
+    cli.add_argument("--orders", type=int, default=50000)
+    cli.add_argument("--concurrency", default="1,8,32", help="comma-separated client counts")
+    cli.add_argument("--duration", type=float, default=5.0, help="seconds per scenario and concurrency")
+    cli.add_argument("--warmup", type=float, default=1.0, help="seconds of unmeasured load before each run")
+    cli.add_argument("--scenarios", default=",".join(SCENARIOS))
+    cli.add_argument("--no-response-cache", action="store_true", help="measure /orders/available uncached")
+    cli.add_argument("--write-queue", action="store_true", help="group-commit order and complaint inserts (WRITE_QUEUE=1)")
+    cli.add_argument("--skip-micro", action="store_true")
+    cli.add_argument("--micro-number", type=int, default=200_000, help="calls per microbenchmark run")
+    cli.add_argument("--cold-start-runs", type=int, default=5, help="fresh-process startups to time (0 skips)")
+    cli.add_argument("--cold-start-budget-ms", type=float, default=COLD_START_BUDGET_MS,
+                     help="exit with status 1 when import + startup + first request exceeds this")
+    cli.add_argument("--cold-start-only", action="store_true", help="time the cold start and skip everything else")
+    cli.add_argument("--seed", type=int, default=42)
+    cli.add_argument("--out", help="write JSON here instead of stdout")
+    args = cli.parse_args(argv)
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c]
+    args.scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        cli.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    random.seed(args.seed)
+    # stdout is reserved for the JSON report; progress and import-time messages go to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args)
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+        print(f"✓ Results written to {args.out}", file=sys.stderr)
+    else:
+        print(output)
+
+    cold = report["cold_start"]
+    if cold and args.cold_start_budget_ms and cold["total_ms"] > args.cold_start_budget_ms:
+        print(f"✗ Cold start {cold['total_ms']} ms is over the {args.cold_start_budget_ms:g} ms budget", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,315 @@
+"""
+Bulk order import for senders with many shipments at once.
+
+Rows have the same shape as test_order.json (one JSON object per line, or
+CSV with those column names). Each chunk is validated row by row, priced
+in one vectorised pass and inserted with a single executemany in its own
+transaction. Invalid rows are reported by line number and skipped; they
+never abort the rest of the file.
+
+    python bulk_import.py orders.jsonl --sender-id 1
+    python bulk_import.py orders.csv --sender-id 1 --format csv
+"""
+import codecs
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+import models
+from database import IS_SQLITE
+import utils
+import events
+import analytics
+from courier_pricing import price_for_distance_batch
+
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", "5000"))
+BULK_MAX_ERRORS = int(os.environ.get("BULK_MAX_ERRORS", "1000"))  # errors listed in a report
+
+FORMATS = ("jsonl", "csv")
+
+# Plain Core executemany: the ORM bulk path adds per-row bookkeeping nothing here needs
+ORDERS = models.Order.__table__
+
+# -------------------------------
+# Parsing
+# -------------------------------
+def format_for(content_type: str = None, filename: str = None) -> str:
+    """Guess the row format from a Content-Type header or file name; JSON lines by default."""
+    hint = (content_type or "") + " " + (filename or "")
+    return "csv" if "csv" in hint.lower() else "jsonl"
+
+class RowParser:
+    """
+    Incremental parser: feed() text as it arrives and get back (line_no, row)
+    pairs, where row is a dict or an error message. Blank lines are skipped.
+    A CSV record whose quoted fields span several lines is reported at its first line.
+    """
+
+    def __init__(self, fmt: str = "jsonl"):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(FORMATS)}")
+        self.fmt = fmt
+        self.header = None
+        self.line_no = 0
+        self._pending = ""
+        self._record = None  # CSV record still inside a quoted field, with its first line number
+
+    def feed(self, text: str):
+        lines = (self._pending + text).split("\n")
+        self._pending = lines.pop()
+        return [parsed for parsed in map(self._parse_line, lines) if parsed is not None]
+
+    def close(self):
+        rest, self._pending = self._pending, ""
+        parsed = [self._parse_line(rest)]
+        if self._record is not None:
+            # Unterminated quote: let the csv module make what it can of the rest
+            (start, record), self._record = self._record, None
+            parsed.append(self._parse_csv(start, record))
+        return [p for p in parsed if p is not None]
+
+    def _parse_line(self, line: str):
+        self.line_no += 1
+        if self.fmt == "csv":
+            start, record = self._record or (self.line_no, "")
+            record = f"{record}\n{line}" if self._record else line
+            # An odd number of quotes means a quoted field continues on the next line
+            self._record = (start, record) if record.count('"') % 2 else None
+            return None if self._record else self._parse_csv(start, record)
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            return self.line_no, f"Invalid JSON: {e}"
+        if not isinstance(row, dict):
+            return self.line_no, "Expected a JSON object"
+        return self.line_no, row
+
+    def _parse_csv(self, line_no: int, record: str):
+        record = record.strip()
+        if not record:
+            return None
+        values = next(csv.reader([record]))
+        if self.header is None:
+            self.header = [name.strip() for name in values]
+            return None
+        if len(values) != len(self.header):
+            return line_no, f"Expected {len(self.header)} columns, got {len(values)}"
+        return line_no, dict(zip(self.header, values))
+
+# -------------------------------
+# Import
+# -------------------------------
+def _error_text(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def fail(self, line_no: int, message: str):
+        self.failed += 1
+        if len(self.errors) < BULK_MAX_ERRORS:
+            self.errors.append({"line": line_no, "error": message})
+
+    def as_dict(self):
+        return {"created": self.created, "failed": self.failed, "errors": self.errors}
+
+class _IdsUnknown(Exception):
+    """The batch insert cannot tell which ids its rows got."""
+
+def import_chunk(db: Session, sender_id: int, rows, report: ImportReport):
+    """Validate, price and insert one chunk of (line_no, row) pairs in a single transaction."""
+    valid = []
+    for line_no, row in rows:
+        if isinstance(row, str):
+            report.fail(line_no, row)
+            continue
+        try:
+            valid.append((line_no, utils.OrderCreate.model_validate(row)))
+        except ValidationError as e:
+            report.fail(line_no, _error_text(e))
+    if not valid:
+        return
+
+    # Same server-side coordinates and distances as create_order, each distinct value computed once
+    points = {}
+    distances = {}
+    records = []
+    for _, order in valid:
+        source = (order.source_city, order.source_lat, order.source_lon)
+        dest = (order.dest_city, order.dest_lat, order.dest_lon)
+        if source not in points:
+            points[source] = utils.resolve_point(*source)
+        if dest not in points:
+            points[dest] = utils.resolve_point(*dest)
+        pickup, drop = points[source], points[dest]
+
+        lane = (order.source_city, order.dest_city)
+        if lane in utils.CITY_DISTANCES:
+            distance_km = utils.CITY_DISTANCES[lane]
+        else:
+            if (pickup, drop) not in distances:
+                distances[(pickup, drop)] = utils.haversine_distance(*pickup, *drop)
+            distance_km = distances[(pickup, drop)]
+        records.append({
+            "sender_id": sender_id,
+            "source_city": order.source_city,
+            "dest_city": order.dest_city,
+            "distance_km": distance_km,
+            "source_lat": pickup[0],
+            "source_lon": pickup[1],
+            "dest_lat": drop[0],
+            "dest_lon": drop[1],
+            "weight_kg": order.weight_kg,
+            "item_type": order.item_type,
+            "status": "pending",
+        })
+
+    prices = price_for_distance_batch(
+        [r["distance_km"] for r in records],
+        [r["weight_kg"] for r in records],
+        [r["item_type"] for r in records],
+    ).tolist()
+    created_at = datetime.utcnow()
+    rollup = analytics.Rollup()
+    for record, price in zip(records, prices):
+        record["price"] = price
+        record["created_at"] = created_at
+        rollup.add(created_at, record["source_city"], record["dest_city"], record["item_type"], orders=1, revenue=price)
+
+    def write(per_row=False):
+        if per_row:
+            ids = [db.execute(ORDERS.insert().returning(ORDERS.c.id), record).scalar_one() for record in records]
+        elif IS_SQLITE:
+            # Ordered RETURNING would fall back to one INSERT per row here. SQLite gives each row
+            # max(rowid) + 1 and holds the write lock from the first insert until commit, so the
+            # chunk is normally the contiguous id range ending at the current maximum.
+            db.execute(ORDERS.insert(), records)
+            last = db.scalar(select(func.max(ORDERS.c.id)))
+            ids = list(range(last - len(records) + 1, last + 1))
+            ours = db.scalar(select(func.count()).select_from(ORDERS).where(
+                ORDERS.c.id.between(ids[0], ids[-1]),
+                ORDERS.c.sender_id == sender_id, ORDERS.c.created_at == created_at,
+            ))
+            if ours != len(records):
+                raise _IdsUnknown
+        else:
+            ids = db.scalars(
+                ORDERS.insert().returning(ORDERS.c.id, sort_by_parameter_order=True),
+                records,
+            ).all()
+            if len(ids) != len(records):
+                raise _IdsUnknown
+        lanes = {(record["source_city"], record["dest_city"]) for record in records}
+        utils.bump_versions(db, "orders", *utils.board_versions(*lanes))
+        rollup.apply(db)
+        return ids
+
+    try:
+        try:
+            ids = utils.commit_with_retry(db, write)
+        except _IdsUnknown:
+            # Something else wrote in between (a trigger, a foreign writer): redo the chunk row by row
+            db.rollback()
+            ids = utils.commit_with_retry(db, lambda: write(per_row=True))
+    except (SQLAlchemyError, HTTPException) as e:
+        # The chunk is lost as a whole, but later chunks still get their chance
+        db.rollback()
+        message = e.detail if isinstance(e, HTTPException) else f"Database error: {e.__class__.__name__}"
+        for line_no, _ in valid:
+            report.fail(line_no, message)
+        return
+    report.created += len(ids)
+
+    created_iso = created_at.isoformat()
+    for order_id, record in zip(ids, records):
+        utils.order_index.add(
+            order_id, created_at,
+            (record["source_lat"], record["source_lon"]), (record["dest_lat"], record["dest_lon"]),
+        )
+        payload = {name: record.get(name) for name in utils.ORDER_EVENT_FIELDS}
+        payload.update(id=order_id, created_at=created_iso)
+        events.publish(events.ORDER_CREATED, payload)
+
+def require_sender(db: Session, user) -> int:
+    sender_id = utils.get_user_profiles(db, user).sender_id
+    if not sender_id:
+        raise HTTPException(status_code=400, detail="You must create a Sender profile first")
+    return sender_id
+
+async def import_stream(db, sender_id: int, body, fmt: str = "jsonl", chunk_size: int = BULK_CHUNK_SIZE) -> dict:
+    """Import an async iterable of raw bytes (a request body) without buffering all of it."""
+    parser = RowParser(fmt)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    report = ImportReport()
+    chunk = []
+    async for data in body:
+        chunk.extend(parser.feed(decoder.decode(data)))
+        if len(chunk) >= chunk_size:
+            await utils.run_blocking(db, import_chunk, sender_id, chunk, report)
+            chunk = []
+    chunk.extend(parser.feed(decoder.decode(b"", final=True)))
+    chunk.extend(parser.close())
+    if chunk:
+        await utils.run_blocking(db, import_chunk, sender_id, chunk, report)
+    return report.as_dict()
+
+def import_file(db: Session, sender_id: int, f, fmt: str = "jsonl", chunk_size: int = BULK_CHUNK_SIZE) -> dict:
+    """Import every row of an open text file, chunk by chunk."""
+    parser = RowParser(fmt)
+    report = ImportReport()
+    chunk = []
+    for line in f:
+        chunk.extend(parser.feed(line))
+        if len(chunk) >= chunk_size:
+            import_chunk(db, sender_id, chunk, report)
+            chunk = []
+    chunk.extend(parser.close())
+    if chunk:
+        import_chunk(db, sender_id, chunk, report)
+    return report.as_dict()
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from database import SessionLocal, engine
+    from migrate import upgrade
+
+    cli = argparse.ArgumentParser(description="Bulk-import orders for one sender")
+    cli.add_argument("path", help="JSON-lines or CSV file ('-' for stdin)")
+    cli.add_argument("--sender-id", type=int, required=True)
+    cli.add_argument("--format", choices=FORMATS, help="defaults to the file extension")
+    cli.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE)
+    args = cli.parse_args()
+
+    upgrade(engine)
+    db = SessionLocal()
+    try:
+        if db.get(models.Sender, args.sender_id) is None:
+            raise SystemExit(f"✗ Sender {args.sender_id} does not exist")
+        fmt = args.format or format_for(filename=args.path)
+        started = time.perf_counter()
+        f = io.TextIOWrapper(os.fdopen(0, "rb"), encoding="utf-8") if args.path == "-" \
+            else open(args.path, encoding="utf-8", newline="")
+        with f:
+            result = import_file(db, args.sender_id, f, fmt, args.chunk_size)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+
+    for error in result["errors"]:
+        print(f"  line {error['line']}: {error['error']}")
+    print(f"✓ Imported {result['created']} orders ({result['failed']} failed) in {elapsed:.2f}s")
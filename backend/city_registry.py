@@ -0,0 +1,180 @@
+"""
+City / hub registry with a spatial index for nearest-hub lookups.
+
+Hubs are indexed in a KD-tree over their 3D unit-sphere coordinates.
+Working in 3D avoids the longitude wrap-around and pole problems of a
+lat/lon index: the straight-line (chord) distance between two points is a
+monotonic function of their great-circle distance, so the chord ranking is
+the great-circle ranking. The tree adapts to clustered data (thousands of
+pincodes around a few metros) where a fixed-size grid degrades.
+"""
+import csv
+import heapq
+from math import radians, cos, sin
+import numpy as np
+from courier_pricing import haversine_distance
+
+EARTH_RADIUS_KM = 6371
+LEAF_SIZE = 16
+
+def _unit_vector(lat, lon):
+    lat, lon = radians(lat), radians(lon)
+    return cos(lat) * cos(lon), cos(lat) * sin(lon), sin(lat)
+
+def _chord_for_km(distance_km: float) -> float:
+    """Chord length on the unit sphere for a great-circle distance."""
+    return 2 * sin(min(distance_km / EARTH_RADIUS_KM, np.pi) / 2)
+
+class CityRegistry:
+    def __init__(self, cities: dict = None):
+        self._names = []
+        self._coords = {}
+        self._tree = None
+        self.version = 0  # bumped on every change, so derived structures (the route graph) know to rebuild
+        if cities:
+            for name, c in cities.items():
+                self.add(name, c["lat"], c["lon"])
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._coords
+
+    def add(self, name: str, lat: float, lon: float):
+        if name not in self._coords:
+            self._names.append(name)
+        self._coords[name] = (lat, lon)
+        self._tree = None  # rebuilt lazily on the next query
+        self.version += 1
+
+    def load_csv(self, path: str) -> int:
+        """Load hubs from a CSV with name, lat, lon columns. Returns the number of rows read."""
+        count = 0
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                self.add(row["name"], float(row["lat"]), float(row["lon"]))
+                count += 1
+        return count
+
+    def get(self, name: str):
+        """(lat, lon) for a known hub, or None."""
+        return self._coords.get(name)
+
+    def hubs(self):
+        """[(name, (lat, lon))] in insertion order."""
+        return [(name, self._coords[name]) for name in self._names]
+
+    # -------------------------------
+    # Index
+    # -------------------------------
+    def _build(self):
+        """
+        Nodes are ("leaf", [(id, x, y, z), ...]) or (axis, split, left, right).
+        Leaves hold plain tuples: candidate sets are tiny, so Python math beats
+        numpy call overhead at query time.
+        """
+        xyz = np.array(
+            [_unit_vector(*self._coords[name]) for name in self._names], dtype=np.float64
+        ).reshape(-1, 3)
+
+        def build(ids):
+            if len(ids) <= LEAF_SIZE:
+                return ("leaf", [(int(i), *xyz[i].tolist()) for i in ids])
+            pts = xyz[ids]
+            axis = int(np.argmax(pts.max(axis=0) - pts.min(axis=0)))
+            mid = len(ids) // 2
+            order = np.argpartition(pts[:, axis], mid)
+            split = float(pts[order[mid], axis])
+            return (axis, split, build(ids[order[:mid]]), build(ids[order[mid:]]))
+
+        self._tree = build(np.arange(len(self._names)))
+
+    def _ensure_index(self):
+        if self._tree is None:
+            self._build()
+
+    def _result(self, lat, lon, ids):
+        out = []
+        for i in ids:
+            name = self._names[i]
+            hub_lat, hub_lon = self._coords[name]
+            out.append((name, haversine_distance(lat, lon, hub_lat, hub_lon)))
+        return out
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+    def nearest(self, lat: float, lon: float, k: int = 1):
+        """The k closest hubs as [(name, distance_km)], nearest first."""
+        if not self._names or k <= 0:
+            return []
+        self._ensure_index()
+        q = _unit_vector(lat, lon)
+        qx, qy, qz = q
+
+        heap = []  # max-heap of the best k as (-squared chord, -id)
+        stack = [(self._tree, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if len(heap) == k and bound > -heap[0][0]:
+                continue
+            if node[0] == "leaf":
+                for i, x, y, z in node[1]:
+                    d2 = (x - qx) ** 2 + (y - qy) ** 2 + (z - qz) ** 2
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-d2, -i))
+                    elif (-d2, -i) > heap[0]:
+                        heapq.heapreplace(heap, (-d2, -i))
+                continue
+            axis, split, left, right = node
+            diff = q[axis] - split
+            near, far = (left, right) if diff < 0 else (right, left)
+            # Visit the near side first (pushed last), the far side only if it can still win
+            stack.append((far, diff * diff))
+            stack.append((near, bound))
+        return self._result(lat, lon, [-i for _, i in sorted(heap, reverse=True)])
+
+    def within(self, lat: float, lon: float, radius_km: float):
+        """All hubs within radius_km as [(name, distance_km)], nearest first."""
+        if not self._names or radius_km < 0:
+            return []
+        self._ensure_index()
+        q = _unit_vector(lat, lon)
+        qx, qy, qz = q
+        # Pad by the 0.005 km that rounding in haversine_distance can hide
+        limit = _chord_for_km(radius_km + 0.005) ** 2
+
+        found = []
+        stack = [self._tree]
+        while stack:
+            node = stack.pop()
+            if node[0] == "leaf":
+                for i, x, y, z in node[1]:
+                    d2 = (x - qx) ** 2 + (y - qy) ** 2 + (z - qz) ** 2
+                    if d2 <= limit:
+                        found.append((d2, i))
+                continue
+            axis, split, left, right = node
+            diff = q[axis] - split
+            if diff < 0 or diff * diff <= limit:
+                stack.append(left)
+            if diff >= 0 or diff * diff <= limit:
+                stack.append(right)
+        hubs = self._result(lat, lon, [i for _, i in sorted(found)])
+        return [(name, d) for name, d in hubs if d <= radius_km]
+
+    def resolve(self, name: str, lat: float, lon: float, snap_radius_km: float = 0):
+        """
+        Server-side coordinates for a shipment endpoint: the hub's own coordinates
+        when the name is known, else the nearest hub within snap_radius_km, else
+        the given coordinates unchanged.
+        """
+        known = self.get(name) if name else None
+        if known:
+            return known
+        if snap_radius_km > 0:
+            hit = self.nearest(lat, lon, k=1)
+            if hit and hit[0][1] <= snap_radius_km:
+                return self._coords[hit[0][0]]
+        return lat, lon
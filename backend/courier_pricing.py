@@ -1,13 +1,46 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 from math import *
+import numpy as np
 
 # note: this module provides helper functions and response models used by main.py
-app = FastAPI()
 
 class PriceResponse(BaseModel):
     price: int
 
+MAX_BATCH_ROWS = 100_000
+
+class PriceBatchRequest(BaseModel):
+    """Columnar payload: row i is (lat1[i], lon1[i], lat2[i], lon2[i], weight_kg[i], item_type[i])."""
+    lat1: list[float]
+    lon1: list[float]
+    lat2: list[float]
+    lon2: list[float]
+    weight_kg: list[float]
+    item_type: list[str]
+
+    @model_validator(mode="after")
+    def check_lengths(self):
+        lengths = {len(column) for column in (self.lat1, self.lon1, self.lat2, self.lon2, self.weight_kg, self.item_type)}
+        if len(lengths) != 1:
+            raise ValueError("All columns must have the same length")
+        if lengths.pop() > MAX_BATCH_ROWS:
+            raise ValueError(f"At most {MAX_BATCH_ROWS} rows per batch")
+        return self
+
+class PriceBatchResponse(BaseModel):
+    prices: list[int]
+
+BASE_FEE = 49
+MIN_PRICE = 100
+MAX_PRICE = 1499
+
+# Slabs as (upper bound inclusive, fee); anything above the last bound pays the *_OVER fee
+DISTANCE_SLABS = [(200, 40), (500, 80), (1000, 140), (1500, 200)]
+DISTANCE_FEE_OVER = 260
+WEIGHT_SLABS = [(1, 0), (5, 75), (10, 200)]
+WEIGHT_FEE_OVER = 400
+RISK_FEES = {"normal": 0, "documents": 40, "fragile": 150, "electronics": 200}
+
 def haversine_distance(lat1, lon1, lat2, lon2):
     R = 6371  # km
     lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
@@ -16,34 +49,83 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
     c = 2*atan2(sqrt(a), sqrt(1-a))
     return round(R * c, 2)
-def price_calculator(lat1: float, lon1: float, lat2: float, lon2: float, weight_kg: float, item_type: str):
-    BASE_FEE = 49
-    MIN_PRICE = 100
-    MAX_PRICE = 1499
-
-    distance_km = haversine_distance(lat1, lon1, lat2, lon2)
-    # Distance slabs
-    if distance_km <= 200: distance_fee = 40
-    elif distance_km <= 500: distance_fee = 80
-    elif distance_km <= 1000: distance_fee = 140
-    elif distance_km <= 1500: distance_fee = 200
-    else: distance_fee = 260
 
+def _slab_fee(value, slabs, over_fee):
+    for bound, fee in slabs:
+        if value <= bound:
+            return fee
+    return over_fee
 
-    # Weight fee
-    if weight_kg <= 1: weight_fee = 0
-    elif weight_kg <= 5: weight_fee = 75
-    elif weight_kg <= 10: weight_fee = 200
-    else: weight_fee = 400
+def weight_slab(weight_kg: float) -> int:
+    """Index of the weight slab; every weight in the same slab pays the same fee."""
+    for i, (bound, _) in enumerate(WEIGHT_SLABS):
+        if weight_kg <= bound:
+            return i
+    return len(WEIGHT_SLABS)
 
-    # Risk fee
-    fees = {"normal":0, "documents":40, "fragile":150, "electronics":200}
-    risk_fee = fees.get(item_type.lower(), 0)
+def price_for_distance(distance_km: float, weight_kg: float, item_type: str):
+    """Price a shipment whose (rounded) haversine distance is already known."""
+    distance_fee = _slab_fee(distance_km, DISTANCE_SLABS, DISTANCE_FEE_OVER)
+    weight_fee = _slab_fee(weight_kg, WEIGHT_SLABS, WEIGHT_FEE_OVER)
+    risk_fee = RISK_FEES.get(item_type.lower(), 0)
 
     total = BASE_FEE + distance_fee + weight_fee + risk_fee
     total = max(MIN_PRICE, min(total, MAX_PRICE))
 
     return PriceResponse(price=total)
 
+def price_calculator(lat1: float, lon1: float, lat2: float, lon2: float, weight_kg: float, item_type: str):
+    distance_km = haversine_distance(lat1, lon1, lat2, lon2)
+    return price_for_distance(distance_km, weight_kg, item_type)
 
-    
\ No newline at end of file
+# -------------------------------
+# Vectorized pricing
+# -------------------------------
+# Batch distances this close to a slab bound are recomputed with the scalar haversine_distance
+BOUND_MARGIN_KM = 0.02
+
+def haversine_distance_batch(lat1, lon1, lat2, lon2):
+    """Array version of haversine_distance (km, rounded to 2 decimals)."""
+    R = 6371  # km
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+    c = 2*np.arctan2(np.sqrt(a), np.sqrt(1-a))
+    return np.round(R * c, 2)
+
+def _slab_fee_batch(values, slabs, over_fee):
+    bounds = np.array([bound for bound, _ in slabs], dtype=np.float64)
+    fees = np.array([fee for _, fee in slabs] + [over_fee], dtype=np.int64)
+    # side="left" picks the first bound >= value, matching the scalar `value <= bound`
+    return fees[np.searchsorted(bounds, values, side="left")]
+
+def price_calculator_batch(lat1, lon1, lat2, lon2, weight_kg, item_type) -> np.ndarray:
+    """
+    Price many shipments in one pass. Takes equal-length columns and returns an
+    int64 array identical to calling price_calculator row by row.
+    """
+    lat1, lon1, lat2, lon2 = (np.asarray(v, dtype=np.float64).reshape(-1) for v in (lat1, lon1, lat2, lon2))
+    distance_km = haversine_distance_batch(lat1, lon1, lat2, lon2)
+    # np.round (scale, round half to even, unscale) and numpy's trig can land 0.01 km away from
+    # Python's round() and math on a half-way or last-ulp case. That only moves the price when it
+    # crosses a distance slab bound, so rows that close to one take the scalar path.
+    bounds = np.array([bound for bound, _ in DISTANCE_SLABS], dtype=np.float64)
+    near = (np.abs(distance_km[:, None] - bounds) <= BOUND_MARGIN_KM).any(axis=1)
+    for i in np.flatnonzero(near):
+        distance_km[i] = haversine_distance(lat1[i], lon1[i], lat2[i], lon2[i])
+    return price_for_distance_batch(distance_km, weight_kg, item_type)
+
+def price_for_distance_batch(distance_km, weight_kg, item_type) -> np.ndarray:
+    """Array version of price_for_distance for distances that are already known."""
+    distance_km = np.asarray(distance_km, dtype=np.float64)
+    distance_fee = _slab_fee_batch(distance_km, DISTANCE_SLABS, DISTANCE_FEE_OVER)
+    weight_fee = _slab_fee_batch(np.asarray(weight_kg, dtype=np.float64), WEIGHT_SLABS, WEIGHT_FEE_OVER)
+
+    # Map each distinct item type once instead of once per row
+    kinds, inverse = np.unique(np.asarray(item_type, dtype=str), return_inverse=True)
+    kind_fees = np.array([RISK_FEES.get(kind.lower(), 0) for kind in kinds], dtype=np.int64)
+    risk_fee = kind_fees[inverse.reshape(-1)] if len(kinds) else np.zeros(0, dtype=np.int64)
+
+    total = BASE_FEE + distance_fee + weight_fee + risk_fee
+    return np.clip(total, MIN_PRICE, MAX_PRICE)
@@ -0,0 +1,498 @@
+"""
+Batch dispatch: assign pending orders to travellers in one optimised pass.
+
+accept_order lets travellers claim orders one at a time, first come first
+served. A dispatch window instead looks at every pending order and every
+traveller route together. Carrying an order on a route A -> B costs
+
+    detour_km * (1 + (weight slab fee + risk fee) / 100)
+
+with the fees from courier_pricing, so heavy and fragile items go to the
+straightest routes. Each traveller takes at most DISPATCH_MAX_ORDERS orders
+and DISPATCH_MAX_KG kilograms, counting what they already carry.
+
+Travellers on the same route are interchangeable, and so are orders sharing
+pickup, drop, weight slab and risk class. The problem is therefore solved
+between those groups: a min-cost max-flow from order groups to route lanes,
+where each lane can take as many orders as its travellers have free slots.
+Candidate edges are the group/lane pairs within the detour budget (the
+same rule as /travellers/me/matches), computed with numpy a block of lanes
+at a time and capped at DISPATCH_CANDIDATES groups per lane. The flow is exact for the slot limits: it assigns as many orders as possible at
+the lowest total cost. It is then unpacked onto orders (oldest first) and
+travellers (tightest fit on remaining kg); an order no traveller on its lane
+has the kilograms for stays unassigned in that round and is offered again,
+with what is left of every traveller, in the next one (DISPATCH_ROUNDS).
+
+The solver runs one shortest-path phase per distinct marginal cost, so its
+time grows with the number of groups times the cost range. Orders stored
+at hub coordinates (create_order, bulk_import) collapse into few groups;
+for raw coordinates DISPATCH_COST_UNIT_KM trades cost resolution for speed.
+
+    python dispatch.py                # propose only
+    python dispatch.py --commit       # claim the assignments in one transaction
+    python dispatch.py --bench 1000,5000,10000
+"""
+import bisect
+import heapq
+import hmac
+import os
+import time
+from collections import namedtuple, defaultdict
+from datetime import datetime
+from fastapi import Header, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import case, select, update, func
+from sqlalchemy.orm import Session
+import models
+import utils
+import events
+import analytics
+import numpy as np
+from courier_pricing import haversine_distance_batch, weight_slab, WEIGHT_SLABS, WEIGHT_FEE_OVER, RISK_FEES
+
+DISPATCH_MAX_ORDERS = int(os.environ.get("DISPATCH_MAX_ORDERS", "5"))  # per traveller, including current load
+DISPATCH_MAX_KG = float(os.environ.get("DISPATCH_MAX_KG", "25"))
+DISPATCH_CANDIDATES = int(os.environ.get("DISPATCH_CANDIDATES", "1000"))  # order groups kept per lane
+DISPATCH_ROUNDS = int(os.environ.get("DISPATCH_ROUNDS", "3"))  # re-solves for orders the kg limits left over
+DISPATCH_COST_UNIT_KM = float(os.environ.get("DISPATCH_COST_UNIT_KM", "1"))  # cost resolution of the flow
+DISPATCH_API_KEY = os.environ.get("DISPATCH_API_KEY")  # operator routes are disabled while unset
+
+ORDERS = models.Order.__table__
+# Orders per claiming UPDATE: two bound parameters each, well under SQLite's variable limit
+CLAIM_CHUNK_SIZE = 1000
+
+PendingOrder = namedtuple("PendingOrder", ["id", "created_at", "pickup", "drop", "weight_kg", "item_type",
+                                           "sender_key", "event"])
+TravellerRoute = namedtuple("TravellerRoute", ["id", "origin", "destination", "free_slots", "free_kg", "key"])
+
+class DispatchAssignment(BaseModel):
+    order_id: int
+    traveller_id: int
+    detour_km: float
+
+class DispatchResult(BaseModel):
+    committed: bool
+    orders: int
+    travellers: int
+    groups: int
+    lanes: int
+    candidates: int
+    rounds: int
+    assigned: int
+    unassigned: int
+    conflicts: int = 0
+    total_detour_km: float
+    total_cost: float
+    seconds: dict[str, float]
+    assignments: list[DispatchAssignment]
+
+def handling_factor(weight_kg: float, item_type: str) -> float:
+    """Detour multiplier from the order's weight slab and risk fees."""
+    slab = weight_slab(weight_kg)
+    weight_fee = WEIGHT_SLABS[slab][1] if slab < len(WEIGHT_SLABS) else WEIGHT_FEE_OVER
+    return 1 + (weight_fee + RISK_FEES.get(item_type.lower(), 0)) / 100
+
+# -------------------------------
+# Min-cost flow
+# -------------------------------
+class MinCostFlow:
+    """
+    Primal-dual min-cost max-flow on integer costs: Dijkstra with potentials finds
+    the next shortest distance, then Dinic-style blocking flow saturates every path
+    of that length at once, so the number of Dijkstra runs is the number of
+    distinct path costs rather than the number of augmenting paths.
+    """
+
+    def __init__(self, n: int):
+        self.n = n
+        self.to, self.cap, self.cost = [], [], []
+        self.edges = [[] for _ in range(n)]  # node -> edge ids; edge e ^ 1 is its reverse
+
+    def add_edge(self, u: int, v: int, cap: int, cost: int) -> int:
+        e = len(self.to)
+        self.to += [v, u]
+        self.cap += [cap, 0]
+        self.cost += [cost, -cost]
+        self.edges[u].append(e)
+        self.edges[v].append(e + 1)
+        return e
+
+    def flow(self, e: int) -> int:
+        return self.cap[e ^ 1]
+
+    def solve(self, source: int, sink: int):
+        """Returns (flow, cost)."""
+        to, cap, cost, edges = self.to, self.cap, self.cost, self.edges
+        inf = float("inf")
+        potential = [0] * self.n  # every cost starts non-negative
+        total_flow = total_cost = 0
+        while True:
+            dist = [inf] * self.n
+            dist[source] = 0
+            heap = [(0, source)]
+            while heap:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                pu = potential[u]
+                for e in edges[u]:
+                    if cap[e]:
+                        v = to[e]
+                        nd = d + cost[e] + pu - potential[v]
+                        if nd < dist[v]:
+                            dist[v] = nd
+                            heapq.heappush(heap, (nd, v))
+            if dist[sink] == inf:
+                return total_flow, total_cost
+            limit = dist[sink]
+            for v in range(self.n):
+                potential[v] += dist[v] if dist[v] < limit else limit
+
+            # Blocking flow over the edges that are tight (zero reduced cost) under the new potentials
+            while True:
+                level = [-1] * self.n
+                level[source] = 0
+                queue = [source]
+                for u in queue:
+                    for e in edges[u]:
+                        v = to[e]
+                        if cap[e] and level[v] < 0 and cost[e] + potential[u] == potential[v]:
+                            level[v] = level[u] + 1
+                            queue.append(v)
+                if level[sink] < 0:
+                    break
+                cursor = [0] * self.n
+                pushed = self._push(source, sink, level, cursor, potential)
+                while pushed:
+                    total_flow += pushed
+                    total_cost += pushed * (potential[sink] - potential[source])
+                    pushed = self._push(source, sink, level, cursor, potential)
+
+    def _push(self, source, sink, level, cursor, potential):
+        """One augmenting path through the level graph (iterative DFS); returns the amount pushed."""
+        to, cap, cost, edges = self.to, self.cap, self.cost, self.edges
+        path = []  # edge ids from source
+        u = source
+        while True:
+            if u == sink:
+                amount = min(cap[e] for e in path)
+                for e in path:
+                    cap[e] -= amount
+                    cap[e ^ 1] += amount
+                return amount
+            advanced = False
+            while cursor[u] < len(edges[u]):
+                e = edges[u][cursor[u]]
+                v = to[e]
+                if cap[e] and level[v] == level[u] + 1 and cost[e] + potential[u] == potential[v]:
+                    path.append(e)
+                    u = v
+                    advanced = True
+                    break
+                cursor[u] += 1
+            if advanced:
+                continue
+            if u == source:
+                return 0
+            level[u] = -1  # dead end for the rest of this phase
+            e = path.pop()
+            u = to[e ^ 1]
+            cursor[u] += 1
+
+# -------------------------------
+# Planning
+# -------------------------------
+def plan(orders, travellers, max_detour_km: float = utils.MATCH_DETOUR_KM,
+         candidates: int = DISPATCH_CANDIDATES, rounds: int = DISPATCH_ROUNDS):
+    """
+    Assign PendingOrders to TravellerRoutes. Returns (assignments, stats) where
+    assignments are (order, traveller_id, detour_km, cost) tuples.
+    """
+    timings = defaultdict(float)
+    stats = {"orders": len(orders), "travellers": len(travellers), "rounds": 0}
+    assignments = []
+    for _ in range(rounds):
+        found, shape = _solve(orders, travellers, max_detour_km, candidates, timings)
+        if not stats["rounds"]:
+            stats.update(shape)
+        stats["rounds"] += 1
+        assignments += found
+        if not found:
+            break
+        # Orders the kg limits kept off their lane get another try on the room that is left
+        placed = {order.id for order, _, _, _ in found}
+        orders = [order for order in orders if order.id not in placed]
+        if not orders:
+            break
+        used = defaultdict(lambda: [0, 0.0])
+        for order, traveller_id, _, _ in found:
+            used[traveller_id][0] += 1
+            used[traveller_id][1] += order.weight_kg
+        travellers = [
+            t._replace(free_slots=t.free_slots - used[t.id][0], free_kg=t.free_kg - used[t.id][1]) if t.id in used else t
+            for t in travellers
+        ]
+    stats["seconds"] = dict(timings)
+    return assignments, stats
+
+def _solve(orders, travellers, max_detour_km, candidates, timings):
+    """One flow + unpack round; adds its phase times to timings."""
+    started = time.perf_counter()
+
+    # Interchangeable orders / travellers
+    groups = defaultdict(list)  # (pickup, drop, slab, risk class) -> orders
+    for order in orders:
+        risk = order.item_type.lower() if order.item_type.lower() in RISK_FEES else ""
+        groups[(order.pickup, order.drop, weight_slab(order.weight_kg), risk)].append(order)
+    lanes = defaultdict(list)  # (origin, destination) -> travellers with room left
+    for traveller in travellers:
+        if traveller.free_slots > 0 and traveller.free_kg > 0:
+            lanes[(traveller.origin, traveller.destination)].append(traveller)
+    group_keys = list(groups)
+    lane_keys = list(lanes)
+
+    pickup = np.array([key[0] for key in group_keys], dtype=np.float64).reshape(-1, 2)
+    drop = np.array([key[1] for key in group_keys], dtype=np.float64).reshape(-1, 2)
+    lane_km = haversine_distance_batch(pickup[:, 0], pickup[:, 1], drop[:, 0], drop[:, 1])
+    lightest = np.array([min(o.weight_kg for o in groups[key]) for key in group_keys])
+    factor = np.array([handling_factor(groups[key][0].weight_kg, groups[key][0].item_type) for key in group_keys])
+
+    source, sink = 0, 1
+    first_group, first_lane = 2, 2 + len(group_keys)
+    graph = MinCostFlow(first_lane + len(lane_keys))
+    for g, key in enumerate(group_keys):
+        graph.add_edge(source, first_group + g, len(groups[key]), 0)
+    edge_of = {}  # flow edge -> (group, lane, detour)
+    for l, key in enumerate(lane_keys):
+        graph.add_edge(first_lane + l, sink, sum(t.free_slots for t in lanes[key]), 0)
+    origin = np.array([key[0] for key in lane_keys], dtype=np.float64).reshape(-1, 2)
+    destination = np.array([key[1] for key in lane_keys], dtype=np.float64).reshape(-1, 2)
+    direct_km = haversine_distance_batch(origin[:, 0], origin[:, 1], destination[:, 0], destination[:, 1])
+    roomiest = np.array([max(t.free_kg for t in lanes[key]) for key in lane_keys])
+    # Detours d(A, P) + d(P, Q) + d(Q, B) - d(A, B) for a block of lanes x every group at once
+    block = max(1, (1 << 20) // max(1, len(group_keys)))
+    for first in range(0, len(lane_keys), block):
+        rows = slice(first, first + block)
+        head = haversine_distance_batch(origin[rows, :1], origin[rows, 1:], pickup[:, 0], pickup[:, 1])
+        tail = haversine_distance_batch(drop[:, 0], drop[:, 1], destination[rows, :1], destination[rows, 1:])
+        detours = np.round(np.maximum(head + lane_km + tail - direct_km[rows, None], 0.0), 2)
+        for i, detour in enumerate(detours):
+            l = first + i
+            fits = np.flatnonzero((detour <= max_detour_km) & (lightest <= roomiest[l]))
+            if len(fits) > candidates:
+                fits = fits[np.argpartition(detour[fits], candidates)[:candidates]]
+            costs = np.rint(detour[fits] * factor[fits] / DISPATCH_COST_UNIT_KM).astype(np.int64)
+            for g, cost, km in zip(fits.tolist(), costs.tolist(), detour[fits].tolist()):
+                e = graph.add_edge(first_group + g, first_lane + l, len(groups[group_keys[g]]), cost)
+                edge_of[e] = (g, l, km)
+    timings["candidates"] += time.perf_counter() - started
+
+    started = time.perf_counter()
+    graph.solve(source, sink)
+    timings["solve"] += time.perf_counter() - started
+
+    # Unpack group -> lane flows onto individual orders and travellers
+    started = time.perf_counter()
+    assignments = []
+    queues = {key: sorted(groups[key], key=lambda o: (o.created_at, o.id)) for key in group_keys}
+    per_lane = defaultdict(list)  # lane -> [(order, detour, cost)]
+    for e, (g, l, detour) in edge_of.items():
+        amount = graph.flow(e)
+        if amount:
+            queue = queues[group_keys[g]]
+            taken, queues[group_keys[g]] = queue[:amount], queue[amount:]
+            per_lane[l].extend((order, detour, detour * float(factor[g])) for order in taken)
+    for l, items in per_lane.items():
+        # Travellers with room as (free kg, id, slots left, key), sorted; heaviest orders
+        # go first, each to the traveller it leaves the least room in (best fit)
+        room = sorted((t.free_kg, t.id, t.free_slots, t.key) for t in lanes[lane_keys[l]])
+        for order, detour, cost in sorted(items, key=lambda item: -item[0].weight_kg):
+            i = bisect.bisect_left(room, (order.weight_kg,))
+            while i < len(room) and room[i][3] == order.sender_key:
+                i += 1
+            if i == len(room):
+                continue
+            kg, traveller_id, slots, key = room.pop(i)
+            if slots > 1:
+                bisect.insort(room, (kg - order.weight_kg, traveller_id, slots - 1, key))
+            assignments.append((order, traveller_id, detour, cost))
+    timings["unpack"] += time.perf_counter() - started
+    return assignments, {"groups": len(group_keys), "lanes": len(lane_keys), "candidates": len(edge_of)}
+
+# -------------------------------
+# Database
+# -------------------------------
+def load_problem(db: Session, max_orders: int = DISPATCH_MAX_ORDERS, max_kg: float = DISPATCH_MAX_KG):
+    """Pending, unassigned orders and every traveller route with the room it has left."""
+    orders = []
+    rows = db.execute(
+        select(ORDERS, models.Sender.supabase_id)
+        .join(models.Sender, models.Sender.id == ORDERS.c.sender_id)
+        .where(ORDERS.c.status == "pending", ORDERS.c.traveller_id.is_(None))
+    )
+    for row in rows:
+        pickup, drop = utils._order_points(row)
+        if not pickup or not drop:
+            continue
+        event = {name: getattr(row, name) for name in utils.ORDER_EVENT_FIELDS}
+        event["created_at"] = row.created_at.isoformat() if row.created_at else None
+        orders.append(PendingOrder(row.id, row.created_at or datetime.min, pickup, drop, row.weight_kg,
+                                   row.item_type, row.supabase_id, event))
+
+    load = {
+        traveller_id: (count, kg or 0.0)
+        for traveller_id, count, kg in db.execute(
+            select(ORDERS.c.traveller_id, func.count(), func.sum(ORDERS.c.weight_kg))
+            .where(ORDERS.c.status == "accepted", ORDERS.c.traveller_id.is_not(None))
+            .group_by(ORDERS.c.traveller_id)
+        )
+    }
+    travellers = []
+    for tid, key, source_city, dest_city in db.execute(
+        select(models.Traveller.id, models.Traveller.supabase_id, models.Traveller.source_city, models.Traveller.dest_city)
+    ):
+        origin, destination = utils.city_registry.get(source_city), utils.city_registry.get(dest_city)
+        if not origin or not destination:
+            continue
+        count, kg = load.get(tid, (0, 0.0))
+        # Profiles without a login (seeded data) never match an order's sender
+        travellers.append(TravellerRoute(tid, origin, destination, max_orders - count, max_kg - kg, key or object()))
+    return orders, travellers
+
+def commit_assignments(db: Session, assignments):
+    """Claim every assignment in one transaction; returns the orders actually claimed."""
+    by_id = {order.id: (order, traveller_id, detour, cost) for order, traveller_id, detour, cost in assignments}
+    ids = list(by_id)
+
+    def write():
+        # One UPDATE ... RETURNING per chunk: only rows this statement changed come back, so an
+        # order accepted concurrently (even by the same traveller through accept_order) is not ours
+        got = []
+        for i in range(0, len(ids), CLAIM_CHUNK_SIZE):
+            chunk = ids[i:i + CLAIM_CHUNK_SIZE]
+            claim = update(ORDERS).where(
+                ORDERS.c.id.in_(chunk),
+                ORDERS.c.status == "pending",
+                ORDERS.c.traveller_id.is_(None),
+            ).values(
+                traveller_id=case({order_id: by_id[order_id][1] for order_id in chunk}, value=ORDERS.c.id),
+                status="accepted",
+            ).returning(ORDERS.c.id)
+            got.extend(db.scalars(claim).all())
+        got = set(got)
+        claimed = [a for a in assignments if a[0].id in got]
+        if claimed:
+            lanes = {(order.event["source_city"], order.event["dest_city"]) for order, _, _, _ in claimed}
+            utils.bump_versions(db, "orders", *utils.board_versions(*lanes))
+            rollup = analytics.Rollup()
+            for order, _, _, _ in claimed:
+                event = order.event
+                rollup.add(order.created_at, event["source_city"], event["dest_city"], event["item_type"], accepted=1)
+            rollup.apply(db)
+        return claimed
+
+    claimed = utils.commit_with_retry(db, write) if ids else []
+    for order, traveller_id, _, _ in claimed:
+        utils.order_index.remove(order.id)
+        events.publish(events.ORDER_ACCEPTED, dict(order.event, traveller_id=traveller_id, status="accepted"))
+    return claimed
+
+def dispatch(db: Session, commit: bool = False, max_detour_km: float = utils.MATCH_DETOUR_KM,
+             max_orders: int = DISPATCH_MAX_ORDERS, max_kg: float = DISPATCH_MAX_KG) -> dict:
+    started = time.perf_counter()
+    orders, travellers = load_problem(db, max_orders, max_kg)
+    load_seconds = time.perf_counter() - started
+    assignments, stats = plan(orders, travellers, max_detour_km)
+    stats["seconds"]["load"] = load_seconds
+
+    conflicts = 0
+    if commit:
+        started = time.perf_counter()
+        claimed = commit_assignments(db, assignments)
+        conflicts = len(assignments) - len(claimed)
+        assignments = claimed
+        stats["seconds"]["commit"] = time.perf_counter() - started
+
+    return {
+        "committed": commit,
+        **stats,
+        "seconds": {phase: round(s, 4) for phase, s in stats["seconds"].items()},
+        "assigned": len(assignments),
+        "unassigned": len(orders) - len(assignments),
+        "conflicts": conflicts,
+        "total_detour_km": round(sum(a[2] for a in assignments), 2),
+        "total_cost": round(sum(a[3] for a in assignments), 2),
+        "assignments": [
+            {"order_id": order.id, "traveller_id": traveller_id, "detour_km": detour}
+            for order, traveller_id, detour, _ in assignments
+        ],
+    }
+
+def require_dispatch_key(x_dispatch_key: str = Header(None)):
+    """
+    Dispatch moves every traveller's orders at once, so it takes an operator key, not a
+    user login. /metrics and /cache/stats are gated by the same key.
+    """
+    if not DISPATCH_API_KEY:
+        raise HTTPException(status_code=403, detail="Operator routes are not enabled")
+    if not x_dispatch_key or not hmac.compare_digest(x_dispatch_key, DISPATCH_API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid dispatch key")
+
+# -------------------------------
+# Benchmark
+# -------------------------------
+def synthetic_problem(n_orders: int, n_travellers: int, seed: int = 42):
+    """Orders and travellers over the CITY_DATA lanes with Zipf lane popularity, like synthetic_data."""
+    from synthetic_data import ITEM_MIX, lane_weights
+
+    rng = np.random.default_rng(seed)
+    lanes = [(src, dst) for (src, dst) in utils.CITY_DISTANCES if src != dst]
+    weights = lane_weights(lanes, 1.0, rng)
+    point = {name: (c["lat"], c["lon"]) for name, c in utils.CITY_DATA.items()}
+    item_p = np.array(list(ITEM_MIX.values()))
+    items = rng.choice(list(ITEM_MIX), size=n_orders, p=item_p / item_p.sum())
+    kgs = np.clip(np.round(rng.lognormal(1.0, 0.8, size=n_orders), 2), 0.1, 30.0)
+    orders = [
+        PendingOrder(i, i, point[lanes[l][0]], point[lanes[l][1]], float(kgs[i]), str(items[i]), None, None)
+        for i, l in enumerate(rng.choice(len(lanes), size=n_orders, p=weights))
+    ]
+    travellers = [
+        TravellerRoute(i, point[lanes[l][0]], point[lanes[l][1]], DISPATCH_MAX_ORDERS, DISPATCH_MAX_KG, i)
+        for i, l in enumerate(rng.choice(len(lanes), size=n_travellers, p=weights))
+    ]
+    return orders, travellers
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal, engine
+    from migrate import upgrade
+
+    cli = argparse.ArgumentParser(description="Assign pending orders to travellers in one batch")
+    cli.add_argument("--commit", action="store_true", help="claim the assignments (default: only propose)")
+    cli.add_argument("--max-detour-km", type=float, default=utils.MATCH_DETOUR_KM)
+    cli.add_argument("--max-orders", type=int, default=DISPATCH_MAX_ORDERS, help="per traveller")
+    cli.add_argument("--max-kg", type=float, default=DISPATCH_MAX_KG, help="per traveller")
+    cli.add_argument("--bench", help="comma-separated problem sizes (orders = travellers) to time in memory")
+    args = cli.parse_args()
+
+    if args.bench:
+        for size in (int(s) for s in args.bench.split(",") if s):
+            orders, travellers = synthetic_problem(size, size)
+            started = time.perf_counter()
+            assignments, stats = plan(orders, travellers, args.max_detour_km)
+            elapsed = time.perf_counter() - started
+            phases = "  ".join(f"{phase} {s * 1000:.0f} ms" for phase, s in stats["seconds"].items())
+            print(f"  {size:>6} x {size:<6} {elapsed * 1000:>8.0f} ms  ({phases})  groups {stats['groups']}  "
+                  f"lanes {stats['lanes']}  edges {stats['candidates']}  rounds {stats['rounds']}  assigned {len(assignments)}")
+        raise SystemExit(0)
+
+    upgrade(engine)
+    db = SessionLocal()
+    try:
+        result = dispatch(db, args.commit, args.max_detour_km, args.max_orders, args.max_kg)
+    finally:
+        db.close()
+    verb = "Assigned" if result["committed"] else "Proposed"
+    print(f"✓ {verb} {result['assigned']} of {result['orders']} orders to {result['travellers']} travellers "
+          f"({result['conflicts']} conflicts), detour {result['total_detour_km']:,.0f} km, "
+          f"{', '.join(f'{phase} {s:.2f}s' for phase, s in result['seconds'].items())}")
@@ -0,0 +1,165 @@
+"""
+Order event feed: an in-process pub/sub behind a small broker interface,
+streamed to clients as Server-Sent Events.
+
+Each event gets a monotonically increasing id (seeded from the clock, so
+ids keep growing across restarts) and is kept in a bounded backlog, so a client reconnecting with Last-Event-ID receives what it
+missed instead of reloading the whole board. A broker backed by
+Redis/NATS can replace InProcessBroker (see set_broker) when several
+workers need one shared stream.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+ORDER_CREATED = "order.created"
+ORDER_ACCEPTED = "order.accepted"
+
+EVENT_BACKLOG = int(os.environ.get("EVENT_BACKLOG", "10000"))
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", "1000"))
+HEARTBEAT_SECONDS = float(os.environ.get("EVENT_HEARTBEAT_SECONDS", "15"))
+
+class Broker(ABC):
+    """What the API needs from a pub/sub backend."""
+
+    @abstractmethod
+    def publish(self, event_type: str, data: dict) -> int:
+        ...
+
+    @abstractmethod
+    def subscribe(self):
+        """Returns a Subscription whose .queue yields published events."""
+
+    @abstractmethod
+    def unsubscribe(self, subscription):
+        ...
+
+    @abstractmethod
+    def replay(self, after_id: int):
+        """Events newer than after_id, or None when they have left the backlog."""
+
+class Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def _deliver(self, event):
+        # Runs on the subscriber's loop; a client too slow to keep up is cut off
+        # and resumes from its Last-Event-ID on reconnect.
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+class InProcessBroker(Broker):
+    def __init__(self, backlog: int = EVENT_BACKLOG):
+        self._backlog = deque(maxlen=backlog)
+        self._subscribers = set()
+        # Microseconds since the epoch: a restarted process starts above every id the old
+        # one handed out (unless it averaged over an event per microsecond), so a client's
+        # stale Last-Event-ID gets a reset instead of colliding with new ids
+        self._last_id = time.time_ns() // 1000
+        self._lock = threading.Lock()
+
+    def publish(self, event_type: str, data: dict) -> int:
+        # Called from request threads and the event loop alike
+        with self._lock:
+            self._last_id += 1
+            event = {"id": self._last_id, "type": event_type, "data": data}
+            self._backlog.append(event)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub._deliver, event)
+            except RuntimeError:  # loop already closed
+                self.unsubscribe(sub)
+        return event["id"]
+
+    def subscribe(self):
+        sub = Subscription(asyncio.get_running_loop(), SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def replay(self, after_id: int):
+        with self._lock:
+            if after_id > self._last_id:
+                return None  # id from another broker instance
+            if not self._backlog:
+                return [] if after_id >= self._last_id else None
+            if after_id < self._backlog[0]["id"] - 1:
+                return None
+            return [event for event in self._backlog if event["id"] > after_id]
+
+broker: Broker = InProcessBroker()
+
+def set_broker(new_broker: Broker):
+    global broker
+    broker = new_broker
+
+def publish(event_type: str, data: dict) -> int:
+    return broker.publish(event_type, data)
+
+# -------------------------------
+# Server-Sent Events
+# -------------------------------
+def _matches(event, source_city, dest_city):
+    data = event["data"]
+    if source_city and data.get("source_city") != source_city:
+        return False
+    if dest_city and data.get("dest_city") != dest_city:
+        return False
+    return True
+
+def _format(event) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+async def sse_stream(request, source_city: str = None, dest_city: str = None, last_event_id: str = None):
+    """Yield SSE frames for order events, replaying anything after last_event_id first."""
+    # Subscribe before replaying so nothing published in between is lost
+    sub = broker.subscribe()
+    try:
+        sent = 0
+        if last_event_id:
+            try:
+                after = int(last_event_id)
+            except ValueError:
+                after = None
+            missed = broker.replay(after) if after is not None else None
+            if missed is None:
+                # Too far behind (or a foreign id): tell the client to reload the board once
+                yield "event: reset\ndata: {}\n\n"
+            else:
+                for event in missed:
+                    sent = event["id"]
+                    if _matches(event, source_city, dest_city):
+                        yield _format(event)
+        yield "retry: 3000\n\n"
+
+        while True:
+            if await request.is_disconnected():
+                break
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if sub.overflowed:
+                break
+            if event["id"] <= sent:
+                continue  # already delivered by the replay
+            if _matches(event, source_city, dest_city):
+                yield _format(event)
+    finally:
+        broker.unsubscribe(sub)
@@ -1,19 +1,42 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Query, Header, Request
+from fastapi.responses import StreamingResponse, Response, PlainTextResponse
+from pydantic import TypeAdapter
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
-from courier_pricing import price_calculator, PriceResponse
+from datetime import date
+import asyncio
+from courier_pricing import price_calculator, price_calculator_batch, PriceResponse, PriceBatchRequest, PriceBatchResponse
 import utils
-from seed_db import seed_database
+import events
+import bulk_import
+import dispatch
+import analytics
+import write_queue
 from sqlalchemy.orm import Session
-from auth import get_current_user
+from auth import get_current_user, get_supabase, token_cache, AUTH_VERIFY_MODE
+from database import engine
+from migrate import upgrade, MIGRATE_ON_STARTUP
+from observability import TimingMiddleware, metrics, get_logger
+import logging
+
+log = get_logger("api")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: seed database
-    # seed_database() # Disabling seed for now as it might conflict with auth logic or need updates
+    # Startup: create missing tables/columns/indexes before serving (python migrate.py does the same)
+    if MIGRATE_ON_STARTUP:
+        created = await run_in_threadpool(upgrade, engine)
+        if created:
+            log.info("schema upgraded: %s", ", ".join(created))
+    # Build the Supabase client off the critical path, so neither startup nor the first request waits on it
+    if AUTH_VERIFY_MODE != "local":
+        app.state.supabase_warmup = asyncio.create_task(asyncio.to_thread(get_supabase))
+    # Likewise the route graph, which takes seconds once CITY_CSV brings in thousands of hubs
+    app.state.route_warmup = asyncio.create_task(asyncio.to_thread(utils.router.graph))
     yield
-    # Shutdown: cleanup if needed
-    pass
+    # Shutdown: commit whatever inserts are still queued
+    await asyncio.to_thread(write_queue.writer.stop)
 
 app = FastAPI(lifespan=lifespan)
 
@@ -34,69 +57,197 @@ app.add_middleware(
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
 )
+# Outermost, so its timings cover CORS handling too
+app.add_middleware(TimingMiddleware)
 
 @app.get("/users/me")
 def read_users_me(user = Depends(get_current_user)):
     return {"user_id": user.id, "email": user.email}
 
-@app.get("/route")
-def get_route(source: str, destination: str):
-    return {"message": f"Transporting from {source} to {destination}"}
+@app.get("/route", response_model=utils.RouteOut)
+def get_route(source: str, destination: str, weight_kg: float = Query(1.0, gt=0), item_type: str = "normal"):
+    return utils.plan_route(source, destination, weight_kg, item_type)
 
 @app.get("/calculate-price", response_model=PriceResponse)
 def calculate_price(lat1: float, lon1: float, lat2: float, lon2: float, weight_kg: float, item_type: str):
+    # Quote on the same hub-snapped coordinates create_order will use
+    lat1, lon1 = utils.resolve_point(None, lat1, lon1)
+    lat2, lon2 = utils.resolve_point(None, lat2, lon2)
     return price_calculator(lat1, lon1, lat2, lon2, weight_kg, item_type)
 
+@app.post("/calculate-price/batch", response_model=PriceBatchResponse)
+def calculate_price_batch(batch: PriceBatchRequest):
+    # Same hub-snapped coordinates as the scalar quote and create_order
+    lat1, lon1 = utils.resolve_points(batch.lat1, batch.lon1)
+    lat2, lon2 = utils.resolve_points(batch.lat2, batch.lon2)
+    prices = price_calculator_batch(lat1, lon1, lat2, lon2, batch.weight_kg, batch.item_type)
+    return PriceBatchResponse(prices=prices.tolist())
+
+@app.get("/cities/nearest")
+def nearest_cities(lat: float, lon: float, k: int = Query(1, ge=1, le=100)):
+    return [{"name": name, "distance_km": d} for name, d in utils.city_registry.nearest(lat, lon, k)]
+
+@app.get("/cities/within")
+def cities_within(lat: float, lon: float, radius_km: float = Query(..., ge=0, le=20000)):
+    return [{"name": name, "distance_km": d} for name, d in utils.city_registry.within(lat, lon, radius_km)]
+
 @app.get("/")
 def read_root():
     return {"BlackBox": "World"}
 
+# Operator views: they expose traffic and cache internals, so they take the dispatch key
+# (scrapers send it as X-Dispatch-Key)
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics(_=Depends(dispatch.require_dispatch_key)):
+    board = utils.board_cache.stats()
+    tokens = token_cache.stats()
+    writes = write_queue.writer.stats()
+    return metrics.render([
+        ("board_cache_hits_total", "Order board cache hits.", board["hits"]),
+        ("board_cache_misses_total", "Order board cache misses.", board["misses"]),
+        ("board_cache_evictions_total", "Order board cache LRU evictions.", board.get("evictions", 0)),
+        ("token_cache_hits_total", "Verified-token cache hits.", tokens["hits"]),
+        ("token_cache_misses_total", "Verified-token cache misses.", tokens["misses"]),
+        ("write_queue_batches_total", "Group-committed write batches.", writes["batches"]),
+        ("write_queue_rows_total", "Rows written through the write queue.", writes["rows"]),
+    ])
+
+@app.get("/cache/stats")
+def cache_stats(_=Depends(dispatch.require_dispatch_key)):
+    return {
+        "orders_available": utils.board_cache.stats(),
+        "lanes": utils.lane_cache_stats(),
+        "routes": utils.router.stats(),
+        "profiles": utils.profile_cache.stats(),
+        "tokens": token_cache.stats(),
+    }
+
+# Serializers for the list routes: pydantic-core reads ORM attributes and writes JSON bytes
+# in one native pass instead of jsonable_encoder walking every instance
+SENDER_LIST = TypeAdapter(list[utils.SenderOut])
+TRAVELLER_LIST = TypeAdapter(list[utils.TravellerOut])
+ORDER_PAGE = TypeAdapter(utils.OrderPage)
+COMPLAINT_PAGE = TypeAdapter(utils.ComplaintPage)
+LANE_STATS_LIST = TypeAdapter(list[analytics.LaneStats])
+
+async def conditional_get(request: Request, db, schema: TypeAdapter, resources, scope: str, fn, *args):
+    """Answer If-None-Match with 304 from the resource versions alone, else run fn."""
+    etag, body = await utils.run_db(
+        db, utils.conditional_list, request.headers.get("if-none-match"),
+        resources, f"{scope}|{request.url.query}", fn, *args,
+    )
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    content = schema.dump_json(schema.validate_python(body, from_attributes=True))
+    return Response(content, media_type="application/json", headers=headers)
+
+# Resources each list reads; profile creation changes which orders/complaints are "mine"
+PROFILES = ("senders", "travellers")
+
 # -------------------------------
 # Sender endpoints
 # -------------------------------
-@app.post("/senders")
-def create_sender(sender: utils.SenderCreate, db: Session = Depends(utils.get_db), user = Depends(get_current_user)):
-    return utils.create_sender(db, sender, user)
+@app.post("/senders", response_model=utils.SenderOut)
+async def create_sender(sender: utils.SenderCreate, db: Session = Depends(utils.get_session), user = Depends(get_current_user)):
+    return await utils.run_db(db, utils.create_sender, sender, user)
 
-@app.get("/senders")
-def list_senders(db: Session = Depends(utils.get_db), user = Depends(get_current_user)):
-    return utils.list_senders(db, user)
+@app.get("/senders", response_model=list[utils.SenderOut])
+async def list_senders(request: Request, db: Session = Depends(utils.get_session), user = Depends(get_current_user)):
+    return await conditional_get(request, db, SENDER_LIST, ("senders",), user.id, utils.list_senders, user)
 
 # -------------------------------
 # Traveller endpoints
 # -------------------------------
-@app.post("/travellers")
-def create_traveller(traveller: utils.TravellerCreate, db: Session = Depends(utils.get_db), user = Depends(get_current_user)):
-    return utils.create_traveller(db, traveller, user)
+@app.post("/travellers", response_model=utils.TravellerOut)
+async def create_traveller(traveller: utils.TravellerCreate, db: Session = Depends(utils.get_session), user = Depends(get_current_user)):
+    return await utils.run_db(db, utils.create_traveller, traveller, user)
 
-@app.get("/travellers")
-def list_travellers(db: Session = Depends(utils.get_db), user = Depends(get_current_user)):
-    return utils.list_travellers(db, user)
+@app.get("/travellers", response_model=list[utils.TravellerOut])
+async def list_travellers(request: Request, db: Session = Depends(utils.get_session), user = Depends(get_current_user)):
+    return await conditional_get(request, db, TRAVELLER_LIST, ("travellers",), user.id, utils.list_travellers, user)
+
+@app.get("/travellers/me/matches", response_model=utils.MatchPage)
+async def traveller_matches(max_detour_km: float = Query(utils.MATCH_DETOUR_KM, ge=0),
+                            limit: int = Query(utils.DEFAULT_PAGE_SIZE, ge=1, le=utils.MAX_PAGE_SIZE),
+                            db: Session = Depends(utils.get_session), user = Depends(get_current_user)):
+    return await utils.run_blocking(db, utils.find_matches, user, max_detour_km, limit)
 
 # -------------------------------
 # Order endpoints
 # -------------------------------
-@app.get("/orders/available")
-def list_available_orders(source_city: str = None, dest_city: str = None, db: Session = Depends(utils.get_db)):
-    print(f"DEBUG: Listing available orders. Filters: src={source_city}, dest={dest_city}")
-    return utils.list_available_orders(db, source_city, dest_city)
-
-@app.post("/orders")
-def create_order(order: utils.OrderCreate, db: Session = Depends(utils.get_db), user = Depends(get_current_user)):
-    return utils.create_order(db, order, user)
-
-@app.get("/orders")
-def list_orders(db: Session = Depends(utils.get_db), user = Depends(get_current_user)):
-    return utils.list_orders(db, user)
-
-@app.post("/orders/{order_id}/accept")
-def traveller_accept_order(order_id: int, db: Session = Depends(utils.get_db), user = Depends(get_current_user)):
-    return utils.accept_order(db, user, order_id)
-
-@app.post("/complaints")
-def create_complaint_endpoint(complaint: utils.ComplaintCreate, db: Session = Depends(utils.get_db), user = Depends(get_current_user)):
-    return utils.create_complaint(db, complaint, user)
-
-@app.get("/complaints")
-def list_complaints_endpoint(db: Session = Depends(utils.get_db), user = Depends(get_current_user)):
-    return utils.list_complaints(db, user)
\ No newline at end of file
+@app.get("/orders/available", response_model=utils.OrderPage)
+async def list_available_orders(request: Request, source_city: str = None, dest_city: str = None,
+                                limit: int = Query(utils.DEFAULT_PAGE_SIZE, ge=1, le=utils.MAX_PAGE_SIZE), after: str = None,
+                                db: Session = Depends(utils.get_session)):
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("listing available orders", extra={"source_city": source_city, "dest_city": dest_city})
+    return await conditional_get(request, db, ORDER_PAGE, utils.board_resources(source_city, dest_city), "",
+                                 utils.list_available_orders, source_city, dest_city, limit, after)
+
+@app.get("/orders/events")
+async def order_events(request: Request, source_city: str = None, dest_city: str = None,
+                       last_event_id: str = Header(None)):
+    # Live feed for the available-order board; reconnects resume via Last-Event-ID
+    return StreamingResponse(
+        events.sse_stream(request, source_city, dest_city, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/orders", response_model=utils.OrderOut)
+async def create_order(order: utils.OrderCreate, db: Session = Depends(utils.get_session), user = Depends(get_current_user)):
+    if write_queue.WRITE_QUEUE:
+        return await write_queue.create_order(db, order, user)
+    return await utils.run_db(db, utils.create_order, order, user)
+
+@app.post("/orders/bulk")
+async def bulk_create_orders(request: Request, db: Session = Depends(utils.get_session), user = Depends(get_current_user)):
+    # Body is JSON lines (default) or CSV (Content-Type: text/csv), streamed in chunks
+    sender_id = await utils.run_db(db, bulk_import.require_sender, user)
+    fmt = bulk_import.format_for(request.headers.get("content-type"))
+    return await bulk_import.import_stream(db, sender_id, request.stream(), fmt)
+
+@app.get("/orders", response_model=utils.OrderPage)
+async def list_orders(request: Request, limit: int = Query(utils.DEFAULT_PAGE_SIZE, ge=1, le=utils.MAX_PAGE_SIZE), after: str = None,
+                      db: Session = Depends(utils.get_session), user = Depends(get_current_user)):
+    # "archive" rides along so the history merge can check it without another query
+    return await conditional_get(request, db, ORDER_PAGE, ("orders", "archive") + PROFILES, user.id,
+                                 utils.list_orders, user, limit, after)
+
+@app.post("/dispatch", response_model=dispatch.DispatchResult)
+async def dispatch_orders(commit: bool = False,
+                          max_detour_km: float = Query(utils.MATCH_DETOUR_KM, ge=0),
+                          max_orders: int = Query(dispatch.DISPATCH_MAX_ORDERS, ge=1),
+                          max_kg: float = Query(dispatch.DISPATCH_MAX_KG, gt=0),
+                          db: Session = Depends(utils.get_session), _=Depends(dispatch.require_dispatch_key)):
+    # Proposes by default; commit=true claims every assignment in one transaction
+    return await utils.run_blocking(db, dispatch.dispatch, commit, max_detour_km, max_orders, max_kg)
+
+@app.post("/orders/{order_id}/accept", response_model=utils.OrderOut)
+async def traveller_accept_order(order_id: int, db: Session = Depends(utils.get_session), user = Depends(get_current_user)):
+    return await utils.run_db(db, utils.accept_order, user, order_id)
+
+@app.post("/complaints", response_model=utils.ComplaintOut)
+async def create_complaint_endpoint(complaint: utils.ComplaintCreate, db: Session = Depends(utils.get_session), user = Depends(get_current_user)):
+    if write_queue.WRITE_QUEUE:
+        return await write_queue.create_complaint(db, complaint, user)
+    return await utils.run_db(db, utils.create_complaint, complaint, user)
+
+@app.get("/complaints", response_model=utils.ComplaintPage)
+async def list_complaints_endpoint(request: Request, limit: int = Query(utils.DEFAULT_PAGE_SIZE, ge=1, le=utils.MAX_PAGE_SIZE), after: str = None,
+                                   db: Session = Depends(utils.get_session), user = Depends(get_current_user)):
+    return await conditional_get(request, db, COMPLAINT_PAGE, ("complaints", "orders") + PROFILES, user.id,
+                                 utils.list_complaints, user, limit, after)
+
+# -------------------------------
+# Analytics endpoints
+# -------------------------------
+@app.get("/analytics/lanes", response_model=list[analytics.LaneStats])
+async def lane_analytics(request: Request, source_city: str = None, dest_city: str = None, item_type: str = None,
+                         start: date = None, end: date = None, per_day: bool = True,
+                         limit: int = Query(utils.MAX_PAGE_SIZE, ge=1, le=analytics.ANALYTICS_MAX_ROWS),
+                         db: Session = Depends(utils.get_session), _=Depends(analytics.require_analytics_key)):
+    # Reads only the rollups; unchanged orders and complaints answer 304
+    return await conditional_get(request, db, LANE_STATS_LIST, ("orders", "complaints", "analytics"), "analytics",
+                                 analytics.lane_stats, source_city, dest_city, item_type, start, end, per_day, limit)
@@ -0,0 +1,154 @@
+"""
+In-memory index of pending orders for traveller route matching.
+
+Orders are grouped by pickup point, then by drop point, so a match query
+evaluates each distinct hub once instead of each order. A traveller going
+A -> B can carry an order P -> Q when the detour
+
+    d(A, P) + d(P, Q) + d(Q, B) - d(A, B)
+
+fits the budget. Since d(P, Q) + d(Q, B) >= d(P, B), a pickup with
+d(A, P) + d(P, B) - d(A, B) over budget rules out every order starting
+there, which prunes whole pickup groups before their drops are examined;
+the same bound on d(A, Q) + d(Q, B) prunes drop points once per query.
+
+Pickups are also bucketed in a GRID_DEG lat/lon grid. Each cell keeps a
+centre C and a radius r covering every pickup in it, so by the triangle
+inequality d(A, C) + d(C, B) - 2r is a lower bound on d(A, P) + d(P, B)
+for all of them: a cell over budget is skipped without looking at its
+pickups, and a query only pays per pickup near the route.
+"""
+import heapq
+import math
+import threading
+from courier_pricing import haversine_distance
+
+GRID_DEG = 1.0  # ~111 km cells at the equator
+# haversine_distance rounds to 0.01 km, so the cell bound may be off by a few hundredths
+ROUNDING_SLACK_KM = 0.05
+
+def _dist(p, q):
+    return haversine_distance(p[0], p[1], q[0], q[1])
+
+class _Cell:
+    __slots__ = ("center", "radius_km", "pickups")
+
+    def __init__(self, center):
+        self.center = center
+        self.radius_km = 0.0  # only grows while the cell has pickups, so it stays a valid bound
+        self.pickups = set()
+
+class PendingOrderIndex:
+    def __init__(self, grid_deg: float = GRID_DEG):
+        # pickup -> drop -> {order_id: created_at}
+        self._by_pickup = {}
+        self._lane_km = {}  # (pickup, drop) -> d(pickup, drop), for lanes with pending orders
+        self._where = {}  # order_id -> (pickup, drop)
+        self._grid_deg = grid_deg
+        self._cells = {}  # (row, col) -> _Cell
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, order_id):
+        return order_id in self._where
+
+    def add(self, order_id: int, created_at, pickup, drop):
+        """Index a pending order; pickup/drop are (lat, lon) tuples."""
+        with self._lock:
+            self._remove(order_id)
+            if pickup not in self._by_pickup:
+                self._add_pickup(pickup)
+            self._by_pickup.setdefault(pickup, {}).setdefault(drop, {})[order_id] = created_at
+            if (pickup, drop) not in self._lane_km:
+                self._lane_km[(pickup, drop)] = _dist(pickup, drop)
+            self._where[order_id] = (pickup, drop)
+
+    def remove(self, order_id: int):
+        with self._lock:
+            self._remove(order_id)
+
+    def _remove(self, order_id):
+        where = self._where.pop(order_id, None)
+        if where is None:
+            return
+        pickup, drop = where
+        drops = self._by_pickup[pickup]
+        orders = drops[drop]
+        del orders[order_id]
+        if not orders:
+            del drops[drop]
+            del self._lane_km[(pickup, drop)]
+            if not drops:
+                del self._by_pickup[pickup]
+                self._remove_pickup(pickup)
+
+    def _cell_of(self, pickup):
+        return math.floor(pickup[0] / self._grid_deg), math.floor(pickup[1] / self._grid_deg)
+
+    def _add_pickup(self, pickup):
+        key = self._cell_of(pickup)
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = _Cell(((key[0] + 0.5) * self._grid_deg, (key[1] + 0.5) * self._grid_deg))
+        cell.radius_km = max(cell.radius_km, _dist(cell.center, pickup))
+        cell.pickups.add(pickup)
+
+    def _remove_pickup(self, pickup):
+        key = self._cell_of(pickup)
+        cell = self._cells[key]
+        cell.pickups.discard(pickup)
+        if not cell.pickups:
+            del self._cells[key]
+
+    def clear(self):
+        with self._lock:
+            self._by_pickup.clear()
+            self._lane_km.clear()
+            self._where.clear()
+            self._cells.clear()
+
+    def match(self, origin, destination, max_detour_km: float, limit: int = 50):
+        """
+        Pending orders a traveller from origin to destination can carry within
+        max_detour_km, as [(order_id, detour_km)]: smallest detour first, newest
+        first within a lane.
+        """
+        route_km = _dist(origin, destination)
+        budget = route_km + max_detour_km
+        lanes = []
+        with self._lock:
+            tails = {}  # drop -> d(drop, B), or None when the drop alone busts the budget
+            pickups = []
+            for cell in self._cells.values():
+                bound = _dist(origin, cell.center) + _dist(cell.center, destination) - 2 * cell.radius_km
+                if bound <= budget + ROUNDING_SLACK_KM:
+                    pickups.extend(cell.pickups)
+            for pickup in pickups:
+                head = _dist(origin, pickup)
+                if head + _dist(pickup, destination) > budget:
+                    continue
+                for drop, orders in self._by_pickup[pickup].items():
+                    if drop in tails:
+                        tail = tails[drop]
+                    else:
+                        tail = _dist(drop, destination)
+                        if _dist(origin, drop) + tail > budget:
+                            tail = None
+                        tails[drop] = tail
+                    if tail is None:
+                        continue
+                    detour = head + self._lane_km[(pickup, drop)] + tail - route_km
+                    if detour <= max_detour_km:
+                        lanes.append((round(max(detour, 0.0), 2), orders))
+            lanes.sort(key=lambda lane: lane[0])
+
+            matches = []
+            for detour, orders in lanes:
+                need = limit - len(matches)
+                if need <= 0:
+                    break
+                newest = heapq.nlargest(need, orders.items(), key=lambda item: (item[1], item[0]))
+                matches.extend((order_id, detour) for order_id, _ in newest)
+        return matches
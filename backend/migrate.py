@@ -0,0 +1,64 @@
+"""
+Bring an existing database up to the current schema.
+
+create_all only creates missing tables, so columns and indexes added to
+models later never reach databases (like an existing courier.db) created
+before them. New columns must be nullable (or have a server default) to be
+added this way.
+
+The API runs upgrade() in its lifespan startup, not at import. Deployments
+that migrate as a separate step (python migrate.py) can turn that off with
+MIGRATE_ON_STARTUP=0.
+
+A rollup table created here is backfilled from the rows already present.
+"""
+import os
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from database import Base, engine
+import models  # noqa: F401  (registers the tables on Base.metadata)
+
+MIGRATE_ON_STARTUP = os.environ.get("MIGRATE_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+def upgrade(bind=engine):
+    """Create missing tables, columns, version counters and indexes."""
+    new_tables = set(Base.metadata.tables) - set(inspect(bind).get_table_names())
+    Base.metadata.create_all(bind=bind)
+
+    inspector = inspect(bind)
+    created = []
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    ddl = CreateColumn(column).compile(dialect=bind.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                    created.append(f"{table.name}.{column.name}")
+
+    with bind.begin() as conn:
+        seeded = {row[0] for row in conn.execute(text("SELECT name FROM resource_versions"))}
+        for name in models.VERSIONED_RESOURCES:
+            if name not in seeded:
+                conn.execute(text("INSERT INTO resource_versions (name, version) VALUES (:name, 0)"), {"name": name})
+
+    for table in Base.metadata.sorted_tables:
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=bind)
+                created.append(index.name)
+
+    if models.LaneDailyStats.__tablename__ in new_tables:
+        import analytics
+        with bind.begin() as conn:
+            if analytics.rebuild(conn):
+                created.append(f"{models.LaneDailyStats.__tablename__} (backfilled)")
+    return created
+
+if __name__ == "__main__":
+    created = upgrade()
+    if created:
+        print(f"✓ Created: {', '.join(created)}")
+    else:
+        print("✓ Schema is up to date")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Index, Table
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base  # <- import Base from your database.py
@@ -28,11 +28,16 @@ class Traveller(Base):
 class Order(Base):
     __tablename__ = "orders"
     id = Column(Integer, primary_key=True, index=True)
-    sender_id = Column(Integer, ForeignKey("senders.id"), nullable=False)
-    traveller_id = Column(Integer, ForeignKey("travellers.id"), nullable=True)
+    sender_id = Column(Integer, ForeignKey("senders.id"), nullable=False, index=True)
+    traveller_id = Column(Integer, ForeignKey("travellers.id"), nullable=True, index=True)
     source_city = Column(String, nullable=False)
     dest_city = Column(String, nullable=False)
     distance_km = Column(Float, nullable=False)
+    # Server-resolved endpoints (hub coordinates where known); null on rows created before they were stored
+    source_lat = Column(Float, nullable=True)
+    source_lon = Column(Float, nullable=True)
+    dest_lat = Column(Float, nullable=True)
+    dest_lon = Column(Float, nullable=True)
     weight_kg = Column(Float, nullable=False)
     item_type = Column(String, nullable=False)
     status = Column(String, default="pending")
@@ -42,10 +47,48 @@ class Order(Base):
     traveller = relationship("Traveller", back_populates="orders")
     complaints = relationship("Complaint", back_populates="order")
 
+    __table_args__ = (
+        # Serves the available-order board: status filter, optional city filters, newest first
+        Index("ix_orders_board", "status", "source_city", "dest_city", "created_at"),
+    )
+
+class ArchivedOrder(Base):
+    """Finished orders moved out of the hot table by archive.py, with the same columns and ids."""
+    __table__ = Table(
+        "orders_archive", Base.metadata,
+        *(column._copy() for column in Order.__table__.columns),
+        # Newest archived order: tells list_orders when the archive cannot reach a page
+        Index("ix_orders_archive_created_at", "created_at"),
+    )
+
 class Complaint(Base):
     __tablename__ = "complaints"
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
     issue = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     order = relationship("Order", back_populates="complaints")
+
+class LaneDailyStats(Base):
+    """Orders, revenue, accepts and complaints per lane, item type and order day; see analytics.py."""
+    __tablename__ = "lane_daily_stats"
+    day = Column(Date, primary_key=True)
+    source_city = Column(String, primary_key=True)
+    dest_city = Column(String, primary_key=True)
+    item_type = Column(String, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    accepted = Column(Integer, nullable=False, default=0)
+    complaints = Column(Integer, nullable=False, default=0)
+
+class ResourceVersion(Base):
+    """Counter bumped in the same transaction as every write to a resource; drives list ETags."""
+    __tablename__ = "resource_versions"
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+# "analytics" covers rollup rebuilds; incremental rollup updates ride on orders/complaints.
+# "board" invalidates every /orders/available filter at once for bulk rewrites; single
+# writes bump only their lane's board:* counters (utils.board_versions). "archive" moves
+# when rows enter or leave orders_archive.
+VERSIONED_RESOURCES = ("senders", "travellers", "orders", "complaints", "analytics", "board", "archive")
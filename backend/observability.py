@@ -0,0 +1,248 @@
+"""
+Request timing, SQL instrumentation, metrics and logging.
+
+TimingMiddleware opens a RequestStats for every HTTP request. The engine
+hooks in database.py and the auth dependency add to it through a context
+variable (the threadpool and run_sync both run in a copy of the request's
+context, so they see the same object). On the way out the middleware
+adds a Server-Timing header, folds the numbers into the process-wide
+Prometheus metrics served at /metrics, and writes one access log line.
+
+Logging is plain `logging` under the "blackbox" logger: LOG_LEVEL picks
+the level (WARNING by default, so access lines are off) and LOG_FORMAT=json
+switches to one JSON object per line. Disabled levels cost one
+isEnabledFor() check.
+"""
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextvars import ContextVar
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "WARNING").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()  # "text" or "json"
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+SLOW_QUERIES_KEPT = 5  # per request, for the access log
+
+# Upper bounds (seconds) of the latency histograms
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# -------------------------------
+# Logging
+# -------------------------------
+class JsonFormatter(logging.Formatter):
+    # Attributes every LogRecord has; anything else came in through extra=
+    _standard = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self._standard:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        fields = {k: v for k, v in vars(record).items() if k not in JsonFormatter._standard}
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    root = logging.getLogger("blackbox")
+    root.setLevel(level)
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter() if fmt == "json" else
+                             TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        root.addHandler(handler)
+        root.propagate = False
+    return root
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"blackbox.{name}")
+
+configure_logging()
+log = get_logger("sql")
+access_log = get_logger("access")
+
+# -------------------------------
+# Per-request stats
+# -------------------------------
+class RequestStats:
+    __slots__ = ("started", "queries", "sql_seconds", "auth_seconds", "slow")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.auth_seconds = 0.0
+        self.slow = []
+
+current_request: ContextVar = ContextVar("current_request", default=None)
+
+# -------------------------------
+# Metrics
+# -------------------------------
+class Histogram:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+class Metrics:
+    """Process-wide counters in Prometheus' text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}  # (method, route, status) -> count
+        self.durations = {}  # (method, route) -> Histogram
+        self.sql_duration = Histogram()
+        self.slow_queries = 0
+        self.auth_seconds = 0.0
+        self.auth_checks = 0
+
+    def record_query(self, seconds: float):
+        with self._lock:
+            self.sql_duration.observe(seconds)
+            if seconds * 1000 >= SLOW_QUERY_MS:
+                self.slow_queries += 1
+
+    def record_auth(self, seconds: float):
+        with self._lock:
+            self.auth_checks += 1
+            self.auth_seconds += seconds
+
+    def record_request(self, method: str, route: str, status: int, seconds: float):
+        with self._lock:
+            key = (method, route, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            hist = self.durations.get(key[:2])
+            if hist is None:
+                hist = self.durations[key[:2]] = Histogram()
+            hist.observe(seconds)
+
+    def render(self, extra_counters=()) -> str:
+        """extra_counters: (name, help, value) triples appended as plain counters."""
+        lines = []
+
+        def header(name, help_text, kind):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, hist, labels=""):
+            cumulative = 0
+            sep = "," if labels else ""
+            for bound, count in zip(hist.buckets, hist.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+            cumulative += hist.counts[-1]
+            lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{suffix} {hist.total:.6f}")
+            lines.append(f"{name}_count{suffix} {cumulative}")
+
+        with self._lock:
+            header("http_requests_total", "HTTP requests by method, route and status.", "counter")
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+            header("http_request_duration_seconds", "Request wall time by method and route.", "histogram")
+            for (method, route), hist in sorted(self.durations.items()):
+                histogram("http_request_duration_seconds", hist, f'method="{method}",route="{route}"')
+            header("db_query_duration_seconds", "SQL statement execution time.", "histogram")
+            histogram("db_query_duration_seconds", self.sql_duration)
+            header("db_slow_queries_total", f"Statements slower than {SLOW_QUERY_MS:g} ms.", "counter")
+            lines.append(f"db_slow_queries_total {self.slow_queries}")
+            header("auth_duration_seconds_total", "Time spent authenticating requests.", "counter")
+            lines.append(f"auth_duration_seconds_total {self.auth_seconds:.6f}")
+            header("auth_checks_total", "Authenticated requests.", "counter")
+            lines.append(f"auth_checks_total {self.auth_checks}")
+        for name, help_text, value in extra_counters:
+            header(name, help_text, "counter")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+# -------------------------------
+# Hooks
+# -------------------------------
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - context._query_started
+    metrics.record_query(seconds)
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += seconds
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        if stats is not None and len(stats.slow) < SLOW_QUERIES_KEPT:
+            stats.slow.append(round(seconds * 1000, 1))
+        if log.isEnabledFor(logging.WARNING):
+            log.warning("slow query", extra={"ms": round(seconds * 1000, 1), "statement": " ".join(statement.split())[:500]})
+
+def record_auth(seconds: float):
+    metrics.record_auth(seconds)
+    stats = current_request.get()
+    if stats is not None:
+        stats.auth_seconds += seconds
+
+# -------------------------------
+# Middleware
+# -------------------------------
+class TimingMiddleware:
+    """Pure ASGI middleware, so streaming responses (SSE) pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                app_ms = (time.perf_counter() - stats.started) * 1000
+                timing = (f'app;dur={app_ms:.2f}, db;dur={stats.sql_seconds * 1000:.2f};desc="{stats.queries} queries", '
+                          f"auth;dur={stats.auth_seconds * 1000:.2f}")
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            seconds = time.perf_counter() - stats.started
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            metrics.record_request(scope["method"], route, status, seconds)
+            if access_log.isEnabledFor(logging.INFO):
+                access_log.info("request", extra={
+                    "method": scope["method"], "route": route, "status": status,
+                    "ms": round(seconds * 1000, 2), "queries": stats.queries,
+                    "sql_ms": round(stats.sql_seconds * 1000, 2), "auth_ms": round(stats.auth_seconds * 1000, 2),
+                    "slow_ms": stats.slow,
+                })
@@ -0,0 +1,152 @@
+"""
+Response cache for the public order board (/orders/available).
+
+Entries are keyed by the (source_city, dest_city) filter, the page
+requested and the filter's board version the request read for its ETag,
+in the same transaction as the rows. A write bumps, in its own
+transaction, the board versions of the filters that can list its lane
+(all, source only, destination only, both; see utils.board_versions), so
+readers of those filters miss and reload while other lanes keep their
+entries. Entries under older versions simply age out of the LRU / TTL. A body is
+therefore only ever served under the version it was loaded at: no window
+between a commit and a cache invalidation, and no per-worker state to
+invalidate when another worker wrote.
+
+LocalBackend keeps everything in process. RedisBackend shares entries
+between workers through any client with redis-py's get/set (a real
+Redis, or fakeredis in tests).
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "30"))  # seconds, 0 disables
+RESPONSE_CACHE_URL = os.environ.get("RESPONSE_CACHE_URL")  # e.g. redis://localhost:6379/0
+
+class LocalBackend:
+    """Thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "local",
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+class RedisBackend:
+    """Entries as JSON strings with a server-side TTL; eviction is Redis' own maxmemory policy."""
+
+    def __init__(self, client, prefix: str = "blackbox:board:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl: float):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+    def stats(self):
+        out = {"backend": "redis"}
+        try:
+            info = self.client.info("stats")
+            out["evictions"] = info.get("evicted_keys", 0)
+            out["expirations"] = info.get("expired_keys", 0)
+        except Exception:
+            pass  # stand-in clients without INFO
+        return out
+
+def backend_from_env():
+    if not RESPONSE_CACHE_URL:
+        return LocalBackend()
+    import redis  # optional dependency, only needed when RESPONSE_CACHE_URL is set
+
+    return RedisBackend(redis.Redis.from_url(RESPONSE_CACHE_URL))
+
+class BoardCache:
+    def __init__(self, backend=None, ttl: float = RESPONSE_CACHE_TTL):
+        self.backend = backend if backend is not None else LocalBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _filter_key(source_city, dest_city) -> str:
+        return json.dumps([source_city or None, dest_city or None])
+
+    def get_or_load(self, source_city, dest_city, page, version, load):
+        """
+        Cached body for a filter + page at a board version, calling load() on a miss.
+        load() must read in the transaction `version` came from. Bodies must be JSON-able.
+        """
+        if self.ttl <= 0:
+            return load()
+        key = f"page:{self._filter_key(source_city, dest_city)}:{version}:{json.dumps(page)}"
+        body = self.backend.get(key)
+        with self._lock:
+            if body is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if body is None:
+            body = load()
+            self.backend.set(key, body, self.ttl)
+        return body
+
+    def set_backend(self, backend):
+        self.backend = backend
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            out = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "ttl": self.ttl,
+            }
+        out.update(self.backend.stats())
+        return out
@@ -0,0 +1,276 @@
+"""
+Multi-hop routing over the hub graph.
+
+Hubs come from the CityRegistry. Edges are either loaded from a CSV
+(source, dest and an optional distance_km column) or generated: every hub
+is linked to its ROUTE_NEIGHBOURS nearest hubs, and clusters left
+disconnected (another continent) are joined through their closest pair of
+hubs, so every hub can reach every other one. Edges are undirected.
+
+Queries run A* with the tightest admissible heuristic available:
+
+- the great-circle distance to the target, whenever no edge is shorter
+  than the great circle between its ends (always true for generated edges);
+- the ALT bound |d(L, t) - d(L, v)| from shortest-path distances to a few
+  landmarks precomputed at build time (triangle inequality, valid for any
+  non-negative edge lengths).
+
+Computed paths are kept in an LRU keyed by hub pair, so repeated lanes
+cost a dict lookup. The graph is built on the first query and rebuilt
+when the registry changes.
+"""
+import csv
+import heapq
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from math import asin, sqrt
+from city_registry import EARTH_RADIUS_KM, _unit_vector
+
+ROUTE_NEIGHBOURS = int(os.environ.get("ROUTE_NEIGHBOURS", "6"))
+ROUTE_LANDMARKS = int(os.environ.get("ROUTE_LANDMARKS", "8"))
+ROUTE_CACHE_SIZE = int(os.environ.get("ROUTE_CACHE_SIZE", "10000"))
+ROUTE_EDGES_CSV = os.environ.get("ROUTE_EDGES_CSV")  # source,dest[,distance_km]
+
+# Keeps float rounding from making the geometric bound overestimate
+HEURISTIC_SLACK = 1 - 1e-9
+
+Route = namedtuple("Route", ["hops", "legs_km", "distance_km"])
+UNREACHABLE = Route((), (), None)  # cached like a route, so dead ends are not searched again
+
+def _great_circle_km(u, v) -> float:
+    """Unrounded great-circle distance between two unit vectors."""
+    chord = sqrt((u[0] - v[0]) ** 2 + (u[1] - v[1]) ** 2 + (u[2] - v[2]) ** 2)
+    return 2 * EARTH_RADIUS_KM * asin(min(chord / 2, 1.0))
+
+class HubGraph:
+    """Immutable snapshot of the hubs and their edges."""
+
+    def __init__(self, registry, edges_csv: str = None, neighbours: int = ROUTE_NEIGHBOURS,
+                 landmarks: int = ROUTE_LANDMARKS):
+        self.version = registry.version
+        hubs = registry.hubs()
+        self.names = [name for name, _ in hubs]
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.xyz = [_unit_vector(*coords) for _, coords in hubs]
+        self.adjacency = [dict() for _ in self.names]  # id -> {neighbour id: km}
+        if edges_csv:
+            self._load_edges(edges_csv)
+        else:
+            self._link_neighbours(registry, neighbours)
+            self._join_components(registry)
+        # The great-circle bound is only admissible when no edge undercuts it
+        self.geometric = all(
+            km >= _great_circle_km(self.xyz[u], self.xyz[v]) * HEURISTIC_SLACK
+            for u, edges in enumerate(self.adjacency) for v, km in edges.items()
+        )
+        self.landmark_km = self._pick_landmarks(landmarks)
+
+    def _link(self, u: int, v: int, km: float):
+        if u != v and km < self.adjacency[u].get(v, float("inf")):
+            self.adjacency[u][v] = km
+            self.adjacency[v][u] = km
+
+    def _load_edges(self, path: str):
+        with open(path, newline="", encoding="utf-8") as f:
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                try:
+                    u, v = self.ids[row["source"]], self.ids[row["dest"]]
+                except KeyError as e:
+                    raise ValueError(f"{path}:{line_no}: unknown hub {e.args[0]!r}") from None
+                km = row.get("distance_km")
+                self._link(u, v, float(km) if km else _great_circle_km(self.xyz[u], self.xyz[v]))
+
+    def _link_neighbours(self, registry, k: int):
+        for u, name in enumerate(self.names):
+            lat, lon = registry.get(name)
+            for other, _ in registry.nearest(lat, lon, k + 1):
+                v = self.ids[other]
+                self._link(u, v, _great_circle_km(self.xyz[u], self.xyz[v]))
+
+    def _components(self):
+        component = [-1] * len(self.names)
+        groups = []
+        for start in range(len(self.names)):
+            if component[start] != -1:
+                continue
+            component[start] = len(groups)
+            members, stack = [start], [start]
+            while stack:
+                for v in self.adjacency[stack.pop()]:
+                    if component[v] == -1:
+                        component[v] = len(groups)
+                        members.append(v)
+                        stack.append(v)
+            groups.append(members)
+        return component, groups
+
+    def _join_components(self, registry):
+        """Link each smaller cluster to the nearest hub outside it until one component is left."""
+        while True:
+            component, groups = self._components()
+            if len(groups) <= 1:
+                return
+            members = min(groups, key=len)
+            best = None
+            for u in members:
+                lat, lon = registry.get(self.names[u])
+                k = len(members) + 1
+                while True:
+                    outside = [(d, self.ids[n]) for n, d in registry.nearest(lat, lon, k)
+                               if component[self.ids[n]] != component[u]]
+                    if outside or k >= len(self.names):
+                        break
+                    k *= 2
+                if outside and (best is None or outside[0][0] < best[0]):
+                    best = (outside[0][0], u, outside[0][1])
+            _, u, v = best
+            self._link(u, v, _great_circle_km(self.xyz[u], self.xyz[v]))
+
+    def shortest_from(self, source: int):
+        """Dijkstra distances from source to every hub (inf where unreachable)."""
+        dist = [float("inf")] * len(self.names)
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for v, km in self.adjacency[u].items():
+                nd = d + km
+                if nd < dist[v]:
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return dist
+
+    def _pick_landmarks(self, count: int):
+        """Farthest-point landmarks; returns per-hub tuples of distances to each landmark."""
+        if count <= 0 or len(self.names) < 3:
+            return None
+        tables = []
+        # Distance to the closest landmark so far; hub 0 stands in for the first pick
+        covered = self.shortest_from(0)
+        for _ in range(min(count, len(self.names))):
+            gap, landmark = max((d, i) for i, d in enumerate(covered) if d != float("inf"))
+            if gap == 0:
+                break
+            table = self.shortest_from(landmark)
+            tables.append(table)
+            covered = [min(a, b) for a, b in zip(covered, table)]
+        return list(zip(*tables)) if tables else None
+
+    def heuristic(self, target: int):
+        """h(v): a lower bound on the remaining distance from v to target."""
+        t_xyz = self.xyz[target]
+        t_marks = self.landmark_km[target] if self.landmark_km else None
+        xyz, marks, geometric = self.xyz, self.landmark_km, self.geometric
+        inf = float("inf")
+
+        def h(v):
+            bound = _great_circle_km(xyz[v], t_xyz) * HEURISTIC_SLACK if geometric else 0.0
+            if t_marks:
+                for a, b in zip(marks[v], t_marks):
+                    if a != inf and b != inf:
+                        gap = a - b if a > b else b - a
+                        if gap > bound:
+                            bound = gap
+            return bound
+
+        return h
+
+    def astar(self, source: int, target: int):
+        """(path of hub ids, km) for the shortest route, or None when target is unreachable."""
+        if source == target:
+            return [source], 0.0
+        h = self.heuristic(target)
+        best = {source: 0.0}
+        parent = {source: None}
+        heap = [(h(source), 0.0, source)]
+        closed = set()
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if u == target:
+                path = [u]
+                while parent[path[-1]] is not None:
+                    path.append(parent[path[-1]])
+                return path[::-1], d
+            if u in closed:
+                continue
+            closed.add(u)
+            for v, km in self.adjacency[u].items():
+                nd = d + km
+                if nd < best.get(v, float("inf")):
+                    best[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd + h(v), nd, v))
+        return None
+
+class HubRouter:
+    def __init__(self, registry, edges_csv: str = ROUTE_EDGES_CSV, cache_size: int = ROUTE_CACHE_SIZE):
+        self.registry = registry
+        self.edges_csv = edges_csv
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._graph = None
+        self._paths = OrderedDict()  # (u, v) with u <= v -> Route, or UNREACHABLE
+        self._lock = threading.Lock()
+
+    def graph(self) -> HubGraph:
+        graph = self._graph
+        if graph is None or graph.version != self.registry.version:
+            with self._lock:
+                if self._graph is None or self._graph.version != self.registry.version:
+                    self._graph = HubGraph(self.registry, self.edges_csv)
+                    self._paths.clear()
+                graph = self._graph
+        return graph
+
+    def route(self, source: str, dest: str):
+        """Shortest Route between two hub names, or None if either is unknown or unreachable."""
+        graph = self.graph()
+        u, v = graph.ids.get(source), graph.ids.get(dest)
+        if u is None or v is None:
+            return None
+        # Edges are undirected, so one entry serves both directions
+        key, flipped = ((u, v), False) if u <= v else ((v, u), True)
+        with self._lock:
+            route = self._paths.get(key)
+            if route is not None:
+                self._paths.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if route is None:
+            found = graph.astar(*key)
+            if found is None:
+                route = UNREACHABLE
+            else:
+                path, km = found
+                legs = [round(graph.adjacency[a][b], 2) for a, b in zip(path, path[1:])]
+                route = Route([graph.names[i] for i in path], legs, round(km, 2))
+            with self._lock:
+                if self._graph is graph:
+                    self._paths[key] = route
+                    while len(self._paths) > self.cache_size:
+                        self._paths.popitem(last=False)
+        if route is UNREACHABLE:
+            return None
+        if flipped:
+            return Route(route.hops[::-1], route.legs_km[::-1], route.distance_km)
+        return route
+
+    def stats(self):
+        graph = self._graph
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hubs": len(graph.names) if graph else 0,
+                "edges": sum(map(len, graph.adjacency)) // 2 if graph else 0,
+                "geometric": graph.geometric if graph else None,
+                "landmarks": len(graph.landmark_km[0]) if graph and graph.landmark_km else 0,
+                "paths_cached": len(self._paths),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -1,20 +1,21 @@
 """
 Seed database with demo data
 """
+from sqlalchemy import insert, select, func
 from models import Sender, Traveller, Order
-from database import SessionLocal, engine, Base
-from datetime import datetime
-import random
+from database import SessionLocal, engine
+from migrate import upgrade
+import analytics
 
 def seed_database():
     """Create demo data in the database"""
     # Create tables
-    Base.metadata.create_all(bind=engine)
+    upgrade(engine)
     
     db = SessionLocal()
     
     # Check if data already exists
-    existing_senders = db.query(Sender).count()
+    existing_senders = db.scalar(select(func.count()).select_from(Sender))
     if existing_senders > 0:
         print("Database already seeded, skipping...")
         db.close()
@@ -29,15 +30,10 @@ def seed_database():
         {"name": "Vikram Singh", "email": "vikram@example.com", "phone": "+91-9876543214"},
     ]
     
-    senders = []
-    for sender_data in senders_data:
-        sender = Sender(**sender_data)
-        db.add(sender)
-        senders.append(sender)
-    
-    db.commit()
-    for sender in senders:
-        db.refresh(sender)
+    # One multi-row INSERT per table; ids come back in input order, no per-object refresh
+    senders = db.scalars(
+        insert(Sender).returning(Sender.id, sort_by_parameter_order=True), senders_data
+    ).all()
     
     # Demo travellers (people transporting goods)
     travellers_data = [
@@ -48,21 +44,15 @@ def seed_database():
         {"name": "Rohit Kumar", "email": "rohit@example.com", "phone": "+91-9876543219", "source_city": "Delhi", "dest_city": "Jaipur"},
     ]
     
-    travellers = []
-    for traveller_data in travellers_data:
-        traveller = Traveller(**traveller_data)
-        db.add(traveller)
-        travellers.append(traveller)
-    
-    db.commit()
-    for traveller in travellers:
-        db.refresh(traveller)
+    travellers = db.scalars(
+        insert(Traveller).returning(Traveller.id, sort_by_parameter_order=True), travellers_data
+    ).all()
     
     # Demo orders
     orders_data = [
         {
-            "sender_id": senders[0].id,
-            "traveller_id": travellers[0].id,
+            "sender_id": senders[0],
+            "traveller_id": travellers[0],
             "source_city": "Mumbai",
             "dest_city": "Delhi",
             "distance_km": 1400.0,
@@ -72,8 +62,8 @@ def seed_database():
             "price": 500.0,
         },
         {
-            "sender_id": senders[1].id,
-            "traveller_id": travellers[1].id,
+            "sender_id": senders[1],
+            "traveller_id": travellers[1],
             "source_city": "Bangalore",
             "dest_city": "Hyderabad",
             "distance_km": 580.0,
@@ -83,7 +73,7 @@ def seed_database():
             "price": 650.0,
         },
         {
-            "sender_id": senders[2].id,
+            "sender_id": senders[2],
             "traveller_id": None,
             "source_city": "Chennai",
             "dest_city": "Kolkata",
@@ -94,8 +84,8 @@ def seed_database():
             "price": 1200.0,
         },
         {
-            "sender_id": senders[3].id,
-            "traveller_id": travellers[2].id,
+            "sender_id": senders[3],
+            "traveller_id": travellers[2],
             "source_city": "Pune",
             "dest_city": "Mumbai",
             "distance_km": 150.0,
@@ -105,7 +95,7 @@ def seed_database():
             "price": 200.0,
         },
         {
-            "sender_id": senders[4].id,
+            "sender_id": senders[4],
             "traveller_id": None,
             "source_city": "Ahmedabad",
             "dest_city": "Surat",
@@ -117,10 +107,8 @@ def seed_database():
         },
     ]
     
-    for order_data in orders_data:
-        order = Order(**order_data)
-        db.add(order)
-    
+    db.execute(insert(Order), orders_data)
+    analytics.rebuild(db)
     db.commit()
     db.close()
     print("✓ Database seeded with demo data")
@@ -0,0 +1,256 @@
+"""
+Synthetic data generator for load testing.
+
+Generates senders, travellers and orders over the CITY_DATA lanes and
+inserts them with bulk Core statements, one transaction per chunk. Only
+one chunk of rows is ever held in memory, so millions of rows fit in a
+small, constant footprint.
+
+Lane popularity follows a Zipf distribution (--lane-skew 0 is uniform),
+travellers are spread over lanes the same way, and accepted orders are
+given a traveller on their own lane whenever one exists.
+
+    python synthetic_data.py --senders 100000 --travellers 50000 --orders 2000000
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import inspect, select
+import models
+import utils
+import analytics
+from database import engine
+from migrate import upgrade
+from courier_pricing import price_for_distance_batch
+
+GEN_CHUNK_SIZE = int(os.environ.get("GEN_CHUNK_SIZE", "50000"))
+
+# Share of each item type among generated orders
+ITEM_MIX = {"normal": 0.5, "documents": 0.2, "fragile": 0.15, "electronics": 0.15}
+
+SENDERS = models.Sender.__table__
+TRAVELLERS = models.Traveller.__table__
+ORDERS = models.Order.__table__
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB, or None where the platform has no getrusage (Windows)."""
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def lane_weights(lanes, skew: float, rng) -> np.ndarray:
+    """Zipf weights over the lanes in a random (seeded) popularity order."""
+    ranks = rng.permutation(len(lanes)) + 1
+    weights = 1.0 / ranks ** skew
+    return weights / weights.sum()
+
+class DriverInsert:
+    """
+    INSERT executed straight through the DBAPI executemany. Rows are plain tuples in
+    `columns` order; SQLAlchemy's per-row parameter handling would otherwise cost
+    more than the database spends inserting them.
+    """
+
+    def __init__(self, table, columns):
+        dialect = engine.dialect
+        self.compiled = table.insert().compile(dialect=dialect, column_keys=list(columns))
+        self.sql = str(self.compiled)
+        self.columns = list(columns)
+        positions = self.compiled.positiontup
+        self.order = [self.columns.index(name) for name in positions] if positions else None
+        # Only types that need converting (e.g. DateTime on SQLite) pay a per-value call
+        self.processors = [
+            (i, processor) for i, name in enumerate(self.columns)
+            if (processor := table.c[name].type.dialect_impl(dialect).bind_processor(dialect)) is not None
+        ]
+
+    def params(self, rows):
+        if self.processors:
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for i, processor in self.processors:
+                    row[i] = processor(row[i])
+        if self.order is not None:
+            if self.order != list(range(len(self.columns))):
+                return [tuple(row[i] for i in self.order) for row in rows]
+            return [tuple(row) for row in rows]
+        return [dict(zip(self.columns, row)) for row in rows]
+
+    def __call__(self, conn, rows):
+        conn.exec_driver_sql(self.sql, self.params(rows))
+
+def _insert_chunks(table, columns, total: int, chunk_size: int, make_rows, label: str, after=None):
+    """after(conn, rows), if given, runs in each chunk's transaction."""
+    insert = DriverInsert(table, columns)
+    started = time.perf_counter()
+    done = 0
+    while done < total:
+        n = min(chunk_size, total - done)
+        with engine.begin() as conn:
+            rows = make_rows(done, n)
+            insert(conn, rows)
+            if after is not None:
+                after(conn, rows)
+        done += n
+    elapsed = time.perf_counter() - started
+    if total:
+        print(f"✓ {label}: {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+
+PEOPLE_COLUMNS = ("name", "email", "phone", "created_at")
+TRAVELLER_COLUMNS = PEOPLE_COLUMNS + ("source_city", "dest_city")
+ORDER_COLUMNS = ("sender_id", "traveller_id", "source_city", "dest_city", "distance_km",
+                 "source_lat", "source_lon", "dest_lat", "dest_lon", "weight_kg",
+                 "item_type", "status", "price", "created_at")
+
+def drop_indexes(tables):
+    """Drop the models' secondary indexes; migrate.upgrade() builds them again afterwards."""
+    existing = {name for table in tables for name in (ix["name"] for ix in inspect(engine).get_indexes(table.name))}
+    dropped = []
+    for table in tables:
+        for index in table.indexes:
+            if index.name in existing and not index.unique:
+                index.drop(bind=engine)
+                dropped.append(index.name)
+    return dropped
+
+def generate(senders: int, travellers: int, orders: int, lane_skew: float = 1.0,
+             pending_share: float = 0.6, days: int = 90, seed: int = 42,
+             chunk_size: int = GEN_CHUNK_SIZE):
+    rng = np.random.default_rng(seed)
+    lanes = [(src, dst) for (src, dst) in utils.CITY_DISTANCES if src != dst]
+    weights = lane_weights(lanes, lane_skew, rng)
+    now = datetime.utcnow()
+
+    def people(offset, n, kind):
+        return [
+            (f"Synthetic {kind} {i}", f"{kind}{i}@synthetic.example", f"+91-{9000000000 + i}", now)
+            for i in range(offset, offset + n)
+        ]
+
+    def traveller_rows(offset, n):
+        picks = rng.choice(len(lanes), size=n, p=weights)
+        return [row + lanes[lane] for row, lane in zip(people(offset, n, "traveller"), picks)]
+
+    _insert_chunks(SENDERS, PEOPLE_COLUMNS, senders, chunk_size,
+                   lambda offset, n: people(offset, n, "sender"), "senders")
+    _insert_chunks(TRAVELLERS, TRAVELLER_COLUMNS, travellers, chunk_size, traveller_rows, "travellers")
+    if not orders:
+        return
+
+    # Every profile in the database is a candidate, not only the ones just generated
+    with engine.connect() as conn:
+        sender_ids = np.fromiter(conn.execute(select(SENDERS.c.id)).scalars(), dtype=np.int64)
+        lane_index = {lane: i for i, lane in enumerate(lanes)}
+        by_lane = [[] for _ in lanes]
+        traveller_ids = []
+        for tid, src, dst in conn.execute(select(TRAVELLERS.c.id, TRAVELLERS.c.source_city, TRAVELLERS.c.dest_city)):
+            traveller_ids.append(tid)
+            if (src, dst) in lane_index:
+                by_lane[lane_index[(src, dst)]].append(tid)
+    if not len(sender_ids):
+        raise SystemExit("✗ No senders to attach orders to")
+    traveller_ids = np.asarray(traveller_ids, dtype=np.int64)
+
+    # Travellers flattened lane by lane, so a lane's travellers are one slice
+    lane_counts = np.array([len(ids) for ids in by_lane], dtype=np.int64)
+    lane_starts = np.concatenate(([0], np.cumsum(lane_counts)[:-1]))
+    lane_travellers = np.fromiter((tid for ids in by_lane for tid in ids), dtype=np.int64, count=int(lane_counts.sum()))
+    del by_lane
+
+    lane_src = [src for src, _ in lanes]
+    lane_dst = [dst for _, dst in lanes]
+    lane_km = np.array([utils.CITY_DISTANCES[lane] for lane in lanes])
+    lane_coords = [(utils.CITY_DATA[src], utils.CITY_DATA[dst]) for src, dst in lanes]
+    item_types = list(ITEM_MIX)
+    item_p = np.array(list(ITEM_MIX.values()))
+    item_p = item_p / item_p.sum()
+    span_seconds = days * 86400
+
+    def order_rows(offset, n):
+        lane = rng.choice(len(lanes), size=n, p=weights)
+        distance_km = lane_km[lane]
+        weight_kg = np.clip(np.round(rng.lognormal(1.0, 0.8, size=n), 2), 0.1, 30.0)
+        items = rng.choice(len(item_types), size=n, p=item_p)
+        item_names = [item_types[i] for i in items]
+        prices = price_for_distance_batch(distance_km, weight_kg, item_names)
+        senders_for = sender_ids[rng.integers(0, len(sender_ids), size=n)]
+        accepted = rng.random(n) >= pending_share
+
+        travellers_for = np.full(n, -1, dtype=np.int64)
+        if len(traveller_ids):
+            on_lane = accepted & (lane_counts[lane] > 0)
+            picks = lane_starts[lane] + (rng.random(n) * np.maximum(lane_counts[lane], 1)).astype(np.int64)
+            travellers_for[on_lane] = lane_travellers[picks[on_lane]]
+            off_lane = accepted & ~on_lane
+            travellers_for[off_lane] = traveller_ids[rng.integers(0, len(traveller_ids), size=int(off_lane.sum()))]
+        else:
+            accepted[:] = False
+
+        # Spread over the last `days` in id order, like real traffic: created_at grows with the id
+        ages = span_seconds * (1 - (offset + np.arange(n) + rng.random(n)) / orders)
+        rows = []
+        for i, l in enumerate(lane.tolist()):
+            src, dst = lane_coords[l]
+            traveller_id = int(travellers_for[i]) if accepted[i] else None
+            rows.append((
+                int(senders_for[i]), traveller_id, lane_src[l], lane_dst[l], float(distance_km[i]),
+                src["lat"], src["lon"], dst["lat"], dst["lon"], float(weight_kg[i]),
+                item_names[i], "accepted" if traveller_id else "pending", float(prices[i]),
+                now - timedelta(seconds=float(ages[i])),
+            ))
+        return rows
+
+    def rollup_rows(conn, rows):
+        rollup = analytics.Rollup()
+        for row in rows:
+            src, dst, item, status, price, created_at = row[2], row[3], row[10], row[11], row[12], row[13]
+            rollup.add(created_at, src, dst, item, orders=1, revenue=price, accepted=int(status == "accepted"))
+        rollup.apply(conn)
+
+    _insert_chunks(ORDERS, ORDER_COLUMNS, orders, chunk_size, order_rows, "orders", rollup_rows)
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    cli = argparse.ArgumentParser(description="Fill the database with synthetic load-test data")
+    cli.add_argument("--senders", type=int, default=10000)
+    cli.add_argument("--travellers", type=int, default=5000)
+    cli.add_argument("--orders", type=int, default=100000)
+    cli.add_argument("--lane-skew", type=float, default=1.0, help="Zipf exponent of lane popularity (0 = uniform)")
+    cli.add_argument("--pending-share", type=float, default=0.6, help="fraction of orders left pending")
+    cli.add_argument("--days", type=int, default=90, help="spread created_at over this many days")
+    cli.add_argument("--seed", type=int, default=42)
+    cli.add_argument("--chunk-size", type=int, default=GEN_CHUNK_SIZE)
+    cli.add_argument("--defer-indexes", action="store_true",
+                     help="drop secondary indexes while loading and rebuild them at the end (offline use only)")
+    args = cli.parse_args()
+
+    started = time.perf_counter()
+    upgrade(engine)
+    if args.defer_indexes:
+        print(f"  dropped {', '.join(drop_indexes([ORDERS])) or 'no indexes'}")
+    generate(args.senders, args.travellers, args.orders, args.lane_skew,
+             args.pending_share, args.days, args.seed, args.chunk_size)
+    if args.defer_indexes:
+        rebuild = time.perf_counter()
+        rebuilt = upgrade(engine)
+        print(f"✓ Rebuilt {', '.join(rebuilt)} in {time.perf_counter() - rebuild:.1f}s")
+
+    # Running servers see the new rows on their next conditional GET
+    db = SessionLocal()
+    utils.bump_versions(db, *models.VERSIONED_RESOURCES)
+    db.commit()
+    db.close()
+
+    total = args.senders + args.travellers + args.orders
+    elapsed = time.perf_counter() - started
+    peak = peak_memory_mb()
+    memory = f", peak memory {peak:.0f} MB" if peak is not None else ""
+    print(f"✓ {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s){memory}")
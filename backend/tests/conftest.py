@@ -0,0 +1,89 @@
+"""
+Shared fixtures. The app reads its settings at import time, so the
+environment is pointed at a throwaway SQLite file and local JWT
+verification before anything from the backend is imported.
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='blackbox-tests-'), 'test.db')}"
+os.environ["AUTH_VERIFY_MODE"] = "local"
+os.environ["SUPABASE_JWT_SECRET"] = "test-secret-" + "x" * 52  # 64 bytes, long enough for any HMAC
+os.environ.pop("RESPONSE_CACHE_URL", None)  # in-process cache only
+os.environ["PROFILE_CACHE_TTL"] = "0"  # every request resolves its profiles (see test_query_counts)
+
+import jwt
+import pytest
+
+@pytest.fixture(scope="session")
+def engine():
+    from database import engine
+
+    return engine
+
+@pytest.fixture(scope="session")
+def client(engine):
+    from starlette.testclient import TestClient
+    from main import app
+
+    with TestClient(app) as c:
+        yield c
+
+def token_headers(sub: str) -> dict:
+    token = jwt.encode(
+        {"sub": sub, "email": f"{sub}@example.com", "aud": "authenticated", "exp": int(time.time()) + 600},
+        os.environ["SUPABASE_JWT_SECRET"], algorithm="HS256",
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def sender(client):
+    """Headers of a fresh user with a Sender profile."""
+    headers = token_headers(f"sender-{uuid.uuid4().hex}")
+    r = client.post("/senders", json={"name": "Sender", "email": "sender@example.com", "phone": "1"}, headers=headers)
+    assert r.status_code == 200, r.text
+    return headers
+
+@pytest.fixture
+def traveller(client):
+    """Headers of a fresh user with a Traveller profile on Mumbai -> Delhi."""
+    return make_traveller(client)
+
+def make_traveller(client, source_city: str = "Mumbai", dest_city: str = "Delhi") -> dict:
+    headers = token_headers(f"traveller-{uuid.uuid4().hex}")
+    r = client.post("/travellers", json={
+        "name": "Traveller", "email": "traveller@example.com", "phone": "1",
+        "source_city": source_city, "dest_city": dest_city,
+    }, headers=headers)
+    assert r.status_code == 200, r.text
+    return headers
+
+ORDER = {
+    "source_city": "Mumbai", "dest_city": "Delhi", "weight_kg": 2.0, "item_type": "normal",
+    "source_lat": 19.076, "source_lon": 72.8777, "dest_lat": 28.7041, "dest_lon": 77.1025,
+}
+
+def create_order(client, headers, **fields) -> dict:
+    r = client.post("/orders", json={**ORDER, **fields}, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+def pytest_addoption(parser):
+    parser.addoption("--cold-start", action="store_true", help="also run the tests marked cold_start")
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "cold_start: spawns fresh interpreters to time startup (opt in with --cold-start)")
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--cold-start"):
+        return
+    skip = pytest.mark.skip(reason="cold start is timed only with --cold-start")
+    for item in items:
+        if "cold_start" in item.keywords:
+            item.add_marker(skip)
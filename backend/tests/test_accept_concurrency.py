@@ -0,0 +1,57 @@
+"""
+Hundreds of travellers accept the same order at once: exactly one wins,
+everyone else gets 409. Run with -s for the latency histogram.
+"""
+import asyncio
+import os
+import time
+import httpx
+from conftest import create_order, make_traveller
+
+CLIENTS = int(os.environ.get("ACCEPT_STRESS_CLIENTS", "200"))
+
+def percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))]
+
+def histogram(latencies_ms, buckets=(10, 25, 50, 100, 250, 500, 1000, 2500)):
+    lines, lower = [], 0
+    for upper in buckets + (float("inf"),):
+        count = sum(lower <= ms < upper for ms in latencies_ms)
+        lines.append(f"  {lower:>5g}-{upper:<5g} ms {count:>5} {'#' * (60 * count // len(latencies_ms))}")
+        lower = upper
+    return "\n".join(lines)
+
+def test_only_one_of_many_simultaneous_accepts_wins(client, sender):
+    from main import app
+
+    order = create_order(client, sender)
+    travellers = [make_traveller(client) for _ in range(CLIENTS)]
+
+    async def stampede():
+        start = asyncio.Event()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as ac:
+            async def accept(headers):
+                await start.wait()
+                started = time.perf_counter()
+                r = await ac.post(f"/orders/{order['id']}/accept", headers=headers)
+                return r, (time.perf_counter() - started) * 1000
+
+            tasks = [asyncio.ensure_future(accept(headers)) for headers in travellers]
+            await asyncio.sleep(0)
+            start.set()
+            return await asyncio.gather(*tasks)
+
+    results = asyncio.run(stampede())
+    statuses = [r.status_code for r, _ in results]
+    assert statuses.count(200) == 1, statuses
+    assert statuses.count(409) == CLIENTS - 1, statuses
+
+    winner = next(r.json() for r, _ in results if r.status_code == 200)
+    assert winner["status"] == "accepted"
+    mine = client.get("/orders", headers=sender).json()["items"]
+    assert next(o for o in mine if o["id"] == order["id"])["traveller_id"] == winner["traveller_id"]
+
+    latencies = sorted(ms for _, ms in results)
+    print(f"\n{CLIENTS} simultaneous accepts: p50 {percentile(latencies, 50):.1f} ms, "
+          f"p95 {percentile(latencies, 95):.1f} ms, p99 {percentile(latencies, 99):.1f} ms")
+    print(histogram(latencies))
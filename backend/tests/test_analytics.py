@@ -0,0 +1,44 @@
+import analytics
+from conftest import create_order, make_traveller
+
+KEY = {"X-Analytics-Key": "key"}
+LANE = {"source_city": "Pune", "dest_city": "Chennai", "per_day": "false"}
+PUNE_CHENNAI = {
+    "source_city": "Pune", "dest_city": "Chennai",
+    "source_lat": 18.5204, "source_lon": 73.8567, "dest_lat": 13.0827, "dest_lon": 80.2707,
+}
+
+def test_rollups_follow_every_write_path(client, sender, engine, monkeypatch):
+    monkeypatch.setattr(analytics, "ANALYTICS_API_KEY", "key")
+    traveller = make_traveller(client, "Pune", "Chennai")
+    orders = [create_order(client, sender, **PUNE_CHENNAI) for _ in range(3)]
+    assert client.post(f"/orders/{orders[0]['id']}/accept", headers=traveller).status_code == 200
+    r = client.post("/complaints", json={"order_id": orders[0]["id"], "issue": "late"}, headers=sender)
+    assert r.status_code == 200
+
+    [lane] = client.get("/analytics/lanes", params=LANE, headers=KEY).json()
+    assert (lane["orders"], lane["accepted"], lane["complaints"]) == (3, 1, 1)
+    assert lane["revenue"] == round(sum(o["price"] for o in orders), 2)
+    with engine.connect() as conn:
+        assert analytics.check(conn) == []
+
+def test_lanes_need_the_analytics_key(client, monkeypatch):
+    monkeypatch.setattr(analytics, "ANALYTICS_API_KEY", None)
+    assert client.get("/analytics/lanes", headers=KEY).status_code == 403
+    monkeypatch.setattr(analytics, "ANALYTICS_API_KEY", "key")
+    assert client.get("/analytics/lanes", headers={"X-Analytics-Key": "wrong"}).status_code == 401
+
+def test_rebuild_changes_the_lanes_etag(client, sender, engine, monkeypatch):
+    monkeypatch.setattr(analytics, "ANALYTICS_API_KEY", "key")
+    headers = {"X-Analytics-Key": "key"}
+    create_order(client, sender)
+    r = client.get("/analytics/lanes", headers=headers)
+    assert r.status_code == 200
+    assert client.get("/analytics/lanes", headers={**headers, "If-None-Match": r.headers["etag"]}).status_code == 304
+
+    with engine.begin() as conn:
+        analytics.rebuild(conn)
+
+    again = client.get("/analytics/lanes", headers={**headers, "If-None-Match": r.headers["etag"]})
+    assert again.status_code == 200
+    assert again.headers["etag"] != r.headers["etag"]
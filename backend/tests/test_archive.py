@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+from sqlalchemy import update
+import analytics
+import archive
+import models
+import utils
+from conftest import create_order, make_traveller
+
+def history(client, headers, limit=2):
+    ids, after = [], None
+    while True:
+        page = client.get("/orders", params={"limit": limit, **({"after": after} if after else {})}, headers=headers).json()
+        ids += [o["id"] for o in page["items"]]
+        after = page["next_cursor"]
+        if not after:
+            return ids
+
+def test_in_transit_orders_stay_hot_by_default():
+    assert "accepted" not in archive.ARCHIVE_STATUSES
+
+def test_history_reads_through_the_archive(client, sender, engine, monkeypatch):
+    traveller = make_traveller(client)
+    orders = [create_order(client, sender) for _ in range(5)]
+    for order in orders[:3]:
+        assert client.post(f"/orders/{order['id']}/accept", headers=traveller).status_code == 200
+    with utils.SessionLocal() as db:
+        for age, order in enumerate(orders):
+            db.execute(update(models.Order).where(models.Order.id == order["id"])
+                       .values(created_at=datetime.utcnow() - timedelta(days=400 - age)))
+        db.commit()
+    with engine.begin() as conn:
+        analytics.rebuild(conn)  # the rollups follow the backdated days
+    create_order(client, sender)  # newer than everything above, and the table's newest row
+
+    before = history(client, sender)
+    with utils.SessionLocal() as db:
+        assert archive.archive_orders(db, dry_run=True) == 0
+        monkeypatch.setattr(archive, "ARCHIVE_STATUSES", ("accepted",))
+        assert archive.archive_orders(db) == 3
+        assert {row.id for row in db.query(models.ArchivedOrder)} >= {o["id"] for o in orders[:3]}
+
+    assert history(client, sender) == before
+    assert history(client, sender, limit=50) == before
@@ -0,0 +1,67 @@
+"""USE_ASYNC_DB paths: blocking work must not run on the event loop thread."""
+import asyncio
+import sqlite3
+import threading
+import time
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import utils
+from database import DATABASE_URL, to_async_url
+
+@pytest.fixture
+def async_session_factory(engine):
+    async_engine = create_async_engine(to_async_url(DATABASE_URL))
+
+    def make():
+        return AsyncSession(async_engine, expire_on_commit=False)
+
+    yield make
+    asyncio.run(async_engine.dispose())
+
+def test_blocking_work_gets_its_own_session_off_the_loop(async_session_factory):
+    seen = {}
+
+    def work(db, value):
+        seen["thread"] = threading.current_thread()
+        seen["async"] = db.get_bind().dialect.is_async
+        return value
+
+    async def scenario():
+        async with async_session_factory() as db:
+            assert await utils.run_blocking(db, work, 7) == 7
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(scenario())
+    assert seen["thread"] is not loop_thread
+    assert seen["async"] is False
+
+def test_busy_backoff_under_run_sync_yields_to_the_loop(async_session_factory, monkeypatch):
+    monkeypatch.setattr(utils, "DB_RETRY_BACKOFF", 0.1)
+    attempts = []
+
+    def write():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise OperationalError("UPDATE", {}, sqlite3.OperationalError("database is locked"))
+        return "written"
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        task = asyncio.ensure_future(ticker())
+        async with async_session_factory() as db:
+            result = await db.run_sync(utils.commit_with_retry, write)
+        task.cancel()
+        return result, ticks
+
+    result, ticks = asyncio.run(scenario())
+    assert result == "written" and len(attempts) == 2
+    # The loop kept running while the write waited out its backoff (at least 50 ms)
+    assert ticks >= 5
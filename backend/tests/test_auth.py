@@ -0,0 +1,131 @@
+import base64
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+import jwt
+import pytest
+import auth
+
+def claims(**extra):
+    return {"sub": "user-1", "aud": "authenticated", "exp": int(time.time()) + 600, **extra}
+
+def test_hs256_token_with_the_shared_secret_is_accepted():
+    token = jwt.encode(claims(email="user-1@example.com"), os.environ["SUPABASE_JWT_SECRET"], algorithm="HS256")
+    user, exp = auth.verify_token_locally(token)
+    assert (user.id, user.email) == ("user-1", "user-1@example.com")
+    assert exp > time.time()
+
+@pytest.mark.parametrize("token_claims, key", [
+    (claims(exp=int(time.time()) - 10), None),
+    (claims(aud="someone-else"), None),
+    ({"aud": "authenticated", "exp": int(time.time()) + 600}, None),  # no sub
+    (claims(), "a-different-secret-" + "y" * 45),
+])
+def test_expired_misaddressed_incomplete_or_forged_tokens_are_rejected(token_claims, key):
+    token = jwt.encode(token_claims, key or os.environ["SUPABASE_JWT_SECRET"], algorithm="HS256")
+    with pytest.raises(jwt.InvalidTokenError):
+        auth.verify_token_locally(token)
+
+def test_verified_tokens_are_cached_until_they_expire(client):
+    auth.token_cache.clear()
+    token = jwt.encode(claims(sub="cached-user"), os.environ["SUPABASE_JWT_SECRET"], algorithm="HS256")
+    headers = {"Authorization": f"Bearer {token}"}
+    for _ in range(3):
+        r = client.get("/users/me", headers=headers)
+        assert r.status_code == 200
+        assert r.json()["user_id"] == "cached-user"
+    stats = auth.token_cache.stats()
+    assert (stats["misses"], stats["hits"]) == (1, 2)
+
+    auth.token_cache.put("expired-token", object(), exp=time.time() - 1)
+    assert auth.token_cache.get("expired-token") is None
+
+@pytest.mark.parametrize("algorithm", ["HS384", "HS512"])
+def test_other_hmac_algorithms_are_rejected(algorithm):
+    token = jwt.encode(claims(), os.environ["SUPABASE_JWT_SECRET"], algorithm=algorithm)
+    with pytest.raises(Exception, match="Unsupported token algorithm"):
+        auth.verify_token_locally(token)
+
+def test_unsigned_token_is_rejected_before_any_key_lookup(monkeypatch):
+    monkeypatch.setattr(auth, "_jwks_client", None)
+    monkeypatch.setattr(auth.jwt, "PyJWKClient", lambda *a, **k: pytest.fail("looked up a key"))
+    token = jwt.encode(claims(), None, algorithm="none")
+    with pytest.raises(Exception, match="Unsupported token algorithm"):
+        auth.verify_token_locally(token)
+
+def test_rejected_token_is_a_401(client):
+    token = jwt.encode(claims(), "a-different-secret-" + "y" * 45, algorithm="HS256")
+    r = client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 401
+
+def test_disallowed_algorithm_is_a_401(client):
+    token = jwt.encode(claims(), os.environ["SUPABASE_JWT_SECRET"], algorithm="HS512")
+    r = client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 401
+
+class FakeSupabase:
+    """Supabase auth that knows one session until it is revoked."""
+
+    def __init__(self, token):
+        self.token = token
+        self.calls = 0
+        self.auth = self
+
+    def get_user(self, token):
+        self.calls += 1
+        return SimpleNamespace(user=SimpleNamespace(id="remote-user", email="remote-user@example.com") if token == self.token else None)
+
+def test_remote_mode_rechecks_every_request_so_revocation_is_immediate(client, monkeypatch):
+    auth.token_cache.clear()
+    token = jwt.encode(claims(sub="remote-user"), "signed-by-supabase-" + "z" * 45, algorithm="HS256")
+    supabase = FakeSupabase(token)
+    monkeypatch.setattr(auth, "AUTH_VERIFY_MODE", "remote")
+    monkeypatch.setattr(auth, "get_supabase", lambda: supabase)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.get("/users/me", headers=headers).status_code == 200
+    supabase.token = None  # signed out
+    assert client.get("/users/me", headers=headers).status_code == 401
+    assert supabase.calls == 2
+
+def test_remote_cache_ttl_bounds_how_long_a_revoked_session_lasts(client, monkeypatch):
+    auth.token_cache.clear()
+    token = jwt.encode(claims(sub="remote-user"), "signed-by-supabase-" + "z" * 45, algorithm="HS256")
+    supabase = FakeSupabase(token)
+    monkeypatch.setattr(auth, "AUTH_VERIFY_MODE", "remote")
+    monkeypatch.setattr(auth, "AUTH_REMOTE_CACHE_TTL", 5)
+    monkeypatch.setattr(auth, "get_supabase", lambda: supabase)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.get("/users/me", headers=headers).status_code == 200
+    supabase.token = None
+    assert client.get("/users/me", headers=headers).status_code == 200  # inside the window
+    assert supabase.calls == 1
+    auth.token_cache.clear()
+    assert client.get("/users/me", headers=headers).status_code == 401
+
+def test_jwks_client_is_built_once_under_concurrent_first_use(monkeypatch):
+    built = []
+
+    class SlowJWKClient:
+        def __init__(self, url, cache_keys):
+            built.append(url)
+            time.sleep(0.05)
+
+        def get_signing_key_from_jwt(self, token):
+            return SimpleNamespace(key="public-key")
+
+    monkeypatch.setattr(auth, "_jwks_client", None)
+    monkeypatch.setattr(auth, "SUPABASE_JWKS_URL", "https://example.com/jwks.json")
+    monkeypatch.setattr(auth.jwt, "PyJWKClient", SlowJWKClient)
+    header = base64.urlsafe_b64encode(json.dumps({"alg": "RS256", "kid": "k1"}).encode()).decode().rstrip("=")
+    token = f"{header}.e30.c2ln"
+
+    threads = [threading.Thread(target=auth._signing_key, args=(token,)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert built == ["https://example.com/jwks.json"]
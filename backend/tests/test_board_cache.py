@@ -0,0 +1,70 @@
+from datetime import datetime
+import analytics
+import models
+import utils
+from conftest import create_order, make_traveller
+
+BOARD = {"source_city": "Mumbai", "dest_city": "Delhi", "limit": 100}
+CHENNAI_KOLKATA = {
+    "source_city": "Chennai", "dest_city": "Kolkata",
+    "source_lat": 13.0827, "source_lon": 80.2707, "dest_lat": 22.5726, "dest_lon": 88.3639,
+}
+
+def board_lookups(client):
+    before = utils.board_cache.stats()
+    r = client.get("/orders/available", params=BOARD)
+    assert r.status_code == 200
+    after = utils.board_cache.stats()
+    return r.json()["items"], after["hits"] - before["hits"], after["misses"] - before["misses"]
+
+def test_writes_invalidate_only_the_boards_of_their_lane(client, sender):
+    create_order(client, sender)
+    board_lookups(client)
+    _, hits, misses = board_lookups(client)
+    assert (hits, misses) == (1, 0)
+
+    etag = client.get("/orders/available", params=BOARD).headers["etag"]
+    other = create_order(client, sender, **CHENNAI_KOLKATA)
+    _, hits, misses = board_lookups(client)
+    assert (hits, misses) == (1, 0)
+    assert client.get("/orders/available", params=BOARD, headers={"If-None-Match": etag}).status_code == 304
+    # The unfiltered board and the other lane's filters do see it
+    for params in ({}, {"source_city": "Chennai"}, {"dest_city": "Kolkata"}):
+        assert other["id"] in {o["id"] for o in client.get("/orders/available", params=params).json()["items"]}
+
+    added = create_order(client, sender)
+    items, hits, misses = board_lookups(client)
+    assert (hits, misses) == (0, 1)
+    assert added["id"] in {o["id"] for o in items}
+
+    assert client.post(f"/orders/{added['id']}/accept", headers=make_traveller(client)).status_code == 200
+    items, hits, misses = board_lookups(client)
+    assert (hits, misses) == (0, 1)
+    assert added["id"] not in {o["id"] for o in items}
+
+def test_board_never_serves_an_old_page_under_a_new_etag(client, sender, engine):
+    first = create_order(client, sender)
+    r = client.get("/orders/available", params=BOARD)
+    assert first["id"] in {o["id"] for o in r.json()["items"]}
+
+    # Another worker commits an order; nothing in this process is told about it
+    now = datetime.utcnow()
+    with utils.SessionLocal() as db:
+        db.add(models.Order(
+            sender_id=db.query(models.Order.sender_id).filter(models.Order.id == first["id"]).scalar(),
+            source_city="Mumbai", dest_city="Delhi", distance_km=1150.0, weight_kg=1.0,
+            item_type="normal", price=500.0, status="pending", created_at=now,
+        ))
+        db.flush()
+        added = db.query(models.Order.id).order_by(models.Order.id.desc()).limit(1).scalar()
+        utils.bump_versions(db, "orders", *utils.board_versions(("Mumbai", "Delhi")))
+        analytics.record(db, now, "Mumbai", "Delhi", "normal", orders=1, revenue=500.0)
+        db.commit()
+
+    again = client.get("/orders/available", params=BOARD, headers={"If-None-Match": r.headers["etag"]})
+    assert again.status_code == 200
+    assert again.headers["etag"] != r.headers["etag"]
+    assert added in {o["id"] for o in again.json()["items"]}
+
+    cached = client.get("/orders/available", params=BOARD, headers={"If-None-Match": again.headers["etag"]})
+    assert cached.status_code == 304
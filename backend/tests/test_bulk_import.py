@@ -0,0 +1,105 @@
+import csv
+import io
+import json
+from datetime import datetime
+from sqlalchemy import text
+import bulk_import
+import events
+import models
+import utils
+from conftest import ORDER, create_order
+
+def my_orders(client, headers):
+    return client.get("/orders", params={"limit": 100}, headers=headers).json()["items"]
+
+def test_jsonl_import_prices_like_create_order_and_reports_bad_lines(client, sender):
+    single = create_order(client, sender)
+    body = "\n".join([json.dumps(ORDER), "{not json", json.dumps(dict(ORDER, weight_kg="heavy")), json.dumps(ORDER)])
+    r = client.post("/orders/bulk", content=body, headers=sender)
+    assert r.status_code == 200, r.text
+    report = r.json()
+    assert report["created"] == 2
+    assert [e["line"] for e in report["errors"]] == [2, 3]
+
+    imported = [o for o in my_orders(client, sender) if o["id"] > single["id"]]
+    assert len(imported) == 2
+    for order in imported:
+        assert (order["price"], order["distance_km"]) == (single["price"], single["distance_km"])
+
+def test_csv_import(client, sender):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(ORDER))
+    writer.writeheader()
+    writer.writerows([ORDER, dict(ORDER, weight_kg=7.5)])
+    r = client.post("/orders/bulk", content=out.getvalue(), headers={**sender, "Content-Type": "text/csv"})
+    assert r.status_code == 200, r.text
+    assert r.json() == {"created": 2, "failed": 0, "errors": []}
+    assert [o["weight_kg"] for o in my_orders(client, sender)[:2]] == [7.5, 2.0]
+
+def test_csv_quoted_fields_may_span_lines(client, sender):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=[*ORDER, "notes"])
+    writer.writeheader()
+    writer.writerows([
+        dict(ORDER, weight_kg=3.5, notes="keep upright,\nsecond floor"),
+        dict(ORDER, weight_kg="heavy", notes='"glass"\n\nfragile'),
+        dict(ORDER, weight_kg=4.5, notes=""),
+    ])
+    r = client.post("/orders/bulk", content=out.getvalue(), headers={**sender, "Content-Type": "text/csv"})
+    assert r.status_code == 200, r.text
+    report = r.json()
+    assert report["created"] == 2
+    # The bad record is reported at the line it starts on
+    assert [e["line"] for e in report["errors"]] == [4]
+    assert [o["weight_kg"] for o in my_orders(client, sender)[:2]] == [4.5, 3.5]
+
+def test_chunk_ids_line_up_with_their_rows_when_timestamps_collide(client, sender, monkeypatch):
+    # Two chunks from the same sender stamped with the same instant (a coarse clock, or two imports at once)
+    instant = datetime(2026, 1, 1, 12, 0, 0)
+    monkeypatch.setattr(bulk_import, "datetime", type("Clock", (), {"utcnow": staticmethod(lambda: instant)}))
+    published = []
+    monkeypatch.setattr(events, "publish", lambda kind, payload: published.append(payload))
+
+    with utils.SessionLocal() as db:
+        sender_id = utils.get_user_profiles(db, type("User", (), {"id": sender_sub(client, sender)})()).sender_id
+        for weights in ((1.5, 2.5, 3.5), (4.5, 5.5)):
+            report = bulk_import.ImportReport()
+            rows = [(i, dict(ORDER, weight_kg=w)) for i, w in enumerate(weights, 1)]
+            bulk_import.import_chunk(db, sender_id, rows, report)
+            assert report.created == len(weights), report.as_dict()
+
+        assert [p["weight_kg"] for p in published] == [1.5, 2.5, 3.5, 4.5, 5.5]
+        for payload in published:
+            stored = db.get(models.Order, payload["id"])
+            assert stored.weight_kg == payload["weight_kg"]
+            assert stored.sender_id == sender_id
+
+def sender_sub(client, headers) -> str:
+    return client.get("/users/me", headers=headers).json()["user_id"]
+
+def test_chunk_falls_back_to_row_inserts_when_ids_interleave(client, sender, monkeypatch):
+    published = []
+    monkeypatch.setattr(events, "publish", lambda kind, payload: published.append(payload))
+
+    with utils.SessionLocal() as db:
+        sender_id = utils.get_user_profiles(db, type("User", (), {"id": sender_sub(client, sender)})()).sender_id
+        # Another row lands in the middle of the chunk's id range, as a foreign writer's would.
+        # Created in the chunk's own transaction: temp triggers live on one pooled connection.
+        db.connection().execute(text("""
+            CREATE TEMP TRIGGER interleave AFTER INSERT ON orders WHEN NEW.weight_kg = 2.5 BEGIN
+                INSERT INTO orders (sender_id, source_city, dest_city, distance_km, weight_kg, item_type, status, price, created_at)
+                VALUES (NEW.sender_id, 'Pune', 'Goa', 1, 0.25, 'normal', 'cancelled', 1, '2000-01-01 00:00:00');
+            END
+        """))
+        try:
+            report = bulk_import.ImportReport()
+            rows = [(i, dict(ORDER, weight_kg=w)) for i, w in enumerate((1.5, 2.5, 3.5), 1)]
+            bulk_import.import_chunk(db, sender_id, rows, report)
+        finally:
+            db.connection().execute(text("DROP TRIGGER IF EXISTS temp.interleave"))
+            db.commit()
+
+        assert report.as_dict() == {"created": 3, "failed": 0, "errors": []}
+        assert [p["weight_kg"] for p in published] == [1.5, 2.5, 3.5]
+        for payload in published:
+            assert db.get(models.Order, payload["id"]).weight_kg == payload["weight_kg"]
@@ -0,0 +1,10 @@
+"""Cold start of main:app against COLD_START_BUDGET_MS, as benchmark.py checks it."""
+import pytest
+import benchmark
+
+@pytest.mark.cold_start
+def test_cold_start_is_within_budget():
+    if not benchmark.COLD_START_BUDGET_MS:
+        pytest.skip("COLD_START_BUDGET_MS=0 disables the check")
+    result = benchmark.cold_start(runs=3)
+    assert result["total_ms"] <= benchmark.COLD_START_BUDGET_MS, result
@@ -0,0 +1,69 @@
+import analytics
+import dispatch
+import events
+import utils
+from conftest import create_order, make_traveller
+
+KEY = {"X-Dispatch-Key": "operator-key"}
+
+def test_dispatch_needs_the_operator_key(client, monkeypatch):
+    monkeypatch.setattr(dispatch, "DISPATCH_API_KEY", None)
+    assert client.post("/dispatch", headers=KEY).status_code == 403
+    monkeypatch.setattr(dispatch, "DISPATCH_API_KEY", "operator-key")
+    assert client.post("/dispatch", headers={"X-Dispatch-Key": "wrong"}).status_code == 401
+
+def test_committed_dispatch_claims_each_order_once(client, sender, monkeypatch):
+    monkeypatch.setattr(dispatch, "DISPATCH_API_KEY", "operator-key")
+    make_traveller(client)
+    order = create_order(client, sender)
+
+    proposal = client.post("/dispatch", headers=KEY).json()
+    assert proposal["committed"] is False
+    assert order["id"] in {a["order_id"] for a in proposal["assignments"]}
+    mine = {o["id"]: o for o in client.get("/orders", headers=sender).json()["items"]}
+    assert mine[order["id"]]["status"] == "pending"
+
+    params = {"commit": "true", "max_orders": 100000, "max_kg": 1e9}
+    result = client.post("/dispatch", params=params, headers=KEY).json()
+    assert result["conflicts"] == 0
+    assigned = {a["order_id"]: a["traveller_id"] for a in result["assignments"]}
+    mine = {o["id"]: o for o in client.get("/orders", headers=sender).json()["items"]}
+    assert mine[order["id"]]["status"] == "accepted"
+    assert mine[order["id"]]["traveller_id"] == assigned[order["id"]]
+
+    again = client.post("/dispatch", params=params, headers=KEY).json()
+    assert order["id"] not in {a["order_id"] for a in again["assignments"]}
+    assert again["conflicts"] == 0
+
+def pending_orders(db, ids):
+    orders, _ = dispatch.load_problem(db)
+    return {order.id: order for order in orders if order.id in ids}
+
+def test_commit_claims_only_rows_its_update_changed(client, sender, engine, monkeypatch):
+    traveller = make_traveller(client)
+    taken, free = create_order(client, sender), create_order(client, sender)
+    traveller_id = client.get("/travellers", headers=traveller).json()[0]["id"]
+
+    with utils.SessionLocal() as db:
+        planned = pending_orders(db, {taken["id"], free["id"]})
+    # The same traveller accepts one of them directly between planning and commit
+    assert client.post(f"/orders/{taken['id']}/accept", headers=traveller).status_code == 200
+
+    published = []
+    monkeypatch.setattr(events, "publish", lambda kind, payload: published.append((kind, payload["id"])))
+    with utils.SessionLocal() as db:
+        claimed = dispatch.commit_assignments(db, [(planned[taken["id"]], traveller_id, 0.0, 0.0),
+                                                   (planned[free["id"]], traveller_id, 0.0, 0.0)])
+    assert [order.id for order, _, _, _ in claimed] == [free["id"]]
+    assert published == [(events.ORDER_ACCEPTED, free["id"])]
+    with engine.connect() as conn:
+        assert analytics.check(conn) == []
+
+def test_operator_views_need_the_operator_key(client, monkeypatch):
+    for path in ("/metrics", "/cache/stats"):
+        monkeypatch.setattr(dispatch, "DISPATCH_API_KEY", None)
+        assert client.get(path, headers=KEY).status_code == 403
+        monkeypatch.setattr(dispatch, "DISPATCH_API_KEY", "operator-key")
+        assert client.get(path).status_code == 401
+        assert client.get(path, headers={"X-Dispatch-Key": "wrong"}).status_code == 401
+        assert client.get(path, headers=KEY).status_code == 200
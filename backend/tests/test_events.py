@@ -0,0 +1,93 @@
+import asyncio
+import json
+import time
+import pytest
+import events
+
+def test_broker_missing_a_method_fails_at_construction():
+    class Incomplete(events.Broker):
+        def publish(self, event_type, data):
+            return 0
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_in_process_broker_replays_its_backlog():
+    broker = events.InProcessBroker(backlog=2)
+    first = broker.publish(events.ORDER_CREATED, {"id": 1})
+    second = broker.publish(events.ORDER_CREATED, {"id": 2})
+    third = broker.publish(events.ORDER_ACCEPTED, {"id": 1})
+    assert first < second < third
+    assert broker.replay(first) == [
+        {"id": second, "type": events.ORDER_CREATED, "data": {"id": 2}},
+        {"id": third, "type": events.ORDER_ACCEPTED, "data": {"id": 1}},
+    ]
+    assert broker.replay(third) == []
+    assert broker.replay(first - 1) is None  # left the backlog
+
+def test_ids_keep_growing_across_a_restart():
+    before = events.InProcessBroker()
+    last_seen = [before.publish(events.ORDER_CREATED, {"id": i}) for i in range(3)][-1]
+    time.sleep(0.001)  # any real restart takes far longer
+    restarted = events.InProcessBroker()
+    # The old id is older than anything the new process has: the client must reload, not resume
+    assert restarted.replay(last_seen) is None
+    assert restarted.publish(events.ORDER_CREATED, {"id": 4}) > last_seen
+    assert restarted.replay(last_seen) is None
+
+class Request:
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+def parse(frame: str) -> dict:
+    fields = dict(line.split(": ", 1) for line in frame.strip().split("\n"))
+    if "data" in fields:
+        fields["data"] = json.loads(fields["data"])
+    return fields
+
+def test_stream_resumes_after_last_event_id_without_repeating_seen_events(monkeypatch):
+    broker = events.InProcessBroker()
+    monkeypatch.setattr(events, "broker", broker)
+    mumbai = {"source_city": "Mumbai", "dest_city": "Delhi"}
+    seen = broker.publish(events.ORDER_CREATED, {"id": 1, **mumbai})
+    accepted = broker.publish(events.ORDER_ACCEPTED, {"id": 1, **mumbai})
+    broker.publish(events.ORDER_CREATED, {"id": 2, "source_city": "Pune", "dest_city": "Goa"})
+    created = broker.publish(events.ORDER_CREATED, {"id": 3, **mumbai})
+
+    async def scenario():
+        request = Request()
+        stream = events.sse_stream(request, source_city="Mumbai", last_event_id=str(seen))
+        frames = []
+        while not (frame := await stream.__anext__()).startswith("retry:"):
+            frames.append(parse(frame))
+        # Live events follow the replay; one already replayed is not sent twice
+        live = broker.publish(events.ORDER_ACCEPTED, {"id": 3, **mumbai})
+        frames.append(parse(await stream.__anext__()))
+        request.disconnected = True
+        await stream.aclose()
+        return frames, live
+
+    frames, live = asyncio.run(scenario())
+    assert frames == [
+        {"id": str(accepted), "event": events.ORDER_ACCEPTED, "data": {"id": 1, **mumbai}},
+        {"id": str(created), "event": events.ORDER_CREATED, "data": {"id": 3, **mumbai}},
+        {"id": str(live), "event": events.ORDER_ACCEPTED, "data": {"id": 3, **mumbai}},
+    ]
+
+def test_stream_resets_a_client_whose_id_is_from_before_a_restart(monkeypatch):
+    stale = events.InProcessBroker().publish(events.ORDER_CREATED, {"id": 1})
+    time.sleep(0.001)
+    broker = events.InProcessBroker()
+    monkeypatch.setattr(events, "broker", broker)
+    broker.publish(events.ORDER_CREATED, {"id": 2})
+
+    async def first_frame():
+        stream = events.sse_stream(Request(), last_event_id=str(stale))
+        frame = await stream.__anext__()
+        await stream.aclose()
+        return frame
+
+    assert asyncio.run(first_frame()).startswith("event: reset")
@@ -0,0 +1,41 @@
+import random
+from datetime import datetime, timedelta
+from matching import PendingOrderIndex, _dist
+
+def brute_force(orders, origin, destination, max_detour_km):
+    route_km = _dist(origin, destination)
+    found = set()
+    for order_id, (_, pickup, drop) in orders.items():
+        detour = _dist(origin, pickup) + _dist(pickup, drop) + _dist(drop, destination) - route_km
+        if detour <= max_detour_km:
+            found.add((order_id, round(max(detour, 0.0), 2)))
+    return found
+
+def test_grid_pruning_finds_exactly_the_brute_force_matches():
+    rng = random.Random(5)
+    # Warehouses scattered over India plus a few far away, several orders per lane
+    points = [(rng.uniform(8, 32), rng.uniform(68, 90)) for _ in range(300)] + \
+             [(rng.uniform(-60, 60), rng.uniform(-180, 180)) for _ in range(30)]
+    start = datetime(2026, 1, 1)
+    orders = {i: (start + timedelta(minutes=i), rng.choice(points), rng.choice(points)) for i in range(1500)}
+    index = PendingOrderIndex()
+    for order_id, (created_at, pickup, drop) in orders.items():
+        index.add(order_id, created_at, pickup, drop)
+
+    for _ in range(25):
+        origin, destination = rng.choice(points), rng.choice(points)
+        for max_detour_km in (0, 25, 150, 600):
+            got = index.match(origin, destination, max_detour_km, limit=len(orders))
+            assert set(got) == brute_force(orders, origin, destination, max_detour_km)
+            assert [detour for _, detour in got] == sorted(detour for _, detour in got)
+
+def test_last_order_off_a_lane_evicts_it():
+    index = PendingOrderIndex()
+    pickup, drop = (19.07, 72.87), (28.70, 77.10)
+    index.add(1, datetime(2026, 1, 1), pickup, drop)
+    index.add(2, datetime(2026, 1, 2), pickup, drop)
+    index.remove(1)
+    assert index.match(pickup, drop, 0) == [(2, 0.0)]
+    index.remove(2)
+    assert index._lane_km == {} and index._cells == {} and index._by_pickup == {}
+    assert index.match(pickup, drop, 0) == []
@@ -0,0 +1,64 @@
+"""The vectorised pricing path must price every row exactly like the scalar one."""
+import math
+import random
+import numpy as np
+from courier_pricing import (
+    DISTANCE_SLABS, RISK_FEES, WEIGHT_SLABS, haversine_distance, haversine_distance_batch,
+    price_calculator, price_calculator_batch,
+)
+
+R = 6371
+ITEM_TYPES = list(RISK_FEES) + ["Fragile", "ELECTRONICS", "unknown"]
+
+def scalar_prices(lat1, lon1, lat2, lon2, weight_kg, item_type):
+    return [price_calculator(*row).price for row in zip(lat1, lon1, lat2, lon2, weight_kg, item_type)]
+
+def test_random_rows_match_the_scalar_path():
+    rng = random.Random(7)
+    n = 20_000
+    columns = (
+        [rng.uniform(-90, 90) for _ in range(n)], [rng.uniform(-180, 180) for _ in range(n)],
+        [rng.uniform(-90, 90) for _ in range(n)], [rng.uniform(-180, 180) for _ in range(n)],
+        [rng.choice([rng.uniform(0.1, 25), *(bound for bound, _ in WEIGHT_SLABS)]) for _ in range(n)],
+        [rng.choice(ITEM_TYPES) for _ in range(n)],
+    )
+    assert price_calculator_batch(*columns).tolist() == scalar_prices(*columns)
+
+def test_distances_at_slab_bounds_match_the_scalar_path():
+    # Points on the equator and a few other parallels, stepping across every distance bound in 1 m steps
+    lat1, lon1, lat2, lon2 = [], [], [], []
+    for bound, _ in DISTANCE_SLABS:
+        for lat in (0.0, 12.34, 45.0, -60.0):
+            scale = R * math.radians(1) * math.cos(math.radians(lat))
+            for km in np.arange(bound - 0.03, bound + 0.03, 0.001):
+                lat1.append(lat), lon1.append(0.0), lat2.append(lat), lon2.append(float(km / scale))
+    # Found by scanning: numpy rounds this one to 1500.00 km, the scalar path to 1500.01 km
+    lat1.append(0.0), lon1.append(0.0), lat2.append(0.0), lon2.append(13.489869054861256)
+    n = len(lat1)
+    weight_kg, item_type = [2.0] * n, ["normal"] * n
+    assert price_calculator_batch(lat1, lon1, lat2, lon2, weight_kg, item_type).tolist() == \
+        scalar_prices(lat1, lon1, lat2, lon2, weight_kg, item_type)
+
+def test_batch_distances_agree_within_a_rounding_step():
+    rng = np.random.default_rng(3)
+    lat1, lat2 = rng.uniform(-90, 90, (2, 5000))
+    lon1, lon2 = rng.uniform(-180, 180, (2, 5000))
+    batch = haversine_distance_batch(lat1, lon1, lat2, lon2)
+    scalar = np.array([haversine_distance(*row) for row in zip(lat1, lon1, lat2, lon2)])
+    assert np.abs(batch - scalar).max() <= 0.01 + 1e-9
+
+def test_quote_batch_quote_and_order_agree_off_hub(client, sender):
+    from conftest import create_order
+
+    # Bangalore-Hyderabad is 499.99 km; a few km out from each hub (inside the snap radius)
+    # the raw points are over the 500 km slab bound, the hubs are not
+    near_bangalore, near_hyderabad, warehouse = (12.93, 77.59), (17.42, 78.50), (24.0, 80.0)
+    for (lat1, lon1), (lat2, lon2), source_city in ((near_bangalore, near_hyderabad, "Bangalore"),
+                                                    (warehouse, near_hyderabad, "Warehouse 7")):
+        quote = {"lat1": lat1, "lon1": lon1, "lat2": lat2, "lon2": lon2, "weight_kg": 3.0, "item_type": "fragile"}
+        scalar = client.get("/calculate-price", params=quote).json()["price"]
+        batch = client.post("/calculate-price/batch", json={k: [v] for k, v in quote.items()}).json()["prices"]
+        order = create_order(client, sender, source_city=source_city, dest_city="Hyderabad",
+                             source_lat=lat1, source_lon=lon1, dest_lat=lat2, dest_lon=lon2,
+                             weight_kg=3.0, item_type="fragile")
+        assert batch == [scalar] == [order["price"]]
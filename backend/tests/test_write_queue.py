@@ -0,0 +1,78 @@
+import asyncio
+from fastapi import HTTPException
+from write_queue import WriteQueue
+
+def test_cancelled_waiter_does_not_stall_its_batch(engine):
+    async def scenario(writer):
+        # A wide window, so both jobs are still queued in the same batch when the first one gives up
+        first = asyncio.ensure_future(writer.submit((), lambda db, rollup: "first"))
+        second = asyncio.ensure_future(writer.submit((), lambda db, rollup: "second"))
+        await asyncio.sleep(0.02)
+        first.cancel()
+        assert await asyncio.wait_for(second, 5) == "second"
+        assert first.cancelled()
+        assert await asyncio.wait_for(writer.submit((), lambda db, rollup: "after"), 5) == "after"
+
+    writer = WriteQueue(max_batch=16, max_delay_ms=200)
+    try:
+        asyncio.run(scenario(writer))
+        assert writer._thread.is_alive()
+        assert writer.stats()["rows"] == 3
+    finally:
+        writer.stop()
+
+def test_writer_survives_a_crashed_batch(engine):
+    async def scenario(writer):
+        try:
+            await asyncio.wait_for(writer.submit((), lambda db, rollup: "lost"), 5)
+        except HTTPException as e:
+            assert e.status_code == 500
+        else:
+            raise AssertionError("the crashed batch should fail its requests")
+        assert await asyncio.wait_for(writer.submit((), lambda db, rollup: "next"), 5) == "next"
+
+    writer = WriteQueue(max_batch=16, max_delay_ms=1)
+    commit = writer._commit
+    calls = []
+
+    def crash_once(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return commit(batch)
+
+    writer._commit = crash_once
+    try:
+        asyncio.run(scenario(writer))
+        assert writer._thread.is_alive()
+    finally:
+        writer.stop()
+
+def test_a_failing_row_fails_only_its_own_request(engine):
+    def bad(db, rollup):
+        raise ValueError("bad row")
+
+    async def scenario(writer):
+        jobs = [writer.submit((), lambda db, rollup: "first"), writer.submit((), bad),
+                writer.submit((), lambda db, rollup: "third")]
+        return await asyncio.wait_for(asyncio.gather(*jobs, return_exceptions=True), 5)
+
+    writer = WriteQueue(max_batch=16, max_delay_ms=200)
+    try:
+        first, failed, third = asyncio.run(scenario(writer))
+    finally:
+        writer.stop()
+    assert (first, third) == ("first", "third")
+    assert isinstance(failed, ValueError)
+    assert writer.stats()["batches"] == 1
+    assert writer.stats()["fallbacks"] == 1
+
+def test_queued_orders_get_their_ids(client, sender, monkeypatch):
+    import write_queue
+    from conftest import ORDER
+
+    monkeypatch.setattr(write_queue, "WRITE_QUEUE", True)
+    ids = {client.post("/orders", json=ORDER, headers=sender).json()["id"] for _ in range(5)}
+    assert len(ids) == 5
+    listed = {o["id"] for o in client.get("/orders", headers=sender).json()["items"]}
+    assert ids <= listed
@@ -1,12 +1,27 @@
 # utils.py
 
 from fastapi import HTTPException
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, tuple_, select, literal, update, delete, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker, Session, load_only, raiseload
+from sqlalchemy.util import await_only
+from pydantic import BaseModel, ConfigDict
+from typing import Optional
 from math import radians, cos, sin, sqrt, atan2
+from datetime import datetime
+from collections import namedtuple
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
 import models
-from database import DATABASE_URL, Base, engine, SessionLocal
+import analytics
+from database import DATABASE_URL, Base, engine, SessionLocal, USE_ASYNC_DB, AsyncSessionLocal
 
 # -------------------------------
 # Pydantic Schemas
@@ -38,8 +53,79 @@ class ComplaintCreate(BaseModel):
     order_id: int
     issue: str
 
-# Create tables (ensures they exist)
-Base.metadata.create_all(bind=engine)
+# Response schemas: exactly the columns the API returns, read straight off ORM rows
+class SenderOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+    supabase_id: Optional[str] = None
+    name: str
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class TravellerOut(SenderOut):
+    source_city: str
+    dest_city: str
+
+class OrderOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+    sender_id: int
+    traveller_id: Optional[int] = None
+    source_city: str
+    dest_city: str
+    distance_km: float
+    weight_kg: float
+    item_type: str
+    status: Optional[str] = None
+    price: float
+    created_at: Optional[datetime] = None
+
+class ComplaintOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+    order_id: int
+    issue: str
+    created_at: Optional[datetime] = None
+
+class OrderPage(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    items: list[OrderOut]
+    next_cursor: Optional[str] = None
+
+class ComplaintPage(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    items: list[ComplaintOut]
+    next_cursor: Optional[str] = None
+
+class OrderMatch(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    detour_km: float
+    order: OrderOut
+
+class MatchPage(BaseModel):
+    items: list[OrderMatch]
+
+class RouteHop(BaseModel):
+    name: str
+    lat: float
+    lon: float
+    leg_km: float  # from the previous hop, 0 for the first
+
+class RouteOut(BaseModel):
+    source: str
+    destination: str
+    hops: list[RouteHop]
+    distance_km: float
+    direct_km: float
+    price: int
+
+def columns_only(model, schema):
+    """Query options loading just the schema's columns; touching a relationship raises instead of querying."""
+    return (load_only(*(getattr(model, name) for name in schema.model_fields)), raiseload("*"))
+
+ORDER_COLUMNS = columns_only(models.Order, OrderOut)
+COMPLAINT_COLUMNS = columns_only(models.Complaint, ComplaintOut)
 
 # -------------------------------
 # Utilities
@@ -66,6 +152,39 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Session dependency used by the routes; picks the async engine when USE_ASYNC_DB is set
+get_session = get_async_db if USE_ASYNC_DB else get_db
+
+async def run_db(db, fn, *args):
+    """
+    Await one of the CRUD functions below against either session type.
+    AsyncSession runs it on the async connection via run_sync (no thread),
+    a plain Session runs it in the threadpool.
+    """
+    if hasattr(db, "run_sync"):
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
+
+async def run_blocking(db, fn, *args):
+    """
+    run_db for CPU-heavy work (dispatch, the match-index reload, bulk import chunks).
+    run_sync keeps an AsyncSession's work on the event loop thread, so under
+    USE_ASYNC_DB these get a plain Session of their own in the threadpool instead.
+    fn must be self-contained: it commits what it writes.
+    """
+    if not hasattr(db, "run_sync"):
+        return await run_in_threadpool(fn, db, *args)
+
+    def call():
+        with SessionLocal() as session:
+            return fn(session, *args)
+
+    return await run_in_threadpool(call)
+
 def haversine_distance(lat1, lon1, lat2, lon2):
     """Calculate distance between two coordinates in km"""
     R = 6371  # Earth's radius in km
@@ -76,15 +195,341 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     c = 2*atan2(sqrt(a), sqrt(1-a))
     return round(R * c, 2)
 
-from courier_pricing import price_calculator
+from courier_pricing import price_calculator, price_for_distance, weight_slab, RISK_FEES
+from city_registry import CityRegistry
+from routing import HubRouter
+from matching import PendingOrderIndex
+from response_cache import BoardCache, backend_from_env
+import events
+from observability import get_logger
+
+log = get_logger("utils")
+
+# -------------------------------
+# City Registry
+# -------------------------------
+# Known hubs: CITY_DATA plus an optional CSV (name,lat,lon) of extra cities/pincodes
+CITY_CSV = os.environ.get("CITY_CSV")
+# Raw coordinates within this distance of a hub are snapped to the hub (0 disables)
+HUB_SNAP_RADIUS_KM = float(os.environ.get("HUB_SNAP_RADIUS_KM", "10"))
+
+city_registry = CityRegistry(CITY_DATA)
+if CITY_CSV:
+    log.info("loaded %d hubs from %s", city_registry.load_csv(CITY_CSV), CITY_CSV)
+
+def resolve_point(city: str, lat: float, lon: float):
+    return city_registry.resolve(city, lat, lon, HUB_SNAP_RADIUS_KM)
+
+def resolve_points(lats, lons):
+    """resolve_point over a column of unnamed coordinates, each distinct point looked up once."""
+    points = {}
+    for point in zip(lats, lons):
+        if point not in points:
+            points[point] = resolve_point(None, *point)
+    resolved = [points[point] for point in zip(lats, lons)]
+    return [lat for lat, _ in resolved], [lon for _, lon in resolved]
+
+# -------------------------------
+# Routing
+# -------------------------------
+router = HubRouter(city_registry)
+
+def plan_route(source: str, destination: str, weight_kg: float, item_type: str) -> RouteOut:
+    """Hub-by-hub path between two known cities, priced like an order between them."""
+    for name in (source, destination):
+        if city_registry.get(name) is None:
+            raise HTTPException(status_code=404, detail=f"Unknown city: {name}")
+    route = router.route(source, destination)
+    if route is None:
+        raise HTTPException(status_code=404, detail=f"No route from {source} to {destination}")
+    hops = []
+    for name, leg_km in zip(route.hops, [0.0, *route.legs_km]):
+        lat, lon = city_registry.get(name)
+        hops.append(RouteHop(name=name, lat=lat, lon=lon, leg_km=leg_km))
+    (lat1, lon1), (lat2, lon2) = city_registry.get(source), city_registry.get(destination)
+    return RouteOut(
+        source=source,
+        destination=destination,
+        hops=hops,
+        distance_km=route.distance_km,
+        direct_km=haversine_distance(lat1, lon1, lat2, lon2),
+        # Orders are charged on the direct distance, so quote exactly what create_order would
+        price=price_calculator(lat1, lon1, lat2, lon2, weight_kg, item_type).price,
+    )
+
+# -------------------------------
+# City Lanes
+# -------------------------------
+# Distances between every pair of known cities, computed once at import with the
+# same haversine_distance used per order, so values are bit-identical.
+CITY_DISTANCES = {
+    (src, dst): haversine_distance(a["lat"], a["lon"], b["lat"], b["lon"])
+    for src, a in CITY_DATA.items()
+    for dst, b in CITY_DATA.items()
+}
+
+# (source_city, dest_city, weight slab, risk class) -> price; bounded by the known lanes
+_lane_prices = {}
+lane_cache_hits = 0
+lane_cache_misses = 0
+
+def lane_price(source_city: str, dest_city: str, weight_kg: float, item_type: str) -> int:
+    """Memoized price for a lane between two CITY_DATA cities."""
+    global lane_cache_hits, lane_cache_misses
+    risk_class = item_type.lower() if item_type.lower() in RISK_FEES else ""
+    key = (source_city, dest_city, weight_slab(weight_kg), risk_class)
+    price = _lane_prices.get(key)
+    if price is not None:
+        lane_cache_hits += 1
+        return price
+    lane_cache_misses += 1
+    price = price_for_distance(CITY_DISTANCES[(source_city, dest_city)], weight_kg, item_type).price
+    _lane_prices[key] = price
+    return price
+
+def lane_cache_stats():
+    return {
+        "lanes": len(CITY_DISTANCES),
+        "prices_cached": len(_lane_prices),
+        "hits": lane_cache_hits,
+        "misses": lane_cache_misses,
+    }
+
+# -------------------------------
+# Write Retries
+# -------------------------------
+# SQLite reports lock contention as "database is locked"/"busy" once busy_timeout runs out
+DB_WRITE_RETRIES = int(os.environ.get("DB_WRITE_RETRIES", "5"))
+DB_RETRY_BACKOFF = float(os.environ.get("DB_RETRY_BACKOFF", "0.01"))  # seconds, doubled per attempt
+
+def _is_busy(error: OperationalError) -> bool:
+    message = str(error.orig).lower()
+    return "database is locked" in message or "database is busy" in message
+
+def commit_with_retry(db: Session, write):
+    """
+    Run write() and commit, retrying with jittered exponential backoff when the
+    database is busy. Returns write()'s result.
+    """
+    for attempt in range(DB_WRITE_RETRIES + 1):
+        try:
+            result = write()
+            db.commit()
+            return result
+        except OperationalError as e:
+            db.rollback()
+            if not _is_busy(e):
+                raise
+            if attempt == DB_WRITE_RETRIES:
+                raise HTTPException(status_code=503, detail="Database busy, please retry")
+            _backoff(db, DB_RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random()))
+
+def _backoff(db: Session, seconds: float):
+    # Under AsyncSession.run_sync this runs on the event loop: yield to it rather than block it
+    if db.get_bind().dialect.is_async:
+        await_only(asyncio.sleep(seconds))
+    else:
+        time.sleep(seconds)
+
+# -------------------------------
+# Resource Versions
+# -------------------------------
+if engine.dialect.name == "postgresql":
+    from sqlalchemy.dialects.postgresql import insert as _dialect_insert
+else:
+    from sqlalchemy.dialects.sqlite import insert as _dialect_insert
+
+VERSIONS = models.ResourceVersion.__table__
+_bump = _dialect_insert(VERSIONS)
+_bump = _bump.on_conflict_do_update(index_elements=["name"], set_={"version": VERSIONS.c.version + 1})
+
+def bump_versions(db: Session, *names):
+    """
+    Bump resource version counters inside the caller's write transaction. Counters
+    that do not exist yet (per-lane board versions) start at 1. Sorted, so writers
+    on Postgres lock version rows in the same order.
+    """
+    if names:
+        db.execute(_bump, [{"name": name, "version": 1} for name in sorted(set(names))])
+
+def board_version(source_city: str = None, dest_city: str = None) -> str:
+    """Version counter of one /orders/available filter."""
+    return "board:" + json.dumps([source_city or None, dest_city or None])
+
+def board_resources(source_city: str = None, dest_city: str = None) -> tuple:
+    """What a board page depends on: its filter's counter, plus the "board" epoch bulk rewrites bump."""
+    return ("board", board_version(source_city, dest_city))
+
+def board_versions(*lanes) -> list:
+    """Counters of every board filter that can list an order on these (source_city, dest_city) lanes."""
+    names = {board_version()}
+    for source_city, dest_city in lanes:
+        names.update((board_version(source_city), board_version(None, dest_city),
+                      board_version(source_city, dest_city)))
+    return sorted(names)
+
+def resource_versions(db: Session, resources) -> dict:
+    """
+    Version counters of the resources (0 when missing). Remembered for the rest of
+    the session's transaction, so the board cache keys on the read the ETag used.
+    """
+    transaction = db.get_transaction() or db.begin()
+    seen = db.info.get("resource_versions")
+    if seen is None or seen[0] is not transaction:
+        seen = db.info["resource_versions"] = (transaction, {})
+    missing = [name for name in resources if name not in seen[1]]
+    if missing:
+        found = dict(
+            db.query(models.ResourceVersion.name, models.ResourceVersion.version)
+            .filter(models.ResourceVersion.name.in_(missing))
+        )
+        seen[1].update((name, found.get(name, 0)) for name in missing)
+    return {name: seen[1][name] for name in resources}
+
+def resource_etag(db: Session, resources, scope: str = "") -> str:
+    """
+    Strong ETag for a list response: the versions of every resource it reads
+    plus whatever scopes it (user id, filters, cursor). One primary-key read,
+    no row queries. The counters live in the database, so every worker agrees.
+    """
+    versions = resource_versions(db, resources)
+    key = "|".join(f"{name}={versions[name]}" for name in sorted(resources))
+    return '"' + hashlib.sha1(f"{key}|{scope}".encode()).hexdigest() + '"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+def conditional_list(db: Session, if_none_match: str, resources, scope: str, fn, *args):
+    """
+    (etag, body) for a list route; body is None when the client's copy is current,
+    in which case no rows are queried at all.
+    """
+    etag = resource_etag(db, resources, scope)
+    if etag_matches(if_none_match, etag):
+        return etag, None
+    return etag, fn(db, *args)
+
+# -------------------------------
+# Pagination
+# -------------------------------
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_filter(query, model, after: str = None):
+    """Rows strictly older than the cursor in (created_at, id) DESC order."""
+    if not after:
+        return query
+    created_at, row_id = decode_cursor(after)
+    return query.filter(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+
+def paginate(query, model, limit: int = DEFAULT_PAGE_SIZE):
+    """
+    Newest-first page of an already keyset-filtered query, as the
+    {"items": [...], "next_cursor": str | None} envelope the list routes return.
+    """
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return {"items": rows, "next_cursor": next_cursor}
+
+# -------------------------------
+# Profile Context
+# -------------------------------
+# Sender/Traveller ids for one Supabase user; either may be None
+UserProfiles = namedtuple("UserProfiles", ["sender_id", "traveller_id"])
+
+# Seconds a user's profile ids may be reused across requests (0 disables the process cache)
+PROFILE_CACHE_TTL = float(os.environ.get("PROFILE_CACHE_TTL", "0"))
+
+class ProfileCache:
+    """Short-TTL process cache of supabase_id -> UserProfiles."""
+
+    def __init__(self, ttl: float = PROFILE_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, supabase_id):
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(supabase_id)
+            if entry is None or entry[0] <= time.monotonic():
+                self._entries.pop(supabase_id, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, supabase_id, profiles: UserProfiles):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[supabase_id] = (time.monotonic() + self.ttl, profiles)
+
+    def invalidate(self, supabase_id):
+        with self._lock:
+            self._entries.pop(supabase_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+profile_cache = ProfileCache()
+
+def get_user_profiles(db: Session, user) -> UserProfiles:
+    """
+    Resolve the user's Sender and Traveller ids in a single query.
+    The result is memoized on the session, so it lives exactly as long as the request.
+    """
+    request_cache = db.info.setdefault("user_profiles", {})
+    profiles = request_cache.get(user.id)
+    if profiles is not None:
+        return profiles
+
+    profiles = profile_cache.get(user.id)
+    if profiles is None:
+        me = select(literal(user.id).label("supabase_id")).subquery()
+        row = db.query(models.Sender.id, models.Traveller.id).select_from(me) \
+            .outerjoin(models.Sender, models.Sender.supabase_id == me.c.supabase_id) \
+            .outerjoin(models.Traveller, models.Traveller.supabase_id == me.c.supabase_id) \
+            .first()
+        profiles = UserProfiles(*row)
+        profile_cache.put(user.id, profiles)
+    request_cache[user.id] = profiles
+    return profiles
+
+def invalidate_user_profiles(db: Session, user):
+    db.info.get("user_profiles", {}).pop(user.id, None)
+    profile_cache.invalidate(user.id)
 
 # -------------------------------
 # Sender Logic
 # -------------------------------
 def create_sender(db: Session, sender: SenderCreate, user):
     # Check if sender profile already exists for this Supabase user
-    existing_sender = db.query(models.Sender).filter(models.Sender.supabase_id == user.id).first()
-    if existing_sender:
+    if get_user_profiles(db, user).sender_id:
         raise HTTPException(status_code=400, detail="Sender profile already exists for this user")
 
     db_sender = models.Sender(
@@ -94,7 +539,9 @@ def create_sender(db: Session, sender: SenderCreate, user):
         phone=sender.phone
     )
     db.add(db_sender)
+    bump_versions(db, "senders")
     db.commit()
+    invalidate_user_profiles(db, user)
     db.refresh(db_sender)
     return db_sender
 
@@ -109,8 +556,7 @@ def get_current_sender(db: Session, user):
 # Traveller Logic
 # -------------------------------
 def create_traveller(db: Session, traveller: TravellerCreate, user):
-    existing_traveller = db.query(models.Traveller).filter(models.Traveller.supabase_id == user.id).first()
-    if existing_traveller:
+    if get_user_profiles(db, user).traveller_id:
         raise HTTPException(status_code=400, detail="Traveller profile already exists for this user")
 
     db_traveller = models.Traveller(
@@ -122,7 +568,9 @@ def create_traveller(db: Session, traveller: TravellerCreate, user):
         dest_city=traveller.dest_city
     )
     db.add(db_traveller)
+    bump_versions(db, "travellers")
     db.commit()
+    invalidate_user_profiles(db, user)
     db.refresh(db_traveller)
     return db_traveller
 
@@ -136,106 +584,292 @@ def get_current_traveller(db: Session, user):
 # -------------------------------
 # Order Logic
 # -------------------------------
-def create_order(db: Session, order: OrderCreate, user):
+ORDER_EVENT_FIELDS = ("id", "sender_id", "traveller_id", "source_city", "dest_city",
+                      "distance_km", "weight_kg", "item_type", "status", "price")
+
+def order_event_payload(order: models.Order) -> dict:
+    """Column snapshot of an order for the event feed."""
+    payload = {name: getattr(order, name) for name in ORDER_EVENT_FIELDS}
+    payload["created_at"] = order.created_at.isoformat() if order.created_at else None
+    return payload
+
+def new_order(db: Session, order: OrderCreate, user) -> models.Order:
+    """Validated, priced Order for the user's sender profile, not yet added to a session."""
     # Validate that current user has a Sender profile
-    sender_profile = get_current_sender(db, user)
-    if not sender_profile:
+    sender_id = get_user_profiles(db, user).sender_id
+    if not sender_id:
         raise HTTPException(status_code=400, detail="You must create a Sender profile first")
 
     # SECURITY FIX: Protect against coordinate manipulation (IDOR in Price)
-    # Use server-side city coordinates if available, otherwise fallback to user input
-    source_lat, source_lon = order.source_lat, order.source_lon
-    dest_lat, dest_lon = order.dest_lat, order.dest_lon
-
-    if order.source_city in CITY_DATA:
-        source_lat = CITY_DATA[order.source_city]["lat"]
-        source_lon = CITY_DATA[order.source_city]["lon"]
-    
-    if order.dest_city in CITY_DATA:
-        dest_lat = CITY_DATA[order.dest_city]["lat"]
-        dest_lon = CITY_DATA[order.dest_city]["lon"]
-
-    distance_km = haversine_distance(source_lat, source_lon, dest_lat, dest_lon)
-    price_response = price_calculator(source_lat, source_lon,
-                                      dest_lat, dest_lon,
-                                      order.weight_kg, order.item_type)
-    price = price_response.price
+    # Use server-side hub coordinates for known city names or points near a hub,
+    # otherwise fallback to user input
+    source_lat, source_lon = resolve_point(order.source_city, order.source_lat, order.source_lon)
+    dest_lat, dest_lon = resolve_point(order.dest_city, order.dest_lat, order.dest_lon)
+
+    lane = (order.source_city, order.dest_city)
+    if lane in CITY_DISTANCES:
+        # Known lane: precomputed distance and memoized price, no trig at all
+        distance_km = CITY_DISTANCES[lane]
+        price = lane_price(order.source_city, order.dest_city, order.weight_kg, order.item_type)
+    else:
+        distance_km = haversine_distance(source_lat, source_lon, dest_lat, dest_lon)
+        price = price_for_distance(distance_km, order.weight_kg, order.item_type).price
 
     db_order = models.Order(
-        sender_id=sender_profile.id, # Securely linked to auth user
+        sender_id=sender_id, # Securely linked to auth user
         source_city=order.source_city,
         dest_city=order.dest_city,
         distance_km=distance_km,
+        source_lat=source_lat,
+        source_lon=source_lon,
+        dest_lat=dest_lat,
+        dest_lon=dest_lon,
         weight_kg=order.weight_kg,
         item_type=order.item_type,
         price=price,
-        status="pending"
+        status="pending",
+        created_at=datetime.utcnow(),
     )
+    return db_order
+
+def stage_order(db: Session, db_order: models.Order, rollup: analytics.Rollup) -> models.Order:
+    """The row-level writes of a new order; the caller bumps versions, applies the rollup and commits."""
     db.add(db_order)
+    rollup.add(db_order.created_at, db_order.source_city, db_order.dest_city, db_order.item_type,
+               orders=1, revenue=db_order.price)
+    return db_order
+
+def order_created(db_order: models.Order):
+    """Match index and event feed, once the order is committed."""
+    order_index.add(db_order.id, db_order.created_at, (db_order.source_lat, db_order.source_lon),
+                    (db_order.dest_lat, db_order.dest_lon))
+    events.publish(events.ORDER_CREATED, order_event_payload(db_order))
+
+def create_order(db: Session, order: OrderCreate, user):
+    db_order = new_order(db, order, user)
+    rollup = analytics.Rollup()
+    stage_order(db, db_order, rollup)
+    bump_versions(db, "orders", *board_versions((db_order.source_city, db_order.dest_city)))
+    rollup.apply(db)
     db.commit()
     db.refresh(db_order)
+    order_created(db_order)
     return db_order
 
-def list_orders(db: Session, user):
+def _orders_for_profiles(query, profiles: UserProfiles, model=models.Order):
+    """
+    Restrict an Order (or ArchivedOrder) query to orders where the user is Sender OR Traveller.
+    Written as a UNION of two single-column filters so each side can use its
+    own index (ix_orders_sender_id / ix_orders_traveller_id) instead of the
+    full scan an OR across two columns forces.
+    """
+    parts = []
+    if profiles.sender_id:
+        parts.append(query.filter(model.sender_id == profiles.sender_id))
+    if profiles.traveller_id:
+        parts.append(query.filter(model.traveller_id == profiles.traveller_id))
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    return parts[0].union(parts[1])
+
+def list_orders(db: Session, user, limit: int = DEFAULT_PAGE_SIZE, after: str = None):
     # Return orders where user is Sender OR user is Traveller
-    sender_profile = get_current_sender(db, user)
-    traveller_profile = get_current_traveller(db, user)
-
-    sender_id = sender_profile.id if sender_profile else -1
-    traveller_id = traveller_profile.id if traveller_profile else -1
+    profiles = get_user_profiles(db, user)
+
+    base = keyset_filter(db.query(models.Order).options(*ORDER_COLUMNS), models.Order, after)
+    query = _orders_for_profiles(base, profiles)
+    if query is None:
+        return {"items": [], "next_cursor": None}
+    return _with_archived(db, paginate(query, models.Order, limit), profiles, limit, after)
+
+# (archive version, newest archived created_at). The version is read with the /orders ETag,
+# so once warm a history page only queries the archive when its rows can sort into it.
+_archive_newest = (None, None)
+
+def _newest_archived(db: Session):
+    global _archive_newest
+    version = resource_versions(db, ("archive",))["archive"]
+    seen_version, newest = _archive_newest
+    if seen_version != version:
+        newest = db.scalar(select(func.max(models.ArchivedOrder.created_at)))
+        _archive_newest = (version, newest)
+    return newest
+
+def _with_archived(db: Session, page: dict, profiles: UserProfiles, limit: int, after: str = None):
+    """Merge the user's archived orders (see archive.py) into a page of hot ones."""
+    items = page["items"]
+    newest = _newest_archived(db)
+    # A full page ending after the newest archived order cannot contain archived rows
+    if newest is None or (page["next_cursor"] and items[-1].created_at > newest):
+        return page
+    base = keyset_filter(db.query(models.ArchivedOrder), models.ArchivedOrder, after)
+    archived = paginate(_orders_for_profiles(base, profiles, models.ArchivedOrder), models.ArchivedOrder, limit)
+    if not archived["items"]:
+        return page
+
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    rows = sorted(items + archived["items"], key=lambda row: (row.created_at, row.id), reverse=True)
+    more = len(rows) > limit or page["next_cursor"] or archived["next_cursor"]
+    rows = rows[:limit]
+    return {"items": rows, "next_cursor": encode_cursor(rows[-1].created_at, rows[-1].id) if more else None}
+
+def restore_archived_order(db: Session, order_id: int) -> bool:
+    """Move one archived order back to the hot table, inside the caller's transaction."""
+    hot, cold = models.Order.__table__, models.ArchivedOrder.__table__
+    rows = db.execute(delete(cold).where(cold.c.id == order_id).returning(*cold.c)).all()
+    if rows:
+        db.execute(hot.insert(), [row._asdict() for row in rows])
+        bump_versions(db, "archive")
+    return bool(rows)
+
+# Public order board cache, keyed by the board versions writes to a lane bump
+board_cache = BoardCache(backend_from_env())
+
+def list_available_orders(db: Session, source_city: str = None, dest_city: str = None,
+                          limit: int = DEFAULT_PAGE_SIZE, after: str = None):
+    def load():
+        query = db.query(models.Order).options(*ORDER_COLUMNS).filter(models.Order.status == "pending")
+        if source_city:
+            query = query.filter(models.Order.source_city == source_city)
+        if dest_city:
+            query = query.filter(models.Order.dest_city == dest_city)
+        query = keyset_filter(query, models.Order, after)
+        # Cached as plain JSON data, never as ORM rows bound to this session
+        return OrderPage.model_validate(paginate(query, models.Order, limit)).model_dump(mode="json")
+
+    versions = resource_versions(db, board_resources(source_city, dest_city))
+    version = ".".join(str(v) for v in versions.values())
+    return board_cache.get_or_load(source_city, dest_city, [limit, after], version, load)
 
-    return db.query(models.Order).filter(
-        (models.Order.sender_id == sender_id) | 
-        (models.Order.traveller_id == traveller_id)
-    ).all()
+# -------------------------------
+# Matching Logic
+# -------------------------------
+# Detour a traveller accepts by default, and how long the pending-order index is
+# trusted before it is reloaded (picks up orders written by other workers)
+MATCH_DETOUR_KM = float(os.environ.get("MATCH_DETOUR_KM", "50"))
+MATCH_INDEX_TTL = float(os.environ.get("MATCH_INDEX_TTL", "60"))
+
+order_index = PendingOrderIndex()
+_order_index_loaded_at = None
+
+def _order_points(row):
+    """Pickup/drop coordinates of an order row, falling back to its city names."""
+    if row.source_lat is not None and row.dest_lat is not None:
+        return (row.source_lat, row.source_lon), (row.dest_lat, row.dest_lon)
+    return city_registry.get(row.source_city), city_registry.get(row.dest_city)
+
+def ensure_order_index(db: Session):
+    """Load the pending-order index on first use and whenever it is older than MATCH_INDEX_TTL."""
+    global order_index, _order_index_loaded_at
+    if _order_index_loaded_at is not None and time.monotonic() - _order_index_loaded_at < MATCH_INDEX_TTL:
+        return
+    index = PendingOrderIndex()
+    rows = db.query(
+        models.Order.id, models.Order.created_at,
+        models.Order.source_city, models.Order.dest_city,
+        models.Order.source_lat, models.Order.source_lon,
+        models.Order.dest_lat, models.Order.dest_lon,
+    ).filter(models.Order.status == "pending")
+    for row in rows:
+        pickup, drop = _order_points(row)
+        if pickup and drop:
+            index.add(row.id, row.created_at or datetime.min, pickup, drop)
+    order_index, _order_index_loaded_at = index, time.monotonic()
+
+def find_matches(db: Session, user, max_detour_km: float = MATCH_DETOUR_KM, limit: int = DEFAULT_PAGE_SIZE):
+    """Pending orders along the current traveller's route, smallest detour first."""
+    profiles = get_user_profiles(db, user)
+    if not profiles.traveller_id:
+        raise HTTPException(status_code=400, detail="You must create a Traveller profile first")
 
-def list_available_orders(db: Session, source_city: str = None, dest_city: str = None):
-    query = db.query(models.Order).filter(models.Order.status == "pending")
-    if source_city:
-        query = query.filter(models.Order.source_city == source_city)
-    if dest_city:
-        query = query.filter(models.Order.dest_city == dest_city)
-    return query.all()
+    traveller = db.get(models.Traveller, profiles.traveller_id)
+    origin = city_registry.get(traveller.source_city)
+    destination = city_registry.get(traveller.dest_city)
+    if not origin or not destination:
+        raise HTTPException(status_code=400, detail="Route cities are not known hubs")
+
+    ensure_order_index(db)
+    # Over-fetch a little: the index may hold orders accepted on another worker
+    matches = order_index.match(origin, destination, max_detour_km, limit * 2)
+    if not matches:
+        return {"items": []}
+
+    orders = {
+        o.id: o for o in db.query(models.Order).options(*ORDER_COLUMNS).filter(
+            models.Order.id.in_([order_id for order_id, _ in matches]),
+            models.Order.status == "pending",
+        )
+    }
+    items = []
+    for order_id, detour_km in matches:
+        order = orders.get(order_id)
+        if order is None:
+            order_index.remove(order_id)
+            continue
+        if profiles.sender_id and order.sender_id == profiles.sender_id:
+            continue
+        items.append({"detour_km": detour_km, "order": order})
+        if len(items) == limit:
+            break
+    return {"items": items}
 
 # -------------------------------
 # Complaint Logic
 # -------------------------------
-def create_complaint(db: Session, complaint: ComplaintCreate, user):
+def new_complaint(db: Session, complaint: ComplaintCreate, user):
+    """(Complaint, the order it is about) after the ownership checks; nothing is written."""
     # Check if order exists and belongs to user
-    order = db.query(models.Order).filter(models.Order.id == complaint.order_id).first()
+    order = db.query(models.Order).filter(models.Order.id == complaint.order_id).first() \
+        or db.get(models.ArchivedOrder, complaint.order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    sender_profile = get_current_sender(db, user)
-    traveller_profile = get_current_traveller(db, user)
+    profiles = get_user_profiles(db, user)
 
-    is_sender = sender_profile and order.sender_id == sender_profile.id
-    is_traveller = traveller_profile and order.traveller_id == traveller_profile.id
+    is_sender = profiles.sender_id and order.sender_id == profiles.sender_id
+    is_traveller = profiles.traveller_id and order.traveller_id == profiles.traveller_id
 
     if not (is_sender or is_traveller):
         raise HTTPException(status_code=403, detail="Not authorized to complain about this order")
 
     db_complaint = models.Complaint(
         order_id=complaint.order_id,
-        issue=complaint.issue
+        issue=complaint.issue,
+        created_at=datetime.utcnow(),
     )
+    return db_complaint, order
+
+def stage_complaint(db: Session, db_complaint: models.Complaint, order, rollup: analytics.Rollup) -> models.Complaint:
+    """The row-level writes of a new complaint; the caller bumps versions, applies the rollup and commits."""
+    if isinstance(order, models.ArchivedOrder):
+        # Complaints only reference hot orders
+        restore_archived_order(db, order.id)
     db.add(db_complaint)
+    rollup.add(order.created_at, order.source_city, order.dest_city, order.item_type, complaints=1)
+    return db_complaint
+
+def create_complaint(db: Session, complaint: ComplaintCreate, user):
+    db_complaint, order = new_complaint(db, complaint, user)
+    rollup = analytics.Rollup()
+    stage_complaint(db, db_complaint, order, rollup)
+    bump_versions(db, "complaints")
+    rollup.apply(db)
     db.commit()
     db.refresh(db_complaint)
     return db_complaint
 
-def list_complaints(db: Session, user):
+def list_complaints(db: Session, user, limit: int = DEFAULT_PAGE_SIZE, after: str = None):
     # List complaints for orders involved with this user
-    sender_profile = get_current_sender(db, user)
-    traveller_profile = get_current_traveller(db, user)
-
-    sender_id = sender_profile.id if sender_profile else -1
-    traveller_id = traveller_profile.id if traveller_profile else -1
+    profiles = get_user_profiles(db, user)
 
-    return db.query(models.Complaint).join(models.Order).filter(
-        (models.Order.sender_id == sender_id) | 
-        (models.Order.traveller_id == traveller_id)
-    ).all()
+    base = keyset_filter(db.query(models.Complaint).options(*COMPLAINT_COLUMNS).join(models.Order),
+                         models.Complaint, after)
+    query = _orders_for_profiles(base, profiles)
+    if query is None:
+        return {"items": [], "next_cursor": None}
+    return paginate(query, models.Complaint, limit)
 
 # -------------------------------
 # Interaction Logic
@@ -243,29 +877,43 @@ def list_complaints(db: Session, user):
 def accept_order(db: Session, user, order_id: int):
     """
     Traveller accepts an order.
+    The claim is a single conditional UPDATE, so concurrent accepts cannot both win.
     """
     # 1. Validate User is a Traveller
-    traveller_profile = get_current_traveller(db, user)
-    if not traveller_profile:
+    profiles = get_user_profiles(db, user)
+    if not profiles.traveller_id:
         raise HTTPException(status_code=400, detail="You must create a Traveller profile first")
 
-    # 2. Get Order
-    order = db.query(models.Order).filter(models.Order.id == order_id).first()
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    # 3. Check if already accepted
-    if order.traveller_id:
-        raise HTTPException(status_code=400, detail="Order already accepted by another traveller")
-    
-    # 4. Check if traveller is trying to accept their own order (optional but good)
-    sender_profile = get_current_sender(db, user)
-    if sender_profile and order.sender_id == sender_profile.id:
-         raise HTTPException(status_code=400, detail="You cannot accept your own order")
-
-    # 5. Assign
-    order.traveller_id = traveller_profile.id
-    order.status = "accepted"
-    db.commit()
-    db.refresh(order)
-    return order
\ No newline at end of file
+    # 2. Claim the order only if it is still unassigned, pending and not the user's own
+    claim = update(models.Order).where(
+        models.Order.id == order_id,
+        models.Order.traveller_id.is_(None),
+        models.Order.status == "pending",
+    )
+    if profiles.sender_id:
+        claim = claim.where(models.Order.sender_id != profiles.sender_id)
+    claim = claim.values(traveller_id=profiles.traveller_id, status="accepted") \
+        .returning(models.Order.created_at, models.Order.source_city, models.Order.dest_city, models.Order.item_type) \
+        .execution_options(synchronize_session=False)
+
+    def claim_order():
+        claimed = db.execute(claim).first()
+        if claimed is not None:
+            bump_versions(db, "orders", *board_versions((claimed.source_city, claimed.dest_city)))
+            analytics.record(db, *claimed, accepted=1)
+        return claimed
+
+    if commit_with_retry(db, claim_order) is None:
+        # 3. Nothing claimed: work out why for the error message
+        order = db.query(models.Order).filter(models.Order.id == order_id).first() \
+            or db.get(models.ArchivedOrder, order_id)
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        if profiles.sender_id and order.sender_id == profiles.sender_id:
+            raise HTTPException(status_code=400, detail="You cannot accept your own order")
+        raise HTTPException(status_code=409, detail="Order already accepted by another traveller")
+
+    order_index.remove(order_id)
+    order = db.get(models.Order, order_id)
+    events.publish(events.ORDER_ACCEPTED, order_event_payload(order))
+    return order
@@ -0,0 +1,193 @@
+"""
+Group commit for order and complaint creation.
+
+With WRITE_QUEUE=1, POST /orders and POST /complaints validate in the
+request as usual and hand the insert to a single writer thread. The writer
+takes every insert queued within WRITE_QUEUE_MAX_DELAY_MS of the first one
+(up to WRITE_QUEUE_MAX_BATCH), writes them in one transaction with one
+version bump and one rollup upsert, commits once, and only then wakes the
+waiting requests with their rows and ids. On SQLite that is one write lock
+and one WAL commit per batch instead of one per request, and the requests
+no longer queue on busy_timeout behind each other.
+
+Durability is unchanged: a request is answered only after the transaction
+holding its row has committed, with whatever guarantee the database gives
+a commit (SQLITE_SYNCHRONOUS on SQLite; FULL costs one fsync per batch
+rather than per request). If a batch fails for anything but a busy
+database, its rows are retried one transaction each, so one bad row only
+fails its own request.
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, InvalidStateError
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+import analytics
+import utils
+from database import SessionLocal
+from observability import get_logger
+
+WRITE_QUEUE = os.environ.get("WRITE_QUEUE", "").lower() in ("1", "true", "yes")
+WRITE_QUEUE_MAX_BATCH = int(os.environ.get("WRITE_QUEUE_MAX_BATCH", "256"))
+WRITE_QUEUE_MAX_DELAY_MS = float(os.environ.get("WRITE_QUEUE_MAX_DELAY_MS", "2"))  # 0: whatever is already queued
+
+log = get_logger("write_queue")
+
+Job = namedtuple("Job", ["resources", "stage", "future"])
+
+def _settle(future, result=None, error=None):
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        # Cancelled by a request that timed out or disconnected; its row is committed all the same
+        pass
+
+class WriteQueue:
+    def __init__(self, max_batch: int = WRITE_QUEUE_MAX_BATCH, max_delay_ms: float = WRITE_QUEUE_MAX_DELAY_MS):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.batches = 0
+        self.rows = 0
+        self.largest = 0
+        self.fallbacks = 0
+        self._jobs = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Commit what is queued, then end the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._jobs.put(None)
+            thread.join()
+
+    async def submit(self, resources, stage):
+        """
+        Run stage(db, rollup) in the next batch and return its result once the
+        batch has committed. resources are the version counters the write bumps.
+        """
+        self.start()
+        future = Future()
+        self._jobs.put(Job(tuple(resources), stage, future))
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "largest_batch": self.largest,
+            "mean_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "fallbacks": self.fallbacks,
+        }
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            batch, stopping = [job], False
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._jobs.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+            try:
+                self._commit(batch)
+            except Exception:
+                # The writer outlives any one batch; its requests get the error instead of hanging
+                log.exception("write batch crashed", extra={"rows": len(batch)})
+                for job in batch:
+                    if not job.future.done():
+                        _settle(job.future, error=HTTPException(status_code=500, detail="Write failed"))
+            if stopping:
+                return
+
+    def _write(self, jobs):
+        # Rows stay readable after commit: the requests serialise them once the session is gone
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            def write():
+                rollup = analytics.Rollup()
+                results = [job.stage(db, rollup) for job in jobs]
+                db.flush()
+                utils.bump_versions(db, *{name for job in jobs for name in job.resources})
+                rollup.apply(db)
+                return results
+
+            return utils.commit_with_retry(db, write)
+        finally:
+            db.close()
+
+    def _commit(self, batch):
+        try:
+            outcomes = [(job, result, None) for job, result in zip(batch, self._write(batch))]
+        except HTTPException as e:
+            # Still busy after commit_with_retry's retries; one row at a time would not help
+            outcomes = [(job, None, e) for job in batch]
+        except Exception:
+            log.warning("write batch failed, retrying its rows one by one", exc_info=True,
+                        extra={"rows": len(batch)})
+            self.fallbacks += 1
+            outcomes = []
+            for job in batch:
+                try:
+                    outcomes.append((job, self._write([job])[0], None))
+                except Exception as e:
+                    outcomes.append((job, None, e))
+
+        self.batches += 1
+        self.rows += len(batch)
+        self.largest = max(self.largest, len(batch))
+        for job, result, error in outcomes:
+            _settle(job.future, result, error)
+
+# The writer thread starts on the first submit
+writer = WriteQueue()
+
+# -------------------------------
+# Queued writes
+# -------------------------------
+def _prepare(db, build, *args):
+    """
+    build(db, *args), then end the request's transaction in the same thread so its
+    connection goes back to the pool while the request waits: the writer needs one
+    from the same pool. Detached first, so what was loaded stays readable.
+    """
+    result = build(db, *args)
+    db.expunge_all()
+    db.rollback()
+    return result
+
+async def create_order(db, order: utils.OrderCreate, user):
+    """utils.create_order with the insert committed in the next batch."""
+    db_order = await utils.run_db(db, _prepare, utils.new_order, order, user)
+    resources = ("orders", *utils.board_versions((db_order.source_city, db_order.dest_city)))
+    await writer.submit(resources, lambda session, rollup: utils.stage_order(session, db_order, rollup))
+    await run_in_threadpool(utils.order_created, db_order)
+    return db_order
+
+async def create_complaint(db, complaint: utils.ComplaintCreate, user):
+    """utils.create_complaint with the insert committed in the next batch."""
+    db_complaint, order = await utils.run_db(db, _prepare, utils.new_complaint, complaint, user)
+    return await writer.submit(
+        ("complaints",), lambda session, rollup: utils.stage_complaint(session, db_complaint, order, rollup),
+    )
@@ -8,7 +8,7 @@ import { ThemedText } from '@/components/themed-text';
 import { ThemedView } from '@/components/themed-view';
 import { Colors } from '@/constants/theme';
 import ShipmentCard, { type Shipment } from '@/components/shipment-card';
-import { fetchWithAuth } from '@/lib/api';
+import { fetchPage, fetchWithAuth } from '@/lib/api';
 
 const SenderScreen = () => {
   const router = useRouter();
@@ -17,6 +17,28 @@ const SenderScreen = () => {
   const [loading, setLoading] = useState(true);
   const [refreshing, setRefreshing] = useState(false);
 
+  const [senderId, setSenderId] = useState<number | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  const toShipments = (page: any[], mySenderId: number): Shipment[] =>
+    page
+      .filter((o: any) => o.sender_id === mySenderId)
+      .map((o: any) => {
+        let status: Shipment['status'] = 'Finding Traveller';
+        if (o.status === 'accepted') status = 'In Transit';
+        // You can map other statuses if needed
+
+        return {
+          id: o.id.toString(),
+          parcelId: `BBX${o.id.toString().padStart(3, '0')}`,
+          location: `${o.source_city} -> ${o.dest_city}`,
+          status: status,
+          estimatedTime: `${Math.ceil(o.distance_km / 60)} hours`, // Rough estimate
+          icon: o.item_type === 'documents' ? 'description' : 'local-shipping',
+        };
+      });
+
   const fetchOrders = useCallback(async () => {
     try {
       // 1. Fetch current user's sender profile to get sender_id
@@ -25,33 +47,18 @@ const SenderScreen = () => {
       
       if (!Array.isArray(senders) || senders.length === 0) {
         setOrders([]);
+        setNextCursor(null);
         return;
       }
       const mySenderId = senders[0].id;
+      setSenderId(mySenderId);
 
-      // 2. Fetch all orders involved with this user
-      const ordersRes = await fetchWithAuth('/orders');
-      const allOrders = await ordersRes.json();
+      // 2. Fetch the first page of orders involved with this user; the rest load on scroll
+      const { items, next_cursor } = await fetchPage('/orders');
 
       // 3. Filter and map
-      const myOrders = allOrders
-        .filter((o: any) => o.sender_id === mySenderId)
-        .map((o: any) => {
-          let status: Shipment['status'] = 'Finding Traveller';
-          if (o.status === 'accepted') status = 'In Transit';
-          // You can map other statuses if needed
-
-          return {
-            id: o.id.toString(),
-            parcelId: `BBX${o.id.toString().padStart(3, '0')}`,
-            location: `${o.source_city} -> ${o.dest_city}`,
-            status: status,
-            estimatedTime: `${Math.ceil(o.distance_km / 60)} hours`, // Rough estimate
-            icon: o.item_type === 'documents' ? 'description' : 'local-shipping',
-          };
-        });
-
-      setOrders(myOrders.reverse()); // Show newest first
+      setOrders(toShipments(items, mySenderId)); // API returns newest first
+      setNextCursor(next_cursor);
     } catch (error) {
       console.error('Error fetching orders:', error);
     } finally {
@@ -60,6 +67,20 @@ const SenderScreen = () => {
     }
   }, []);
 
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore || senderId === null) return;
+    setLoadingMore(true);
+    try {
+      const { items, next_cursor } = await fetchPage('/orders', nextCursor);
+      setOrders((current) => [...current, ...toShipments(items, senderId)]);
+      setNextCursor(next_cursor);
+    } catch (error) {
+      console.error('Error fetching more orders:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchOrders();
   }, [fetchOrders]);
@@ -106,6 +127,9 @@ const SenderScreen = () => {
               <ThemedText style={{ color: '#888' }}>Tap + to create one.</ThemedText>
             </View>
           }
+          onEndReached={loadMore}
+          onEndReachedThreshold={0.5}
+          ListFooterComponent={loadingMore ? <ActivityIndicator style={styles.footer} color={fabBackgroundColor} /> : null}
           refreshControl={<RefreshControl refreshing={refreshing} onRefresh={onRefresh} />}
         />
       )}
@@ -174,6 +198,9 @@ const styles = StyleSheet.create({
     justifyContent: 'center',
     marginTop: 60,
   },
+  footer: {
+    marginVertical: 20,
+  },
 });
 
 export default SenderScreen;
@@ -6,7 +6,7 @@ import { ThemedText } from '@/components/themed-text';
 import { ThemedView } from '@/components/themed-view';
 import { Colors } from '@/constants/theme';
 import TransporterItemCard, { type TransporterItem } from '@/components/transporter-item-card';
-import { fetchWithAuth } from '@/lib/api';
+import { fetchPage, fetchWithAuth } from '@/lib/api';
 
 const TransporterScreen = () => {
   const colorScheme = useColorScheme();
@@ -18,6 +18,10 @@ const TransporterScreen = () => {
   const [loading, setLoading] = useState(true);
   const [refreshing, setRefreshing] = useState(false);
   const [travellerId, setTravellerId] = useState<number | null>(null);
+  // next_cursor of each list; null once its last page is loaded
+  const [myCursor, setMyCursor] = useState<string | null>(null);
+  const [availableCursor, setAvailableCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const fetchData = useCallback(async () => {
     try {
@@ -31,49 +35,57 @@ const TransporterScreen = () => {
           setTravellerId(myId);
         }
 
-        // 2. Fetch My Jobs (Active Orders)
+        // 2. Fetch My Jobs (Active Orders), first page; the rest load on scroll
         // Only useful if we have a traveller ID
         if (myId) {
-          const ordersRes = await fetchWithAuth('/orders');
-          if (ordersRes.ok) {
-            const allOrders = await ordersRes.json();
-            if (Array.isArray(allOrders)) {
-              const jobs = allOrders
-                .filter((o: any) => o.traveller_id === myId)
-                .map((o: any) => mapOrderToItem(o, 'Picked Up'));
-              setMyJobs(jobs.reverse());
-            } else {
-              setMyJobs([]);
-            }
-          }
+          const { items, next_cursor } = await fetchPage('/orders');
+          setMyJobs(toMyJobs(items, myId));
+          setMyCursor(next_cursor);
         }
       }
 
-      // 3. Fetch Available Jobs
-      const availableRes = await fetchWithAuth('/orders/available');
-      if (availableRes.ok) {
-        const available = await availableRes.json();
-        if (Array.isArray(available)) {
-          const findJobs = available.map((o: any) => mapOrderToItem(o, 'To Be Picked Up'));
-          setAvailableJobs(findJobs.reverse());
-        } else {
-          setAvailableJobs([]);
-        }
-      } else {
-         setAvailableJobs([]);
-      }
+      // 3. Fetch Available Jobs, first page
+      const { items: available, next_cursor } = await fetchPage('/orders/available');
+      setAvailableJobs(available.map((o: any) => mapOrderToItem(o, 'To Be Picked Up')));
+      setAvailableCursor(next_cursor);
 
     } catch (error) {
       console.error('Error fetching transporter data:', error);
       Alert.alert('Fetch Error', String(error));
       setAvailableJobs([]);
       setMyJobs([]);
+      setMyCursor(null);
+      setAvailableCursor(null);
     } finally {
       setLoading(false);
       setRefreshing(false);
     }
   }, []);
 
+  const loadMore = async () => {
+    const cursor = activeTab === 'my' ? myCursor : availableCursor;
+    if (!cursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      if (activeTab === 'my') {
+        const { items, next_cursor } = await fetchPage('/orders', cursor);
+        setMyJobs((current) => [...current, ...toMyJobs(items, travellerId)]);
+        setMyCursor(next_cursor);
+      } else {
+        const { items, next_cursor } = await fetchPage('/orders/available', cursor);
+        setAvailableJobs((current) => [...current, ...items.map((o: any) => mapOrderToItem(o, 'To Be Picked Up'))]);
+        setAvailableCursor(next_cursor);
+      }
+    } catch (error) {
+      console.error('Error fetching more transporter data:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const toMyJobs = (page: any[], myId: number | null): TransporterItem[] =>
+    page.filter((o: any) => o.traveller_id === myId).map((o: any) => mapOrderToItem(o, 'Picked Up'));
+
   const mapOrderToItem = (o: any, status: 'Picked Up' | 'To Be Picked Up'): TransporterItem => {
     const type = o.item_type || 'Package';
     return {
@@ -209,6 +221,9 @@ const TransporterScreen = () => {
                </ThemedText>
              </View>
           }
+          onEndReached={loadMore}
+          onEndReachedThreshold={0.5}
+          ListFooterComponent={loadingMore ? <ActivityIndicator style={styles.footer} color={themeColors.tint} /> : null}
           refreshControl={<RefreshControl refreshing={refreshing} onRefresh={onRefresh} />}
         />
       )}
@@ -256,6 +271,9 @@ const styles = StyleSheet.create({
   emptyContainer: {
     alignItems: 'center',
     marginTop: 40,
+  },
+  footer: {
+    marginVertical: 20,
   }
 });
 
@@ -32,3 +32,16 @@ export async function fetchWithAuth(url: string, options: RequestInit = {}) {
 
     return response;
 }
+
+// List endpoints (/orders, /orders/available, /complaints) return one page at a time
+export type Page<T = any> = { items: T[]; next_cursor: string | null };
+
+export async function fetchPage<T = any>(url: string, after?: string | null): Promise<Page<T>> {
+    const pageUrl = after ? `${url}${url.includes('?') ? '&' : '?'}after=${encodeURIComponent(after)}` : url;
+    const response = await fetchWithAuth(pageUrl);
+    if (!response.ok) {
+        throw new Error(`GET ${url} failed with ${response.status}`);
+    }
+    const { items = [], next_cursor = null } = await response.json();
+    return { items, next_cursor };
+}